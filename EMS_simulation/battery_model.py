@@ -3,6 +3,9 @@
 import random
 import paho.mqtt.client as mqtt
 import time
+import queue
+import numpy as np
+from EMS_simulation import clock
 
 ## =========================    SIMULATION PARAMETERS    =============================== ##
 SIMU_TIMESTEP = 30                                  # in seconds
@@ -21,7 +24,8 @@ broker_address ="mqtt.teserakt.io"   # use external broker (alternative broker a
 
 
 class Battery():
-    def __init__(self, description, time_slot, max_charge_power, max_discharge_power, min_soc, max_soc, current_soc):
+    def __init__(self, description, time_slot, max_charge_power, max_discharge_power, min_soc, max_soc, current_soc,
+                 connect=True):
         self.description = description
         self.dt = time_slot
         self.max_charge_power = max_charge_power
@@ -30,7 +34,9 @@ class Battery():
         self.max_soc = max_soc
         self.current_soc = current_soc
         self.current_power = 0
-        self.client = self.setup_client()
+        self.client = self.setup_client() if connect else None     # no MQTT client in the lockstep simulation
+        self.actuations = queue.Queue()     # actions received, the model waits on it with clock.VIRTUAL_CLOCK
+        self.ticks = queue.Queue()          # ticks of the simulation clock (clock.VIRTUAL_CLOCK)
         self.time_step = 0
         self.model()
         self.time_step = 0
@@ -40,6 +46,18 @@ class Battery():
         self.current_soc = self.current_soc - (self.dt/3600) * self.current_power
         self.time_step += self.dt
 
+    def model_advance(self, k, trace=False):
+        '''
+        Advances the model by k simulation steps at the current power in one NumPy call, with the updates of k calls
+        of model() (the subtractions accumulated in the same order)
+        :param trace: return the state of charge at the start of each step, i.e. the measurements published at each step
+        :return: with trace, array of the k states of charge, else None
+        '''
+        socs = np.subtract.accumulate(np.append(self.current_soc, np.full(k, (self.dt/3600) * self.current_power)))
+        self.current_soc = float(socs[-1])
+        self.time_step += k*self.dt
+        return socs[:-1] if trace else None
+
 
     def setup_client(self):
         client = mqtt.Client(self.description)
@@ -72,20 +90,29 @@ def on_message_battery(client, userdata, msg):
     message_handler(client, msg)
 
 def message_handler(client, msg):
+    if msg.topic == clock.TICK_TOPIC:
+        battery.ticks.put(int(msg.payload))
+        return
     if msg.topic == 'batteryMS':
         battery.current_power = float(msg.payload)
         battery.control_received = True
+        battery.actuations.put(battery.current_power)
 
 
 if __name__ == '__main__':
 
     # instantiating battery and connecting to controller
-    time.sleep(2)
+    if not clock.VIRTUAL_CLOCK:     # the clock starts the models once the controller subscribed
+        time.sleep(2)
     r = random.randrange(1, 100000)
     cname = "Battery_" + str(r)     # add randomness to name to avoid having two clients with same name
     battery = Battery(cname, SIMU_TIMESTEP, PMAX_CH, PMAX_DISCH, SOC_MIN, SOC_MAX, current_soc=SOC_MIN)
-    battery.client.subscribe('batteryMS')
-    time.sleep(2)   # wait to ensure that controller has subscribed to battery
+    battery.client.subscribe('batteryMS', qos=clock.QOS)
+    if clock.VIRTUAL_CLOCK:     # tick 0: the controller has subscribed to the measurements
+        battery.client.subscribe(clock.TICK_TOPIC, qos=clock.QOS)
+        clock.wait(battery.client, 'battery', 0, battery.ticks)
+    else:
+        time.sleep(2)   # wait to ensure that controller has subscribed to battery
     # publish first message which simulates measurements prior to t=0:
     battery.client.publish('battery/power', battery.current_power)
     battery.client.publish('battery/soc', battery.current_soc)
@@ -93,14 +120,21 @@ if __name__ == '__main__':
     # with the simulation frequency, update model and send state to controller
     for t in SIMU_STEPS:
         if not (battery.time_step % CONTROL_TIMESTEP): # only true when model timestep is a multiple of control period
-            while not battery.control_received:        # in that case, model waits for control period
-                time.sleep(0.001)
+            if clock.VIRTUAL_CLOCK:     # done with the previous control step, simulate this one once actuated
+                clock.wait(battery.client, 'battery', battery.time_step // CONTROL_TIMESTEP + 1, battery.actuations)
+            else:
+                while not battery.control_received:        # in that case, model waits for control period
+                    time.sleep(0.001)
         battery.client.publish('battery/soc', battery.current_soc)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         battery.client.publish('battery/power', battery.current_power)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         battery.model()
         battery.control_received = False
+    if clock.VIRTUAL_CLOCK:         # done with the last control step
+        clock.acknowledge(battery.client, 'battery', len(clock.CONTROL_STEPS) + 1).wait_for_publish()
 
     # close connection with controller
     battery.client.loop_stop()
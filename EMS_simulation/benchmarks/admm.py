@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_assets
+from EMS_simulation.control_algorithms import mpc_admm
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/admm.py [steps] [workers]
+# Sites of 2, 20 and 200 assets (nine boilers per battery, the boilers of the MPC modules repeated), a 3 hours horizon
+# and the first control steps after noon of the shipped day: the centralized LP of mpc_assets.AssetMPCProblem against
+# mpc_admm.ADMMSolver solving the asset subproblems in this process and on a process pool. Reports the solve times,
+# the ADMM iterations, the iterations needed to bring the objective within 1% and 0.1% of the LP, and the cost gap of
+# the final solution. All solvers see the same states, taken from the LP solution (nominal closed loop).
+
+SITES = [(1, 1), (18, 2), (180, 20)]                # (boilers, batteries)
+HORIZON_STEPS = 36
+FIRST_STEP = 144                                    # noon, the grid power changes sign along the horizon
+LP_BACKENDS = ['highs-ds-warm', 'highs-ipm']
+GAPS = [0.01, 0.001]                                # relative to the objective of the LP
+
+
+def site(no_boilers, no_batteries):
+    boilers = [mpc_batteries.BOILERS[i % 2] for i in range(no_boilers)]
+    batteries = [mpc_batteries.BATTERY] * no_batteries
+    hot_water_shares = np.random.default_rng(1).uniform(0.5, 1.5, no_boilers)     # use of each boiler
+    return boilers, batteries, hot_water_shares
+
+
+def benchmark(no_boilers, no_batteries, steps, workers):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    boilers, batteries, hot_water_shares = site(no_boilers, no_batteries)
+    problem = mpc_assets.AssetMPCProblem(boilers, batteries, common.CONTROL_TIMESTEP, HORIZON_STEPS)
+    lp = {backend: lp_solvers.make_solver(problem, backend) for backend in LP_BACKENDS}
+    admm = {'serial': mpc_admm.ADMMSolver(boilers, batteries, common.CONTROL_TIMESTEP, HORIZON_STEPS),
+            'pool': mpc_admm.ADMMSolver(boilers, batteries, common.CONTROL_TIMESTEP, HORIZON_STEPS, workers=workers)}
+    temps = np.array([boiler['temp_min'] + 5 for boiler in boilers], dtype=float)
+    socs = np.array([(battery['soc_min'] + battery['soc_max']) / 2 for battery in batteries], dtype=float)
+    objectives, gaps, reached, failures = [], [], [], 0
+    for iteration in range(FIRST_STEP, FIRST_STEP + steps):
+        excess_power, hot_water_energy, sell_price, buy_price = provider.window(common.step_time(iteration),
+                                                                               HORIZON_STEPS)
+        excess_power = excess_power * no_boilers / 2
+        hot_water_energy = np.outer(hot_water_energy, hot_water_shares)
+        args = (excess_power[0], hot_water_energy[0], temps, socs, excess_power, hot_water_energy, sell_price,
+                buy_price)
+        problem.update(*args)
+        results = [solver.solve() for solver in lp.values()]
+        res = results[0]
+        objectives.append(res.fun)
+        for name, solver in admm.items():
+            decomposed = solver.solve(*args)
+            failures += not decomposed['success']
+        gaps.append(decomposed['cost'] - res.fun)
+        costs = np.array([entry[2] for entry in admm['serial'].history])
+        within = [costs - res.fun <= gap * abs(res.fun) for gap in GAPS]
+        reached.append([np.argmax(close) + 1 if close.any() else np.nan for close in within])
+        temps = res.x[problem.column(problem.boiler_vars(mpc_assets.TB), np.array(0))]
+        socs = res.x[problem.column(problem.battery_vars(mpc_assets.EBAT), np.array(0))]
+    for solver in admm.values():
+        solver.close()
+    return {'lp': {backend: np.mean(solver.solve_times) for backend, solver in lp.items()},
+            'admm': {name: np.mean(solver.solve_times) for name, solver in admm.items()},
+            'iterations': admm['serial'].iterations, 'reached': np.nanmean(reached, axis=0),
+            'objective': np.mean(objectives), 'gap': np.mean(gaps), 'max gap': np.max(np.abs(gaps)),
+            'failures': failures}
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else max(2, os.cpu_count() or 1)
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    print('Centralized LP against ADMM -', steps, 'control steps,', HORIZON_STEPS, 'slots, pool of', workers,
+          'workers on', os.cpu_count(), 'CPUs')
+    for no_boilers, no_batteries in SITES:
+        stats = benchmark(no_boilers, no_batteries, steps, workers)
+        print('    {:3d} assets ({:3d} boilers {:2d} batteries) | objective {:8.4f} CHF'.format(
+            no_boilers + no_batteries, no_boilers, no_batteries, stats['objective']))
+        print('        LP   ' + ' | '.join('{} {:8.1f} ms'.format(backend, 1000 * solve_time)
+                                          for backend, solve_time in stats['lp'].items()))
+        print('        ADMM ' + ' | '.join('{} {:8.1f} ms'.format(name, 1000 * solve_time)
+                                          for name, solve_time in stats['admm'].items()) +
+              ' | iterations {} | to gap {} | gap mean {:+.1e} max {:.1e} CHF | not converged {}'.format(
+                  stats['iterations'], ' '.join('{:.1%}: {:.1f}'.format(gap, reached)
+                                               for gap, reached in zip(GAPS, stats['reached'])),
+                  stats['gap'], stats['max gap'], stats['failures']))
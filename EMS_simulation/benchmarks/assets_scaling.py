@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_assets
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/assets_scaling.py [steps] [backend]
+# Builds mpc_assets.AssetMPCProblem for sites of 2 to 200 boilers (the two boilers of the MPC modules repeated, one
+# battery per 10 boilers) and horizons of 3, 12 and 24 hours, and reports the problem size, the build time, and the
+# update and solve times of the first steps of the shipped day. The excess power and the hot water use of the site
+# scale with its number of boilers.
+
+NO_BOILERS = [2, 10, 50, 200]
+HORIZON_STEPS = [36, 144, 288]
+
+
+def site(no_boilers):
+    boilers = [mpc_batteries.BOILERS[i % 2] for i in range(no_boilers)]
+    batteries = [mpc_batteries.BATTERY] * max(1, no_boilers // 10)
+    hot_water_shares = np.random.default_rng(1).uniform(0.5, 1.5, no_boilers)     # use of each boiler
+    return boilers, batteries, hot_water_shares
+
+
+def benchmark(no_boilers, horizon_steps, backend, steps):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    boilers, batteries, hot_water_shares = site(no_boilers)
+    start = time.time()
+    problem = mpc_assets.AssetMPCProblem(boilers, batteries, common.CONTROL_TIMESTEP, horizon_steps)
+    build_time = time.time() - start
+    solver = lp_solvers.make_solver(problem, backend)
+    temps = np.array([boiler['temp_min'] for boiler in boilers], dtype=float)
+    socs = np.array([battery['soc_min'] for battery in batteries], dtype=float)
+    update_times = []
+    for iteration in range(steps):
+        excess_power, hot_water_energy, sell_price, buy_price = provider.window(common.step_time(iteration),
+                                                                               horizon_steps)
+        excess_power = excess_power * no_boilers / 2
+        hot_water_energy = np.outer(hot_water_energy, hot_water_shares)
+        start = time.time()
+        problem.update(excess_power[0], hot_water_energy[0], temps, socs, excess_power, hot_water_energy,
+                       sell_price, buy_price)
+        update_times.append(time.time() - start)
+        res = solver.solve()
+        if not res.success:
+            return {'failure': res.message}
+        temps = res.x[problem.column(problem.boiler_vars(mpc_assets.TB), np.array(0))]      # nominal closed loop
+        socs = res.x[problem.column(problem.battery_vars(mpc_assets.EBAT), np.array(0))]
+    return {'variables': problem.no_ctrl_vars, 'rows': problem.A_eq.shape[0] + problem.A_ub.shape[0],
+            'nonzeros': problem.A_eq.nnz + problem.A_ub.nnz, 'build': build_time, 'update': np.mean(update_times),
+            'first solve': solver.solve_times[0], 'solve': np.mean(solver.solve_times[1:] or solver.solve_times)}
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    backend = sys.argv[2] if len(sys.argv) > 2 else mpc_batteries.LP_SOLVER
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    print('AssetMPCProblem -', backend, '-', steps, 'control steps')
+    for no_boilers in NO_BOILERS:
+        for horizon_steps in HORIZON_STEPS:
+            stats = benchmark(no_boilers, horizon_steps, backend, steps)
+            if 'failure' in stats:
+                print('    {:3d} boilers {:2d} batteries | {:3d} slots | FAILED SOLVE: {}'.format(
+                    no_boilers, max(1, no_boilers // 10), horizon_steps, stats['failure']))
+                continue
+            print('    {:3d} boilers {:2d} batteries | {:3d} slots | variables {:6d} rows {:6d} nonzeros {:7d} | build'
+                  ' {:7.1f} ms | update {:6.2f} ms | first solve {:8.1f} ms | next solves mean {:8.1f} ms'.format(
+                      no_boilers, max(1, no_boilers // 10), horizon_steps, stats['variables'], stats['rows'],
+                      stats['nonzeros'], 1000 * stats['build'], 1000 * stats['update'], 1000 * stats['first solve'],
+                      1000 * stats['solve']))
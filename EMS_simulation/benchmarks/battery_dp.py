@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from scipy import sparse
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import battery_dp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/battery_dp.py [steps]
+# 1. Battery arbitrage alone (grid power = minus the excess power forecast) at each control step of the day, solved as
+#    an LP with linprog and with battery_dp.BatteryDP for several state of charge grids: solve time and cost gap.
+# 2. Boilers and battery at the states of the nominal day of the joint LP: joint LP against the LP of the boilers
+#    followed by the battery DP (BATTERY_SCHEDULING = 'dp' in mpc_batteries): solve time and cost of the horizon.
+
+SOC_STEPS = [100, 50, 25, 10, 5]                    # in Watts-h
+
+
+def battery_lp(battery, grid_power, sell_price, buy_price, soc_init):
+    '''
+    :return: linprog result of the battery arbitrage, variables (p_bat, soc, phi) per control step
+    '''
+    steps = len(grid_power)
+    energy_per_watt = battery['efficiency'] * common.CONTROL_TIMESTEP / 60
+    kwh_per_watt = common.CONTROL_TIMESTEP / 60 / 1000
+    identity = sparse.identity(steps, format='csr')
+    zeros = sparse.csr_matrix((steps, steps))
+    # soc = soc_previous - p_bat * energy_per_watt
+    A_eq = sparse.hstack([energy_per_watt * identity, identity - sparse.eye(steps, k=-1), zeros])
+    b_eq = np.zeros(steps)
+    b_eq[0] = soc_init
+    # phi >= price * (grid_power - p_bat) * kwh_per_watt for the buy and the sell price
+    A_ub = sparse.vstack([sparse.hstack([-sparse.diags(price * kwh_per_watt), zeros, -identity])
+                          for price in (buy_price, sell_price)])
+    b_ub = np.concatenate([-price * kwh_per_watt * grid_power for price in (buy_price, sell_price)])
+    c = np.concatenate([np.zeros(2 * steps), np.ones(steps)])
+    bounds = [(battery['charge_power_limit'], battery['discharge_power_limit'])] * steps + \
+             [(battery['soc_min'], battery['soc_max'])] * steps + [(None, None)] * steps
+    return lp_solvers.solve_lp(c, A_eq.tocsr(), b_eq, A_ub.tocsr(), b_ub, bounds)
+
+
+def arbitrage(steps):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    dps = {soc_step: battery_dp.BatteryDP(mpc_batteries.BATTERY, common.CONTROL_TIMESTEP, common.NO_SLOTS, soc_step)
+           for soc_step in SOC_STEPS}
+    times = {'lp': [], **{soc_step: [] for soc_step in SOC_STEPS}}
+    gaps = {soc_step: [] for soc_step in SOC_STEPS}
+    soc = common.BATTERY_INITIAL_SOC
+    for iteration in range(steps):
+        excess_power, _, sell_price, buy_price = provider.window(common.step_time(iteration), common.NO_SLOTS)
+        start = time.time()
+        res = battery_lp(mpc_batteries.BATTERY, -excess_power, sell_price, buy_price, soc)
+        times['lp'].append(time.time() - start)
+        for soc_step, dp in dps.items():
+            start = time.time()
+            schedule = dp.solve(-excess_power, sell_price, buy_price, soc)
+            times[soc_step].append(time.time() - start)
+            gaps[soc_step].append(schedule['cost'] - res.fun)
+        soc = res.x[common.NO_SLOTS]                            # nominal closed loop of the LP
+    print('Battery arbitrage alone -', steps, 'control steps,', common.NO_SLOTS, 'steps horizon')
+    print('    {:14s} solve mean {:8.3f} ms max {:8.3f} ms'.format(
+        'linprog', 1000 * np.mean(times['lp']), 1000 * np.max(times['lp'])))
+    for soc_step, dp in dps.items():
+        print('    DP {:4d} Wh     solve mean {:8.3f} ms max {:8.3f} ms | states {:4d} moves {:4d} | cost gap to the LP'
+              ' mean {:.5f} max {:.5f} CHF'.format(
+                  soc_step, 1000 * np.mean(times[soc_step]), 1000 * np.max(times[soc_step]), len(dp.grid),
+                  len(dp.moves), np.mean(gaps[soc_step]), np.max(gaps[soc_step])))
+
+
+def decoupled(steps):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    joint = mpc_lp.MPCProblem(mpc_batteries.BOILERS, mpc_batteries.BATTERY, common.CONTROL_TIMESTEP, common.NO_SLOTS)
+    joint_solver = lp_solvers.make_solver(joint, mpc_batteries.LP_SOLVER)
+    results = common.run_day(joint, joint_solver, steps)
+    boilers = mpc_lp.MPCProblem(mpc_batteries.BOILERS, None, common.CONTROL_TIMESTEP, common.NO_SLOTS)
+    boilers_solver = lp_solvers.make_solver(boilers, mpc_batteries.LP_SOLVER)
+    dp = battery_dp.BatteryDP(mpc_batteries.BATTERY, common.CONTROL_TIMESTEP, common.NO_SLOTS, mpc_batteries.SOC_STEP)
+    temps = list(common.BOILERS_INITIAL_TEMP)
+    soc = common.BATTERY_INITIAL_SOC
+    dp_times, joint_costs, decoupled_costs = [], [], []
+    for iteration, res in enumerate(results):
+        window = provider.window(common.step_time(iteration), common.NO_SLOTS)
+        boilers.update(window[0][0], window[1][0], temps, None, *window)
+        boilers_res = boilers_solver.solve()
+        start = time.time()
+        grid_power = -(window[0] + boilers.step_values(boilers_res.x, mpc_lp.PB1) +
+                       boilers.step_values(boilers_res.x, mpc_lp.PB2))
+        schedule = dp.solve(grid_power, window[2], window[3], soc)
+        dp_times.append(time.time() - start)
+        joint_costs.append(res.x[joint.column(mpc_lp.PHI)].sum())
+        decoupled_costs.append(schedule['cost'])
+        temps = [res.x[mpc_lp.TB1], res.x[mpc_lp.TB2]]          # states of the joint LP
+        soc = res.x[mpc_lp.EBAT]
+    gaps = np.array(decoupled_costs) - np.array(joint_costs)
+    print('Boilers and battery -', steps, 'control steps at the states of the joint LP')
+    print('    joint LP        solve mean {:8.3f} ms | grid cost of the horizon mean {:.4f} CHF'.format(
+        1000 * np.mean(joint_solver.solve_times), np.mean(joint_costs)))
+    print('    LP + DP {:3d} Wh solve mean {:8.3f} ms ({:.3f} + {:.3f}) | grid cost of the horizon mean {:.4f} CHF, gap'
+          ' mean {:.4f} max {:.4f} CHF'.format(
+              mpc_batteries.SOC_STEP, 1000 * (np.mean(boilers_solver.solve_times) + np.mean(dp_times)),
+              1000 * np.mean(boilers_solver.solve_times), 1000 * np.mean(dp_times), np.mean(decoupled_costs),
+              gaps.mean(), gaps.max()))
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+    arbitrage(steps)
+    decoupled(steps)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+from datetime import timedelta
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_lp
+
+## =========================    BENCHMARK PARAMETERS    =============================== ##
+CONTROL_TIMESTEP = 5                                # in minutes
+MPC_START_TIME = '05.01.2018 00:00:00'              # pandas format mm.dd.yyyy hh:mm:ss
+DAY_STEPS = 288                                     # control steps in a day
+NO_SLOTS = 144                                      # slots in the MPC horizon
+## ==================================================================================== ##
+
+BOILERS_INITIAL_TEMP = [40, 30]                     # in degree celsius, as in the boiler models
+BATTERY_INITIAL_SOC = 200                           # in Watts-h, as in the battery model
+
+
+def step_time(iteration):
+    return datetime.strptime(MPC_START_TIME, "%m.%d.%Y %H:%M:%S") + timedelta(minutes=iteration * CONTROL_TIMESTEP)
+
+
+def run_day(problem, solver, steps=DAY_STEPS):
+    '''
+    Nominal closed loop over a day: the measured excess power and hot water use are the forecasted ones and the state
+    measured at the next control step is the first state predicted by the solution.
+    :return: list of the solver results, one per control step, x in the variable layout of MPCProblem
+    '''
+    provider = forecasts.get_forecast_provider(CONTROL_TIMESTEP)
+    temps = list(BOILERS_INITIAL_TEMP)
+    soc = BATTERY_INITIAL_SOC
+    results = []
+    for iteration in range(steps):
+        window = provider.window(step_time(iteration), problem.horizon_steps)
+        problem.update(window[0][0], window[1][0], temps, soc, *window)
+        res = solver.solve()
+        res.x = problem.full_solution(res.x)
+        temps = [res.x[mpc_lp.TB1], res.x[mpc_lp.TB2]]
+        if problem.battery:
+            soc = res.x[mpc_lp.EBAT]
+        results.append(res)
+    return results
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/condensed.py [steps]
+# Runs receding horizon MPC with the full and the condensed formulations (mpc_lp.FORMULATIONS) side by side, with
+# uniform slots and with a coarser slot schedule. Both get the same measurements at each step (the closed loop follows
+# the full formulation), and the problem sizes, build, update and solve times and the largest objective difference
+# are reported.
+
+SCHEDULES = {'uniform 5 min': None, '5/15/60 min': [(60, 5), (300, 15), (360, 60)]}
+BACKENDS = ['highs-ds-warm', 'highs-ipm']
+
+
+def compare(battery, schedule, backend, steps):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    problems, solvers, stats = {}, {}, {}
+    for formulation, problem_class in mpc_lp.FORMULATIONS.items():
+        start = time.time()
+        problems[formulation] = problem_class(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP,
+                                              common.NO_SLOTS, schedule)
+        stats[formulation] = {'build': time.time() - start, 'update': 0, 'objective': []}
+        solvers[formulation] = lp_solvers.make_solver(problems[formulation], backend)
+    temps = list(common.BOILERS_INITIAL_TEMP)
+    soc = common.BATTERY_INITIAL_SOC
+    for iteration in range(steps):
+        window = provider.window(common.step_time(iteration), common.NO_SLOTS)
+        for formulation, problem in problems.items():
+            start = time.time()
+            problem.update(window[0][0], window[1][0], temps, soc, *window)
+            stats[formulation]['update'] += (time.time() - start) / steps
+            res = solvers[formulation].solve()
+            stats[formulation]['objective'].append(res.fun)
+            if formulation == 'full':
+                x = res.x
+        temps = [x[mpc_lp.TB1], x[mpc_lp.TB2]]
+        if battery:
+            soc = x[mpc_lp.EBAT]
+    return problems, solvers, stats
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, battery in [('MPCboilers', None), ('MPCbattery', mpc_batteries.BATTERY)]:
+        for schedule_name, schedule in SCHEDULES.items():
+            print(name, '-', schedule_name, 'slots,', steps, 'control steps')
+            for backend in BACKENDS:
+                problems, solvers, stats = compare(battery, schedule, backend, steps)
+                for formulation, problem in problems.items():
+                    solver = solvers[formulation]
+                    print('    {:14s} {:10s} variables {:5d} | rows {:5d} eq {:5d} ub | nonzeros {:6d} | build {:7.2f}'
+                          ' ms | update {:6.3f} ms | solve mean {:7.2f} ms | iterations mean {:6.1f}'.format(
+                              backend, formulation, problem.no_ctrl_vars, problem.A_eq.shape[0],
+                              problem.A_ub.shape[0], problem.A_eq.nnz + problem.A_ub.nnz,
+                              1000 * stats[formulation]['build'], 1000 * stats[formulation]['update'],
+                              1000 * np.mean(solver.solve_times), np.mean(solver.iterations)))
+                print('    {:14s} max objective difference {:.2e}'.format(backend, np.abs(
+                    np.array(stats['full']['objective']) - stats['condensed']['objective']).max()))
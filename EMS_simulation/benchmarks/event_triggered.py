@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import io
+import sys
+import contextlib
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_runner
+from EMS_simulation.control_algorithms import mpc_boilers
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+from EMS_simulation.water import d_WATER, C_WATER
+
+# Run from EMS_simulation: python benchmarks/event_triggered.py [steps]
+# Runs a day of MPC in closed loop with the boiler and battery models, the measured hot water use and a perturbed
+# excess power (as in the controller), solving at every control step and with event-triggered solves for several
+# thresholds and maximum plan ages. Reports the solves (failed solves, e.g. when a measured temperature is above its
+# maximum, are followed by the plan and retried at the next step), the solve time and the daily cost of each setting.
+
+SIMU_TIMESTEP = 30                                  # in seconds, as in the boiler and battery models
+FORECAST_INACCURACY_COEF = 0.1                      # as in the controller
+TEMP_INCOMING_WATER = 20                            # in degree celsius
+
+# (thresholds, max age in control steps), the first setting solves at every step
+SETTINGS = {'every step': ({}, 1),
+            'tight, 1 h': ({'Tb1': 0.2, 'Tb2': 0.2, 'soc_bat': 50, 'p_x': 200}, 12),
+            'default, 1 h': ({'Tb1': 0.5, 'Tb2': 0.5, 'soc_bat': 100, 'p_x': 500}, 12),
+            'default, 3 h': ({'Tb1': 0.5, 'Tb2': 0.5, 'soc_bat': 100, 'p_x': 500}, 36),
+            'loose, 3 h': ({'Tb1': 1, 'Tb2': 1, 'soc_bat': 250, 'p_x': 1000}, 36),
+            'states only, 1 h': ({'Tb1': 0.5, 'Tb2': 0.5, 'soc_bat': 100}, 12)}
+
+
+def disturbances(steps, first_step=0, seed=1):
+    '''
+    :param first_step: control step of the first disturbance, from MPC_START_TIME
+    :param seed: of the error of the excess power
+    :return: per control step, the measured excess power (forecast with a uniform error, as in the controller), the
+    hot water energy used by each boiler, and the sell and buy prices
+    '''
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    excess_power, _, sell_price, buy_price = provider.window(common.step_time(first_step), steps)
+    rng = np.random.default_rng(seed)
+    error = np.where(excess_power > 0, rng.uniform(-1, 1, steps), -rng.uniform(0, 1, steps))
+    p_x = excess_power + FORECAST_INACCURACY_COEF * error * np.abs(excess_power)
+    hot_water_energy = np.array(mpc_boilers.get_hot_water_usage()[first_step:first_step + steps]) * \
+        C_WATER * d_WATER * 40
+    return p_x, hot_water_energy, sell_price, buy_price
+
+
+def run_day(runner, battery, steps, first_step=0, seed=1, initial_state=None):
+    '''
+    Closed loop of the boiler and battery models (SIMU_TIMESTEP substeps per control step) with the actions of the
+    runner.
+    :param first_step: control step of the start of the day, from MPC_START_TIME
+    :param seed: of the error of the excess power, see disturbances()
+    :param initial_state: (Tb1, Tb2, soc), None for the initial state of the models
+    :return: daily cost in CHF (the controller's convention) and the final temperatures and state of charge
+    '''
+    p_x, hot_water_energy, sell_price, buy_price = disturbances(steps, first_step, seed)
+    capacities = [boiler['capacity'] for boiler in mpc_batteries.BOILERS]
+    volumes = [mpc_batteries.BOILER1_VOLUME, mpc_batteries.BOILER2_VOLUME]
+    if initial_state is None:
+        initial_state = common.BOILERS_INITIAL_TEMP + [common.BATTERY_INITIAL_SOC]
+    temps = np.array(initial_state[:2], dtype=float)
+    soc = initial_state[2]
+    substeps = int(common.CONTROL_TIMESTEP * 60 / SIMU_TIMESTEP)
+    cost = 0
+    for step in range(steps):
+        iteration = first_step + step
+        if battery:
+            args = (p_x[step], soc, hot_water_energy[step], temps[0], temps[1])
+        else:
+            args = (p_x[step], hot_water_energy[step], temps[0], temps[1])
+        with contextlib.redirect_stdout(io.StringIO()):       # mpc_iteration prints the current time
+            actions, source = runner.action(iteration, args)
+        assert source != 'rule', 'no MPC plan at control step ' + str(iteration)
+        powers = np.array([actions[1], actions[2]])
+        for _ in range(substeps):                               # as Boiler.model and Battery.model
+            D = hot_water_energy[step] / substeps / (C_WATER * d_WATER * temps) / volumes
+            temps = (1 - D) * temps - SIMU_TIMESTEP * powers / capacities + D * TEMP_INCOMING_WATER
+        p_grid = p_x[step] + powers.sum()
+        if battery:
+            soc -= common.CONTROL_TIMESTEP / 60 * actions['bat']
+            p_grid += actions['bat']
+        energy = p_grid * common.CONTROL_TIMESTEP / 60 * 0.001                       # in kWh
+        cost -= energy * (sell_price[step] if energy > 0 else buy_price[step])
+    return cost, np.round(np.append(temps, soc if battery else []), 1)
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, module, battery in [('MPCboilers', mpc_boilers, False), ('MPCbattery', mpc_batteries, True)]:
+        print(name, '-', steps, 'control steps')
+        reference = None
+        for setting, (thresholds, max_age) in SETTINGS.items():
+            runner = mpc_runner.EventTriggeredMPC(module.mpc_iteration, module.ITERATION_ARGS, thresholds, max_age)
+            cost, state = run_day(runner, battery, steps)
+            if reference is None:
+                reference = (len(runner.solve_times), cost)
+            triggers = ', '.join(reason + ' ' + str(count) for reason, count in runner.triggers.items() if count)
+            print('    {:16s} solves {:4d} ({:5.1%}) failed {:3d} | solve time total {:6.2f} s | daily cost {:8.4f} CHF'
+                  ' ({:+.4f}) | final state {} | triggers: {}'.format(
+                      setting, len(runner.solve_times), len(runner.solve_times) / reference[0], runner.failures,
+                      sum(runner.solve_times), cost, cost - reference[1], state, triggers))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_runner
+from EMS_simulation.control_algorithms import mpc_boilers
+from EMS_simulation.control_algorithms import mpc_explicit
+from EMS_simulation.benchmarks import common
+from EMS_simulation.benchmarks import event_triggered
+
+# Run from EMS_simulation: python benchmarks/explicit_mpc.py [steps] [policy]
+# Explicit policy of mpc_boilers (built for the steps and saved to policy when the file does not exist, by default
+# mpc_explicit.POLICY_PATH): its validation error bound, the evaluation time of the policy against the online solve,
+# and a day in closed loop with the boiler models (as benchmarks/event_triggered.py) actuated from the policy and
+# from the online MPC.
+
+EVALUATIONS = 10000
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    path = sys.argv[2] if len(sys.argv) > 2 else mpc_explicit.POLICY_PATH
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    if not os.path.exists(path):
+        start = time.time()
+        mpc_explicit.ExplicitPolicy.build(range(steps)).save(path)
+        print('policy built in', round(time.time() - start, 1), 's')
+    policy = mpc_explicit.ExplicitPolicy.load(path)
+    print('Explicit MPC -', len(policy.actions), 'control steps in', path, '-',
+          round((policy.actions.nbytes + policy.gradients.nbytes) / 1e6, 2), 'MB')
+    print('    error bound over', mpc_explicit.VALIDATION_SAMPLES, 'random states per step: first action max {:.1f} W'
+          ' (95th percentile of the steps {:.1f} W), objective of the horizon max {:.2e} CHF, {} of {} states'
+          ' infeasible with the action of the policy'.format(
+              policy.action_errors.max(), np.percentile(policy.action_errors, 95), policy.cost_errors.max(),
+              policy.infeasible.sum(), mpc_explicit.VALIDATION_SAMPLES * len(policy.actions)))
+
+    p_x, hot_water_energy, _, _ = event_triggered.disturbances(steps)
+    rng = np.random.default_rng(1)
+    iterations = rng.integers(0, min(steps, len(policy.actions)), EVALUATIONS)
+    temps = rng.uniform(policy.lower[:2], policy.upper[:2], (EVALUATIONS, 2))
+    start = time.time()
+    for iteration, (Tb1, Tb2) in zip(iterations, temps):
+        policy.evaluate(iteration, p_x[iteration], hot_water_energy[iteration], Tb1, Tb2)
+    evaluation_time = (time.time() - start) / EVALUATIONS
+
+    online = mpc_runner.DeadlineMPC(mpc_boilers.mpc_iteration, None)
+    online_cost, online_state = event_triggered.run_day(online, False, steps)
+    explicit = mpc_runner.ExplicitMPC(policy, mpc_boilers.mpc_iteration)
+    explicit_cost, explicit_state = event_triggered.run_day(explicit, False, steps)
+    print('    online MPC   time per step mean {:9.3f} ms | daily cost {:8.4f} CHF | final state {}'.format(
+        1000 * np.mean(online.solve_times), online_cost, online_state))
+    print('    explicit MPC time per step mean {:9.3f} ms (evaluation {:.1f} us) | daily cost {:8.4f} CHF ({:+.4f}) |'
+          ' final state {} | {}'.format(
+              1000 * (sum(explicit.evaluation_times) + sum(explicit.solve_times)) / explicit.steps,
+              1e6 * evaluation_time, explicit_cost, explicit_cost - online_cost, explicit_state,
+              ', '.join(source + ' ' + str(count) for source, count in explicit.sources.items())))
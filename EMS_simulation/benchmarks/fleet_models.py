@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from EMS_simulation import boiler1_model
+from EMS_simulation import boiler2_model
+from EMS_simulation import battery_model
+from EMS_simulation import fleet_models
+
+# Run from EMS_simulation: python benchmarks/fleet_models.py [days]
+# fleet_models.BoilerFleet and BatteryFleet against the boiler and battery models (one object per unit): checks that
+# a fleet of the two boilers and a battery follows the models bit for bit, then simulates fleets of FLEET_SIZES units
+# (the boilers of the models repeated, each with its share of the hot water profile) with random powers held over
+# each control step, advancing step by step (model) and a control step at a time (model_advance). The time of the
+# models per unit and step, measured on REFERENCE_UNITS objects, gives their time at each fleet size.
+
+FLEET_SIZES = [10, 1000, 100000]
+REFERENCE_UNITS = 10
+SUBSTEPS = int(boiler1_model.CONTROL_TIMESTEP / boiler1_model.SIMU_TIMESTEP)
+DAY_STEPS = len(boiler1_model.SIMU_STEPS)
+
+
+def boilers(units):
+    '''
+    :return: units scalar models, alternately of boiler1_model and boiler2_model
+    '''
+    return [boiler1_model.Boiler('Boiler1', boiler1_model.SIMU_TIMESTEP, boiler1_model.BOILER1_RATED_P,
+                                 boiler1_model.BOILER1_TEMP_MIN, boiler1_model.BOILER1_TEMP_MAX,
+                                 boiler1_model.BOILER1_INITIAL_TEMP, connect=False) if i % 2 == 0 else
+            boiler2_model.Boiler('Boiler2', boiler2_model.SIMU_TIMESTEP, boiler2_model.BOILER2_RATED_P,
+                                 boiler2_model.BOILER2_TEMP_MIN, boiler2_model.BOILER2_TEMP_MAX,
+                                 boiler2_model.BOILER2_INITIAL_TEMP, connect=False) for i in range(units)]
+
+
+def boiler_fleet(units, energy_hot_water, hot_water_shares=1):
+    '''
+    :return: fleet of units boilers, alternately as those of boiler1_model and boiler2_model, with their initial state
+    after the constructor of the models (which runs one step)
+    '''
+    first = np.arange(units) % 2 == 0
+    fleet = fleet_models.BoilerFleet(
+        boiler1_model.SIMU_TIMESTEP, np.where(first, boiler1_model.BOILER1_RATED_P, boiler2_model.BOILER2_RATED_P),
+        np.where(first, boiler1_model.BOILER1_TEMP_MIN, boiler2_model.BOILER2_TEMP_MIN),
+        np.where(first, boiler1_model.BOILER1_TEMP_MAX, boiler2_model.BOILER2_TEMP_MAX),
+        np.where(first, boiler1_model.BOILER1_VOLUME, boiler2_model.BOILER2_VOLUME),
+        np.where(first, boiler1_model.BOILER1_INITIAL_TEMP, boiler2_model.BOILER2_INITIAL_TEMP), energy_hot_water,
+        hot_water_shares, np.where(first, boiler1_model.BOILER1_TEMP_INCOMING_WATER,
+                                   boiler2_model.BOILER2_TEMP_INCOMING_WATER))
+    fleet.model()
+    fleet.time_step = 0
+    fleet.time = 0
+    return fleet
+
+
+def battery_fleet(units):
+    return fleet_models.BatteryFleet(battery_model.SIMU_TIMESTEP, battery_model.PMAX_CH, battery_model.PMAX_DISCH,
+                                     battery_model.SOC_MIN, battery_model.SOC_MAX, np.full(units, battery_model.SOC_MIN))
+
+
+def powers(units, control_steps, rng):
+    return rng.uniform(boiler1_model.BOILER1_RATED_P, 0, (control_steps, units)), \
+        rng.uniform(battery_model.PMAX_CH, battery_model.PMAX_DISCH, (control_steps, units))
+
+
+def check(rng):
+    '''
+    :return: whether the fleets of the two boilers and of a battery have the temperatures and states of charge of the
+    models at every step of a day, with model and with model_advance
+    '''
+    models = boilers(2)
+    battery = battery_model.Battery('Battery', battery_model.SIMU_TIMESTEP, battery_model.PMAX_CH,
+                                    battery_model.PMAX_DISCH, battery_model.SOC_MIN, battery_model.SOC_MAX,
+                                    current_soc=battery_model.SOC_MIN, connect=False)
+    # the profiles of the two models differ in the last bits (their products are not in the same order)
+    energy_hot_water = np.column_stack([model.energy_hot_water for model in models])
+    fleets = [(boiler_fleet(2, energy_hot_water), battery_fleet(1)) for _ in range(2)]
+    boiler_powers, battery_powers = powers(2, DAY_STEPS // SUBSTEPS, rng)
+    identical = True
+    for control_step in range(DAY_STEPS // SUBSTEPS):
+        for model, power in zip(models, boiler_powers[control_step]):
+            model.power = power
+        battery.current_power = battery_powers[control_step, 0]
+        for boilers_fleet, batteries in fleets:
+            boilers_fleet.power = boiler_powers[control_step].copy()
+            batteries.current_power = battery_powers[control_step, :1].copy()
+        temps, socs = [], []
+        for _ in range(SUBSTEPS):
+            temps.append([model.current_temp for model in models])
+            socs.append([battery.current_soc])
+            for model in models:
+                model.model()
+            battery.model()
+            fleets[0][0].model()
+            fleets[0][1].model()
+        traces = (fleets[1][0].model_advance(SUBSTEPS, trace=True), fleets[1][1].model_advance(SUBSTEPS, trace=True))
+        identical &= np.array_equal(traces[0], temps) and np.array_equal(traces[1], socs)
+        for boilers_fleet, batteries in fleets:
+            identical &= np.array_equal(boilers_fleet.current_temp, [model.current_temp for model in models])
+            identical &= np.array_equal(batteries.current_soc, [battery.current_soc])
+    return identical
+
+
+def simulate(boilers_fleet, batteries, boiler_powers, battery_powers, advance):
+    start = time.time()
+    for control_step in range(len(boiler_powers)):
+        boilers_fleet.power = boiler_powers[control_step]
+        batteries.current_power = battery_powers[control_step]
+        if advance:
+            boilers_fleet.model_advance(SUBSTEPS)
+            batteries.model_advance(SUBSTEPS)
+        else:
+            for _ in range(SUBSTEPS):
+                boilers_fleet.model()
+                batteries.model()
+    return time.time() - start
+
+
+if __name__ == '__main__':
+
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    control_steps = int(days * DAY_STEPS / SUBSTEPS)
+    energy_hot_water = boiler1_model.get_energy_hot_water_usage_simu()
+    rng = np.random.default_rng(1)
+    print('Fleets against the models, 2 boilers and a battery, a day: identical' if check(rng) else
+          'Fleets against the models, 2 boilers and a battery, a day: DIFFERENT')
+
+    # models: time per unit and simulation step, on REFERENCE_UNITS boilers and batteries
+    models = boilers(REFERENCE_UNITS)
+    batteries = [battery_model.Battery('Battery', battery_model.SIMU_TIMESTEP, battery_model.PMAX_CH,
+                                       battery_model.PMAX_DISCH, battery_model.SOC_MIN, battery_model.SOC_MAX,
+                                       current_soc=battery_model.SOC_MIN, connect=False)
+                 for _ in range(REFERENCE_UNITS)]
+    reference_steps = min(control_steps, DAY_STEPS // SUBSTEPS) * SUBSTEPS
+    start = time.time()
+    for _ in range(reference_steps):
+        for model, battery in zip(models, batteries):
+            model.model()
+            battery.model()
+    unit_step_time = (time.time() - start) / reference_steps / REFERENCE_UNITS
+
+    print('Simulated', control_steps * SUBSTEPS, 'steps of', boiler1_model.SIMU_TIMESTEP, 's, boilers and batteries'
+          ' per unit (time per unit and step, models measured on', REFERENCE_UNITS, 'units)')
+    for units in FLEET_SIZES:
+        boiler_powers, battery_powers = powers(units, control_steps, rng)
+        hot_water_shares = rng.uniform(0.5, 1.5, units)
+        times = {}
+        for advance in (False, True):
+            times[advance] = simulate(boiler_fleet(units, energy_hot_water, hot_water_shares), battery_fleet(units),
+                                      boiler_powers, battery_powers, advance)
+        models_time = unit_step_time * units * control_steps * SUBSTEPS
+        print('    {:6d} units | models {:9.3f} s ({:6.0f} ns) | fleet model {:7.3f} s ({:6.1f} ns, x{:.0f}) |'
+              ' fleet model_advance {:7.3f} s ({:6.1f} ns, x{:.0f})'.format(
+                  units, models_time, 1e9 * unit_step_time,
+                  times[False], 1e9 * times[False] / units / control_steps / SUBSTEPS, models_time / times[False],
+                  times[True], 1e9 * times[True] / units / control_steps / SUBSTEPS, models_time / times[True]))
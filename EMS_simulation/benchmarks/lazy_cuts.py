@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import sys
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/lazy_cuts.py [steps]
+# Runs the shipped day of receding horizon MPC of the boilers with all the tangent cuts built upfront and with lazy
+# cuts, for the temperature grids of the MPC modules (2 and 6 degrees) and for a 0.5 degree grid, and reports the
+# cut rows, the solves per step, the cuts added per step, the solve time and the objective gap due to CUT_TOLERANCE.
+
+GRIDS = {'shipped grid': [mpc_batteries.TB1_RANGE, mpc_batteries.TB2_RANGE],
+         '0.5 deg grid': [np.arange(mpc_batteries.BOILER1_TEMP_MIN, mpc_batteries.BOILER1_TEMP_MAX + 0.25, 0.5),
+                          np.arange(mpc_batteries.BOILER2_TEMP_MIN, mpc_batteries.BOILER2_TEMP_MAX + 0.25, 0.5)]}
+BACKENDS = ['highs-ds-warm', 'linprog']
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for grid_name, temp_ranges in GRIDS.items():
+        boilers = [dict(boiler, temp_range=temps) for boiler, temps in zip(mpc_batteries.BOILERS, temp_ranges)]
+        print('MPCboilers -', grid_name, '(' + ', '.join(str(len(temps)) for temps in temp_ranges) + ' temperatures),',
+              steps, 'control steps')
+        for backend in BACKENDS:
+            objectives = {}
+            for lazy_cuts in (False, True):
+                problem = mpc_lp.MPCProblem(boilers, None, common.CONTROL_TIMESTEP, common.NO_SLOTS,
+                                            lazy_cuts=lazy_cuts)
+                solver = lp_solvers.make_solver(problem, backend)
+                results = common.run_day(problem, solver, steps)
+                objectives[lazy_cuts] = np.array([res.fun for res in results])
+                no_cuts = sum(rows.size for rows in problem.cut_rows)
+                print('    {:14s} {:6s} cut rows {:5d} | solves per step mean {:4.2f} max {:2d} | cuts added per step'
+                      ' mean {:5.1f} | iterations mean {:6.1f} | solve mean {:6.2f} ms max {:6.2f} ms'.format(
+                          backend, 'lazy' if lazy_cuts else 'eager', no_cuts, np.mean(solver.cut_rounds),
+                          max(solver.cut_rounds), np.mean(solver.added_cuts), np.mean(solver.iterations),
+                          1000 * np.mean(solver.solve_times), 1000 * max(solver.solve_times)))
+            print('    {:14s} max objective gap lazy - eager {:.2e}'.format(
+                backend, np.abs(objectives[True] - objectives[False]).max()))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/move_blocking.py
+# Runs the shipped day of receding horizon MPC with uniform slots and with coarser slot schedules, and reports the
+# problem size, the solve time and the closed loop grid cost (cost of the first slot of each step) of each schedule.
+
+SCHEDULES = {
+    'uniform 5 min': None,
+    '5/15/60 min': [(60, 5), (300, 15), (360, 60)],
+    '5/30/60 min': [(30, 5), (150, 30), (540, 60)],
+    '5/15 min': [(60, 5), (660, 15)],
+}
+
+
+if __name__ == '__main__':
+
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, battery in [('MPCboilers', None), ('MPCbattery', mpc_batteries.BATTERY)]:
+        print(name, '-', common.DAY_STEPS, 'control steps, horizon of', common.NO_SLOTS, 'control steps')
+        reference = None
+        for schedule_name, schedule in SCHEDULES.items():
+            problem = mpc_lp.MPCProblem(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, common.NO_SLOTS,
+                                        schedule)
+            solver = lp_solvers.make_solver(problem, mpc_batteries.LP_SOLVER)
+            results = common.run_day(problem, solver)
+            cost = sum(res.x[mpc_lp.PHI] for res in results)
+            if reference is None:
+                reference = cost
+            state = [results[-1].x[mpc_lp.TB1], results[-1].x[mpc_lp.TB2]]
+            if battery:
+                state.append(results[-1].x[mpc_lp.EBAT])
+            print('    {:14s} slots {:4d} | variables {:5d} | rows {:5d} eq {:5d} ub | nonzeros {:6d} | solve mean'
+                  ' {:6.2f} ms | iterations mean {:6.1f} | day cost {:8.4f} CHF ({:+.2%}) | final state {}'.format(
+                      schedule_name, problem.no_slots, problem.no_ctrl_vars, problem.A_eq.shape[0],
+                      problem.A_ub.shape[0], problem.A_eq.nnz + problem.A_ub.nnz,
+                      1000 * np.mean(solver.solve_times), np.mean(solver.iterations), cost,
+                      (cost - reference) / abs(reference), np.round(state, 1)))
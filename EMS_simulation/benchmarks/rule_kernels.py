@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import scenarios
+
+# Run from EMS_simulation: python benchmarks/rule_kernels.py [cases]
+# The array versions of the rule-based algorithms (scenarios.algo_scenario0/1/2_arrays) against the algorithms on the
+# dicts of the two boilers: compares their actions and hysteresis states on random states (temperatures drawn around
+# and at the thresholds, ties between the boilers, surpluses at and around the demands of the boilers), then times
+# both for the two boilers and the arrays for fleets of FLEET_SIZES boilers (those of the scenarios repeated).
+
+FLEET_SIZES = [2, 1000, 100000]
+TIMING_CALLS = 2000
+
+
+def random_case(rng):
+    thresholds = [30, 30.6, 40, 40.2, 50, 60]
+    temps = [rng.choice(thresholds) if rng.random() < 0.3 else rng.uniform(25, 65) for _ in range(2)]
+    if rng.random() < 0.1:
+        temps[1] = temps[0]
+    powers = [float(rng.choice([0, scenarios.BOILER1_RATED_P, rng.uniform(scenarios.BOILER1_RATED_P, 0)]))
+              for _ in range(2)]
+    if rng.random() < 0.1:
+        powers[1] = powers[0]
+    hyst_states = [int(rng.integers(0, 2)) for _ in range(2)]
+    demands = [max(0, scenarios.BOILERS_TEMP_MAX[i + 1] - temps[i]) / scenarios.C_BOILER for i in range(2)]
+    p_x = float(rng.choice([0, -scenarios.BOILER1_RATED_P, demands[0], demands[0] + demands[1],
+                            -scenarios.BOILER1_RATED_P + demands[1], rng.uniform(-8000, 20000),
+                            rng.uniform(-1, 1)]))
+    soc = rng.uniform(scenarios.SOC_MIN, scenarios.SOC_MAX)
+    return temps, powers, hyst_states, p_x, soc
+
+
+def compare(cases, rng):
+    '''
+    :return: number of cases with different actions or hysteresis states, per scenario
+    '''
+    differences = {0: 0, 1: 0, 2: 0}
+    for _ in range(cases):
+        temps, powers, hyst_states, p_x, soc = random_case(rng)
+        states = {i + 1: [temps[i], powers[i], hyst_states[i]] for i in range(2)}
+        arrays = (np.array(temps), np.array(powers), np.array(hyst_states))
+        outputs = {0: (scenarios.algo_scenario0(states), scenarios.algo_scenario0_arrays(*arrays)),
+                   1: (scenarios.algo_scenario1(states, p_x), scenarios.algo_scenario1_arrays(*arrays, p_x)),
+                   2: (scenarios.algo_scenario2(states, p_x, [soc, 0]),
+                       scenarios.algo_scenario2_arrays(*arrays, p_x, [soc, 0]))}
+        for scenario, (output, array_output) in outputs.items():
+            same = all(output['actions'][i + 1] == array_output['actions'][i] and
+                       output['hyst_states'][i + 1] == array_output['hyst_states'][i] for i in range(2))
+            if scenario == 2:
+                same &= output['actions']['bat'] == array_output['bat']
+            differences[scenario] += not same
+    return differences
+
+
+def fleet(units, rng):
+    boilers = {name: np.resize(values, units) for name, values in scenarios.BOILERS_ARRAYS.items()}
+    temps = rng.uniform(25, 65, units)
+    powers = np.where(rng.random(units) < 0.5, boilers['rated_p'], 0)
+    hyst_states = rng.integers(0, 2, units)
+    return boilers, temps, powers, hyst_states
+
+
+def timing(function, calls):
+    start = time.time()
+    for _ in range(calls):
+        function()
+    return (time.time() - start) / calls
+
+
+if __name__ == '__main__':
+
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = np.random.default_rng(1)
+    differences = compare(cases, rng)
+    print('Array versions against the algorithms on the two boilers,', cases, 'random states: differences',
+          ', '.join('Scenario' + str(scenario) + ' ' + str(count) for scenario, count in differences.items()))
+
+    temps, powers, hyst_states, p_x, soc = random_case(rng)
+    p_x = 6000.0
+    states = {i + 1: [temps[i], powers[i], hyst_states[i]] for i in range(2)}
+    print('Time per call, two boilers (dicts):', ' | '.join('Scenario{} {:6.2f} us'.format(scenario, 1e6 * timing(
+        function, TIMING_CALLS)) for scenario, function in [
+            (0, lambda: scenarios.algo_scenario0(states)), (1, lambda: scenarios.algo_scenario1(states, p_x)),
+            (2, lambda: scenarios.algo_scenario2(states, p_x, [soc, 0]))]))
+    for units in FLEET_SIZES:
+        boilers, temps, powers, hyst_states = fleet(units, rng)
+        p_x = 0.5 * units * -scenarios.BOILER1_RATED_P / 2              # covers about a quarter of the boilers
+        calls = max(10, TIMING_CALLS * 2 // units)
+        times = [timing(function, calls) for function in [
+            lambda: scenarios.algo_scenario0_arrays(temps, powers, hyst_states, boilers),
+            lambda: scenarios.algo_scenario1_arrays(temps, powers, hyst_states, p_x, boilers),
+            lambda: scenarios.algo_scenario2_arrays(temps, powers, hyst_states, p_x, [soc, 0], boilers)]]
+        print('Time per call, {:6d} boilers (arrays): '.format(units) + ' | '.join(
+            'Scenario{} {:9.2f} us ({:6.1f} ns per boiler)'.format(scenario, 1e6 * call_time, 1e9 * call_time / units)
+            for scenario, call_time in enumerate(times)))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_runner
+from EMS_simulation.control_algorithms import mpc_boilers
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+from EMS_simulation.benchmarks import event_triggered
+
+# Run from EMS_simulation: python benchmarks/solution_cache.py [steps]
+# Runs the sweep of event-triggered settings of benchmarks/event_triggered.py without cache, then with one CachedMPC
+# shared by all the settings of the sweep for several quantization resolutions. Reports the hits per setting, the
+# time of the sweep and the largest change of the daily cost due to the reuse of cached outputs.
+
+RESOLUTIONS = {'fine': {'Tb1': 0.01, 'Tb2': 0.01, 'soc_bat': 1, 'p_x': 1},
+               'default': {'Tb1': 0.1, 'Tb2': 0.1, 'soc_bat': 10, 'p_x': 50},
+               'coarse': {'Tb1': 0.5, 'Tb2': 0.5, 'soc_bat': 50, 'p_x': 250}}
+CACHE_SIZE = 2000
+
+
+def sweep(module, battery, steps, cache=None):
+    '''
+    :return: time of the sweep, daily cost and cache hits of each setting
+    '''
+    start = time.time()
+    costs, hits = [], []
+    for thresholds, max_age in event_triggered.SETTINGS.values():
+        hits_before = cache.hits if cache else 0
+        runner = mpc_runner.EventTriggeredMPC(cache or module.mpc_iteration, module.ITERATION_ARGS, thresholds,
+                                              max_age)
+        costs.append(event_triggered.run_day(runner, battery, steps)[0])
+        hits.append(cache.hits - hits_before if cache else 0)
+    return time.time() - start, costs, hits
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, module, battery in [('MPCboilers', mpc_boilers, False), ('MPCbattery', mpc_batteries, True)]:
+        print(name, '-', steps, 'control steps, sweep of', len(event_triggered.SETTINGS), 'settings:',
+              ', '.join(event_triggered.SETTINGS))
+        sweep_time, reference, _ = sweep(module, battery, steps)
+        print('    {:8s} sweep {:6.2f} s'.format('no cache', sweep_time))
+        for resolution_name, resolutions in RESOLUTIONS.items():
+            cache = mpc_runner.CachedMPC(module.mpc_iteration, module.ITERATION_ARGS, resolutions, CACHE_SIZE)
+            sweep_time, costs, hits = sweep(module, battery, steps, cache)
+            print('    {:8s} sweep {:6.2f} s | hits per setting {} | hit rate {:5.1%} | cached outputs {:5d} | max'
+                  ' daily cost change {:.4f} CHF'.format(
+                      resolution_name, sweep_time, hits, cache.hits / (cache.hits + cache.misses),
+                      len(cache.outputs), max(abs(cost - ref) for cost, ref in zip(costs, reference))))
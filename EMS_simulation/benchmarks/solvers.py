@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/solvers.py [steps] [backend ...]
+# Solves the shipped day of receding horizon MPC with each available LP backend (lp_solvers.BACKENDS) and reports,
+# per backend, the problem build time, the update and solve times per control step, the iterations and the
+# objective values, compared to the first backend.
+
+
+def benchmark(backend, battery, steps):
+    start = time.time()
+    problem = mpc_lp.MPCProblem(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, common.NO_SLOTS)
+    build_time = time.time() - start
+    solver = lp_solvers.make_solver(problem, backend)
+    start = time.time()
+    results = common.run_day(problem, solver, steps)
+    update_time = (time.time() - start - sum(solver.solve_times)) / steps      # update() and forecast windows
+    return {'build': build_time, 'update': update_time, 'solve': np.array(solver.solve_times),
+            'iterations': np.array(solver.iterations), 'objective': np.array([res.fun for res in results]),
+            'success': all(res.success for res in results)}
+
+
+if __name__ == '__main__':
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else common.DAY_STEPS
+    backends = sys.argv[2:] or lp_solvers.available_backends()
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, battery in [('MPCboilers', None), ('MPCbattery', mpc_batteries.BATTERY)]:
+        print(name, '-', steps, 'control steps,', common.NO_SLOTS, 'slots')
+        reference = None
+        for backend in backends:
+            stats = benchmark(backend, battery, steps)
+            if reference is None:
+                reference = stats['objective']
+            gap = np.abs(stats['objective'] - reference).max()
+            print('    {:14s} build {:6.2f} ms | update {:6.3f} ms/step | solve mean {:7.2f} ms max {:7.2f} ms'
+                  ' | iterations mean {:7.1f} max {:5d} | objective day sum {:10.4f} max gap {:.2e}{}'.format(
+                      backend, 1000 * stats['build'], 1000 * stats['update'], 1000 * stats['solve'].mean(),
+                      1000 * stats['solve'].max(), stats['iterations'].mean(), stats['iterations'].max(),
+                      stats['objective'].sum(), gap, '' if stats['success'] else ' | FAILED SOLVES'))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import numpy as np
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_runner
+from EMS_simulation.control_algorithms import mpc_boilers
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.control_algorithms import surrogate
+from EMS_simulation.benchmarks import common
+from EMS_simulation.benchmarks import event_triggered
+
+# Run from EMS_simulation: python benchmarks/surrogate.py [seeds]
+# Distills mpc_boilers and mpc_batteries into surrogate.Surrogate: runs the MPC in closed loop with the boiler and
+# battery models (as benchmarks/event_triggered.py) over the training days, for seeds excess power errors and random
+# initial states, with an exploration noise on the actions so that the samples also cover the states off the MPC
+# trajectory. The samples (features, MPC action) are saved to SAMPLE_PATHS and the fitted models to
+# surrogate.MODEL_PATHS (both reused when the files exist). Reports the fit, the model size, the inference time and
+# the daily cost of the surrogate against the online MPC on the held-out days, also with the difference of the energy
+# stored at the end of the day valued at the mean buy price of the day (a controller ending the day with colder boilers
+# or an emptier battery has a lower daily cost but buys the difference the day after).
+
+TRAINING_DAYS = [0, 1, 2]
+HELD_OUT_DAYS = [3]                                 # the forecasts cover 5 days, the last one only as horizon
+HELD_OUT_SEEDS = [101, 102]
+EXPLORATION_NOISE = 0.15                            # standard deviation of the noise, relative to the power limits
+SAMPLE_PATHS = {'boilers': 'data_input/surrogate_boilers_samples.npz',
+                'battery': 'data_input/surrogate_battery_samples.npz'}
+MODULES = {'boilers': (mpc_boilers, False), 'battery': (mpc_batteries, True)}
+
+
+class Recorder():
+    '''
+    Runner (as those of mpc_runner) that solves the MPC at every control step, records the features of the step with
+    the first action of the MPC, and actuates this action with a clipped Gaussian noise. A failed solve (e.g. a
+    temperature pushed above its maximum by the noise) is not recorded and actuates no power.
+    '''
+    def __init__(self, name, rng):
+        self.name = name
+        self.module = MODULES[name][0]
+        self.rng = rng
+        self.lower = np.array(surrogate.MODULES[name]['lower'], dtype=float)
+        self.upper = np.array(surrogate.MODULES[name]['upper'], dtype=float)
+        self.features = []
+        self.actions = []
+
+    def action(self, iteration, args):
+        outputs = self.module.mpc_iteration(*args, iteration)
+        keys = surrogate.MODULES[self.name]['actions']
+        if not outputs['success']:
+            return {key: 0 for key in keys}, 'mpc'
+        actions = np.array([outputs[key] for key in keys])
+        self.features.append(surrogate.features(self.name, iteration, args))
+        self.actions.append(actions)
+        noise = EXPLORATION_NOISE * (self.upper - self.lower) * self.rng.normal(size=len(actions))
+        return dict(zip(keys, np.clip(actions + noise, self.lower, self.upper).tolist())), 'mpc'
+
+
+def initial_state(rng):
+    temps = [rng.uniform(boiler['temp_min'] + 2, boiler['temp_max'] - 5) for boiler in mpc_batteries.BOILERS]
+    return temps + [rng.uniform(mpc_batteries.BATTERY['soc_min'], mpc_batteries.BATTERY['soc_max'])]
+
+
+def stored_energy(state):
+    '''
+    :param state: temperatures and state of charge returned by event_triggered.run_day
+    :return: energy stored in the boilers (above 0 degree celsius) and in the battery, in kWh
+    '''
+    energy = sum(boiler['capacity'] * temp for boiler, temp in zip(mpc_batteries.BOILERS, state[:2])) / 3.6e6
+    return energy + (state[2] / 1000 if len(state) > 2 else 0)
+
+
+def samples(name, seeds):
+    '''
+    :return: features and MPC actions of the training days, one line per control step
+    '''
+    if os.path.exists(SAMPLE_PATHS[name]):
+        data = np.load(SAMPLE_PATHS[name])
+        return data['features'], data['actions']
+    rng = np.random.default_rng(1)
+    recorder = Recorder(name, rng)
+    for day in TRAINING_DAYS:
+        for seed in range(seeds):
+            state = common.BOILERS_INITIAL_TEMP + [common.BATTERY_INITIAL_SOC] if seed == 0 else initial_state(rng)
+            event_triggered.run_day(recorder, MODULES[name][1], common.DAY_STEPS, day * common.DAY_STEPS, seed,
+                                    state)
+    features, actions = np.array(recorder.features), np.array(recorder.actions)
+    np.savez(SAMPLE_PATHS[name], features=features, actions=actions)
+    return features, actions
+
+
+if __name__ == '__main__':
+
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)           # loads the forecasts before any timing
+
+    for name, (module, battery) in MODULES.items():
+        start = time.time()
+        features, actions = samples(name, seeds)
+        sampling_time = time.time() - start
+        start = time.time()
+        if os.path.exists(surrogate.MODEL_PATHS[name]):
+            model = surrogate.Surrogate.load(surrogate.MODEL_PATHS[name])
+        else:
+            model = surrogate.Surrogate.fit(name, features, actions)
+            model.save(surrogate.MODEL_PATHS[name])
+        fitting_time = time.time() - start
+        errors = np.abs(model.predict(features) - actions)
+        parameters, size = model.size()
+        print('Surrogate of {} - {} samples ({:.0f} s) | fit {:.0f} s | training error mean {} W max {} W | {}'
+              ' parameters, {:.1f} kB'.format(module.__name__.split('.')[-1], len(features), sampling_time,
+                                              fitting_time, np.round(errors.mean(axis=0)),
+                                              np.round(errors.max(axis=0)), parameters, size / 1000))
+
+        for day in HELD_OUT_DAYS:
+            for seed in HELD_OUT_SEEDS:
+                first_step = day * common.DAY_STEPS
+                online = mpc_runner.DeadlineMPC(module.mpc_iteration, None)
+                online_cost, online_state = event_triggered.run_day(online, battery, common.DAY_STEPS, first_step,
+                                                                    seed)
+                learned = surrogate.Surrogate.load(surrogate.MODEL_PATHS[name])
+                learned_cost, learned_state = event_triggered.run_day(learned, battery, common.DAY_STEPS,
+                                                                      first_step, seed)
+                buy_price = np.mean(event_triggered.disturbances(common.DAY_STEPS, first_step, seed)[3])
+                storage_gap = (stored_energy(online_state) - stored_energy(learned_state)) * buy_price
+                print('    day {} seed {} | online MPC    time per step mean {:8.3f} ms | daily cost {:8.4f} CHF |'
+                      ' final state {}'.format(day, seed, 1000 * np.mean(online.solve_times), online_cost,
+                                               online_state))
+                print('    day {} seed {} | surrogate     time per step mean {:8.3f} ms | daily cost {:8.4f} CHF'
+                      ' ({:+.4f}, with the stored energy {:+.4f}) | final state {}'.format(
+                          day, seed, 1000 * np.mean(learned.inference_times), learned_cost,
+                          learned_cost - online_cost, learned_cost - online_cost + storage_gap, learned_state))
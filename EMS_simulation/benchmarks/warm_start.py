@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+
+# Run from EMS_simulation: python benchmarks/warm_start.py
+# Solves a full day of receding horizon MPC with the HiGHS dual simplex, from scratch and warm started with the
+# shifted basis of the previous step, and reports simplex iterations and wall time per control step.
+
+if __name__ == '__main__':
+
+    for name, battery in [('MPCboilers', None), ('MPCbattery', mpc_batteries.BATTERY)]:
+        stats = {}
+        for warm_start in (False, True):
+            problem = mpc_lp.MPCProblem(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, common.NO_SLOTS)
+            solver = lp_solvers.HighsSolver(problem, warm_start=warm_start)
+            results = common.run_day(problem, solver)
+            stats[warm_start] = (np.array(solver.iterations), np.array(solver.solve_times),
+                                 np.array([res.fun for res in results]))
+
+        print(name, '-', common.DAY_STEPS, 'control steps')
+        for warm_start, (iterations, times, objectives) in stats.items():
+            print('   ', 'warm start' if warm_start else 'cold start', ': iterations per step mean',
+                  round(iterations.mean(), 1), 'max', iterations.max(), '| time per step mean',
+                  round(1000 * times.mean(), 2), 'ms, max', round(1000 * times.max(), 2), 'ms | day total',
+                  round(times.sum(), 2), 's')
+        print('    max objective difference', np.abs(stats[True][2] - stats[False][2]).max())
+        print('    iterations per step (cold / warm):')
+        for step in range(common.DAY_STEPS):
+            print('       ', step, stats[False][0][step], stats[True][0][step])
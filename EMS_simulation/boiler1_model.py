@@ -6,6 +6,11 @@ import numpy as np
 from scipy import interpolate
 import paho.mqtt.client as mqtt
 import time
+import queue
+from EMS_simulation import data_loader
+from EMS_simulation import clock
+from EMS_simulation import fleet_models
+from EMS_simulation.water import d_WATER, C_WATER
 
 ## =========================    SIMULATION PARAMETERS    =============================== ##
 SIMU_TIMESTEP = 30                                  # in seconds
@@ -21,15 +26,14 @@ BOILER1_TEMP_INCOMING_WATER = 20                    # in degree celsius
 BOILER1_RATED_P = -7600                             # in Watts
 BOILER1_VOLUME = 800                                # in litres
 BOILER1_INITIAL_TEMP = 40                           # in degree celsius
-d_WATER = 977                                       # in grams/liter
-C_WATER = 4.186                                     # in degree/(gram*Watt)
 C_BOILER1 =  C_WATER * d_WATER * BOILER1_VOLUME     # in degree/(Watt*sec)
 
 broker_address ="mqtt.teserakt.io"   # use external broker (alternative broker address: "test.mosquitto.org")
 
 
 class Boiler():
-    def __init__(self, description, simu_timestep, max_power, min_temp, max_temp, current_temp):
+    def __init__(self, description, simu_timestep, max_power, min_temp, max_temp, current_temp, connect=True,
+                 energy_hot_water=None):
         self.description = description
         self.dt = simu_timestep
         self.max_power = max_power
@@ -37,8 +41,11 @@ class Boiler():
         self.max_temp = max_temp
         self.current_temp = current_temp
         self.power = 0
-        self.energy_hot_water = get_energy_hot_water_usage_simu()
-        self.client = self.setup_client()
+        # hot water profile, loaded from data_input unless given (e.g. loaded once for many simulations)
+        self.energy_hot_water = get_energy_hot_water_usage_simu() if energy_hot_water is None else energy_hot_water
+        self.client = self.setup_client() if connect else None     # no MQTT client in the lockstep simulation
+        self.actuations = queue.Queue()     # actions received, the model waits on it with clock.VIRTUAL_CLOCK
+        self.ticks = queue.Queue()          # ticks of the simulation clock (clock.VIRTUAL_CLOCK)
         self.time_step = 0
         self.time = 0
         self.control_received = False
@@ -54,6 +61,21 @@ class Boiler():
         self.time_step += 1
         self.time += self.dt
 
+    def model_advance(self, k, trace=False):
+        '''
+        Advances the model by k simulation steps at the current power, with the updates of k calls of model(). The
+        update is not linear in the temperature, see fleet_models.advance_temperature.
+        :param trace: return the temperature at the start of each step, i.e. the measurements published at each step
+        :return: with trace, array of the k temperatures, else None
+        '''
+        temp, temps = fleet_models.advance_temperature(
+            self.current_temp, self.energy_hot_water[self.time_step:self.time_step + k].tolist(),
+            (1/C_BOILER1) * self.dt*self.power, BOILER1_VOLUME, BOILER1_TEMP_INCOMING_WATER, trace)
+        self.current_temp = temp
+        self.time_step += k
+        self.time += k*self.dt
+        return temps
+
 
     def setup_client(self):
         client = mqtt.Client(self.description)
@@ -74,8 +96,8 @@ def new_resolution(y, step, days):      # creates new data points in between ori
     return new_y
 
 def get_energy_hot_water_usage_simu():
-    df = pd.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx', index_col=[0],
-                       usecols=[0,2])
+    df = data_loader.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
+                                usecols=[0,2])
     # hot_water_usage divided by 2 cause two boilers.
     hot_water_usage = df['Actual'].to_numpy()/2  /(10*60/SIMU_TIMESTEP) # data was in [litres*10min]
     hot_water_usage = new_resolution(hot_water_usage, SIMU_TIMESTEP, len(hot_water_usage)*10/(60*24))
@@ -104,19 +126,27 @@ def on_message_boiler(client, userdata, msg):
     message_handler(client, msg)
 
 def message_handler(client, msg):
+    if msg.topic == clock.TICK_TOPIC:
+        boiler1.ticks.put(int(msg.payload))
+        return
     if msg.topic == 'boiler1_actuator':
         boiler1.power = float(msg.payload)
         boiler1.control_received = True
+        boiler1.actuations.put(boiler1.power)
 
 
 if __name__ == '__main__':
 
     # instatiating boiler and connecting to controller
-    time.sleep(2)
+    if not clock.VIRTUAL_CLOCK:     # the clock starts the models once the controller subscribed
+        time.sleep(2)
     r = random.randrange(1, 100000)
     cname = "Boiler1-" + str(r)     # add randomness to name to avoid having two clients with same name
     boiler1 = Boiler(cname, SIMU_TIMESTEP, BOILER1_RATED_P, BOILER1_TEMP_MIN, BOILER1_TEMP_MAX, BOILER1_INITIAL_TEMP)
-    boiler1.client.subscribe('boiler1_actuator')
+    boiler1.client.subscribe('boiler1_actuator', qos=clock.QOS)
+    if clock.VIRTUAL_CLOCK:     # tick 0: the controller has subscribed to the measurements
+        boiler1.client.subscribe(clock.TICK_TOPIC, qos=clock.QOS)
+        clock.wait(boiler1.client, 'boiler1', 0, boiler1.ticks)
     # publish first message which simulates measurements prior to t=0:
     boiler1.client.publish('boiler1_sensor/power', boiler1.power)
     boiler1.client.publish('boiler1_sensor/temp', boiler1.current_temp)
@@ -124,14 +154,21 @@ if __name__ == '__main__':
     # with the simulation frequency, update model and send state to controller
     for t in SIMU_STEPS:
         if not (boiler1.time % CONTROL_TIMESTEP):   # only true when model timestep is a multiple of control period
-            while not boiler1.control_received:     # in that case, model waits for control period
-                time.sleep(0.001)
+            if clock.VIRTUAL_CLOCK:     # done with the previous control step, simulate this one once actuated
+                clock.wait(boiler1.client, 'boiler1', boiler1.time // CONTROL_TIMESTEP + 1, boiler1.actuations)
+            else:
+                while not boiler1.control_received:     # in that case, model waits for control period
+                    time.sleep(0.001)
         boiler1.client.publish('boiler1_sensor/temp', boiler1.current_temp)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         boiler1.client.publish('boiler1_sensor/power', boiler1.power)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         boiler1.model()
         boiler1.control_received = False
+    if clock.VIRTUAL_CLOCK:         # done with the last control step
+        clock.acknowledge(boiler1.client, 'boiler1', len(clock.CONTROL_STEPS) + 1).wait_for_publish()
 
     # close connection with controller
     time.sleep(5)
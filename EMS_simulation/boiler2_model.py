@@ -6,6 +6,11 @@ import numpy as np
 from scipy import interpolate
 import paho.mqtt.client as mqtt
 import time
+import queue
+from EMS_simulation import data_loader
+from EMS_simulation import clock
+from EMS_simulation import fleet_models
+from EMS_simulation.water import d_WATER, C_WATER
 
 ## =========================    SIMULATION PARAMETERS    =============================== ##
 SIMU_TIMESTEP = 30                                  # in seconds
@@ -21,14 +26,13 @@ BOILER2_TEMP_INCOMING_WATER = 20                    # in degree celsius
 BOILER2_RATED_P = -7600                             # in Watts
 BOILER2_VOLUME = 800                                # in litres
 BOILER2_INITIAL_TEMP = 30                           # in degree celsius
-d_WATER = 977                                       # in grams/liter
-C_WATER = 4.186                                     # in degree/(gram*Watt)
 C_BOILER1 =  C_WATER * d_WATER * BOILER2_VOLUME     # in degree/(Watt*sec)
 
 broker_address ="mqtt.teserakt.io"   # use external broker (alternative broker address: "test.mosquitto.org")
 
 class Boiler():
-    def __init__(self, description, simu_timestep, max_power, min_temp, max_temp, current_temp):
+    def __init__(self, description, simu_timestep, max_power, min_temp, max_temp, current_temp, connect=True,
+                 energy_hot_water=None):
         self.description = description
         self.dt = simu_timestep
         self.max_power = max_power
@@ -37,8 +41,11 @@ class Boiler():
         self.current_temp = current_temp
         self.power = 0
         self.hot_water_usage = get_hot_water_usage_simu()
-        self.energy_hot_water = get_energy_hot_water_usage_simu()
-        self.client = self.setup_client()
+        # hot water profile, loaded from data_input unless given (e.g. loaded once for many simulations)
+        self.energy_hot_water = get_energy_hot_water_usage_simu() if energy_hot_water is None else energy_hot_water
+        self.client = self.setup_client() if connect else None     # no MQTT client in the lockstep simulation
+        self.actuations = queue.Queue()     # actions received, the model waits on it with clock.VIRTUAL_CLOCK
+        self.ticks = queue.Queue()          # ticks of the simulation clock (clock.VIRTUAL_CLOCK)
         self.time_step = 0
         self.time = 0
         self.control_received = False
@@ -54,6 +61,21 @@ class Boiler():
         self.time_step += 1
         self.time += self.dt
 
+    def model_advance(self, k, trace=False):
+        '''
+        Advances the model by k simulation steps at the current power, with the updates of k calls of model(). The
+        update is not linear in the temperature, see fleet_models.advance_temperature.
+        :param trace: return the temperature at the start of each step, i.e. the measurements published at each step
+        :return: with trace, array of the k temperatures, else None
+        '''
+        temp, temps = fleet_models.advance_temperature(
+            self.current_temp, self.energy_hot_water[self.time_step:self.time_step + k].tolist(),
+            (1/C_BOILER1) * self.dt*self.power, BOILER2_VOLUME, BOILER2_TEMP_INCOMING_WATER, trace)
+        self.current_temp = temp
+        self.time_step += k
+        self.time += k*self.dt
+        return temps
+
 
     def setup_client(self):
         client = mqtt.Client(self.description)
@@ -78,16 +100,16 @@ def new_resolution(y, step, days):
 
 
 def get_hot_water_usage_simu():
-    df = pd.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx', index_col=[0],
-                       usecols=[0,2])
+    df = data_loader.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
+                                usecols=[0,2])
     hot_water_usage = df['Actual'].to_numpy()/2  /(10*60/SIMU_TIMESTEP) # data is in [litres*10min]
     hot_water_usage = new_resolution(hot_water_usage, SIMU_TIMESTEP, len(hot_water_usage)*10/(60*24))
     return hot_water_usage
 
 
 def get_energy_hot_water_usage_simu():
-    df = pd.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx', index_col=[0],
-                       usecols=[0,2])
+    df = data_loader.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
+                                usecols=[0,2])
     # hot_water_usage divided by 2 cause two boilers.
     hot_water_usage = df['Actual'].to_numpy()/2  /(10*60/SIMU_TIMESTEP) # data is in [litres*10min]
     hot_water_usage = new_resolution(hot_water_usage, SIMU_TIMESTEP, len(hot_water_usage)*10/(60*24))
@@ -117,18 +139,26 @@ def on_message_boiler(client, userdata, msg):
     message_handler(client, msg)
 
 def message_handler(client, msg):
+    if msg.topic == clock.TICK_TOPIC:
+        boiler2.ticks.put(int(msg.payload))
+        return
     if msg.topic == 'boiler2_actuator':
         boiler2.power = float(msg.payload)
         boiler2.control_received = True
+        boiler2.actuations.put(boiler2.power)
 
 if __name__ == '__main__':
 
     # instatiate boiler and connect to controller
-    time.sleep(2)
+    if not clock.VIRTUAL_CLOCK:     # the clock starts the models once the controller subscribed
+        time.sleep(2)
     r = random.randrange(1, 100000)
     cname = "Boiler2-" + str(r)    # add randomness to name to avoid having two clients with same name
     boiler2 = Boiler(cname, SIMU_TIMESTEP, BOILER2_RATED_P, BOILER2_TEMP_MIN, BOILER2_TEMP_MAX, BOILER2_INITIAL_TEMP)
-    boiler2.client.subscribe('boiler2_actuator')
+    boiler2.client.subscribe('boiler2_actuator', qos=clock.QOS)
+    if clock.VIRTUAL_CLOCK:     # tick 0: the controller has subscribed to the measurements
+        boiler2.client.subscribe(clock.TICK_TOPIC, qos=clock.QOS)
+        clock.wait(boiler2.client, 'boiler2', 0, boiler2.ticks)
     # publish first message which simulates measurements prior to t=0:
     boiler2.client.publish('boiler2_sensor/power', boiler2.power)
     boiler2.client.publish('boiler2_sensor/temp', boiler2.current_temp)
@@ -136,14 +166,21 @@ if __name__ == '__main__':
     # with the simulation frequency, update model and send state to controller
     for t in SIMU_STEPS:
         if not (boiler2.time % CONTROL_TIMESTEP):   # only true when model timestep is a multiple of control period
-            while not boiler2.control_received:     # in that case, model waits for control period
-                time.sleep(0.001)
+            if clock.VIRTUAL_CLOCK:     # done with the previous control step, simulate this one once actuated
+                clock.wait(boiler2.client, 'boiler2', boiler2.time // CONTROL_TIMESTEP + 1, boiler2.actuations)
+            else:
+                while not boiler2.control_received:     # in that case, model waits for control period
+                    time.sleep(0.001)
         boiler2.client.publish('boiler2_sensor/temp', boiler2.current_temp)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         boiler2.client.publish('boiler2_sensor/power', boiler2.power)
-        time.sleep(0.0001)
+        if not clock.VIRTUAL_CLOCK:
+            time.sleep(0.0001)
         boiler2.model()
         boiler2.control_received = False
+    if clock.VIRTUAL_CLOCK:         # done with the last control step
+        clock.acknowledge(boiler2.client, 'boiler2', len(clock.CONTROL_STEPS) + 1).wait_for_publish()
 
     # close connection with controller
     time.sleep(5)
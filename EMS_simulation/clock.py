@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import sys
+import queue
+import random
+import time
+import paho.mqtt.client as mqtt
+
+## =========================    SIMULATION PARAMETERS    =============================== ##
+SIMU_TIMESTEP = 30                                  # in seconds
+CONTROL_TIMESTEP = 5*60                             # in seconds
+HORIZON = 1440*60                                   # in seconds, corresponds to 24 hours
+# True: the entities advance on the ticks of this clock, as soon as all of them acknowledged the previous control step.
+# False: the controller paces itself with sleeps and the models poll for the actions
+VIRTUAL_CLOCK = False
+RETRY = 1                                           # in seconds, an entity waiting longer acknowledges again
+TIMEOUT = 120                                       # in seconds, an entity waiting longer gives up
+## ==================================================================================== ##
+
+CONTROL_STEPS = range(0, int(HORIZON/SIMU_TIMESTEP), int(CONTROL_TIMESTEP/SIMU_TIMESTEP))
+TICK_TOPIC = 'clock/tick'       # payload: the tick the entities may start
+ACK_TOPIC = 'clock/ack'         # payload: the name of an entity and the tick it waits for
+QOS = 1                         # ticks, acknowledgements and actions are delivered at least once
+
+broker_address ="mqtt.teserakt.io"   # use external broker (alternative broker address: "test.mosquitto.org")
+
+
+class SimulationClock():
+    '''
+    Barrier of the distributed simulation: publishes tick k once every entity acknowledged that it waits for it. On
+    tick 0, the models publish their first measurements (the controller has subscribed to them when it acknowledged).
+    On tick k, the controller runs control step k-1 on the measurements received so far and publishes the actions,
+    and the models simulate the control step when they receive them, publishing the measurements of each simulation
+    step. The last tick, once every entity is done with the last control step, ends the simulation.
+    The entities acknowledge again every RETRY seconds while they wait (see wait()): an acknowledgement sent before
+    the clock subscribed or lost is sent again, and an acknowledgement of a tick already published means that the
+    entity missed it, which the clock publishes again (the entities skip the ticks they already got).
+    '''
+    def __init__(self, description, entities):
+        self.description = description
+        self.entities = entities
+        self.acks = queue.Queue()
+        self.client = self.setup_client()
+        self.tick_times = []
+
+    def run(self):
+        waiting = dict.fromkeys(self.entities, -1)      # tick each entity waits for
+        for tick in range(len(CONTROL_STEPS) + 2):
+            while min(waiting.values()) < tick:
+                try:
+                    name, waits_for = self.acks.get(timeout=TIMEOUT)
+                except queue.Empty:
+                    raise TimeoutError('no acknowledgement of tick ' + str(tick) + ' from ' +
+                                       str([name for name, waits_for in waiting.items() if waits_for < tick]))
+                if name in waiting:
+                    waiting[name] = max(waiting[name], waits_for)
+                    if waits_for == tick - 1:       # the entity missed the last tick
+                        self.client.publish(TICK_TOPIC, tick - 1, qos=QOS)
+            self.tick_times.append(time.time())
+            self.client.publish(TICK_TOPIC, tick, qos=QOS)
+
+    def setup_client(self):
+        client = mqtt.Client(self.description)
+        client.on_connect = on_connect
+        #client.on_log = on_log
+        client.on_disconnect = on_disconnect
+        client.on_message = on_message_clock
+        client.connect(broker_address)
+        client.loop_start()  # without the loop, the call back functions dont get processed
+        return client
+
+
+def acknowledge(client, name, tick):
+    '''
+    Tells the clock that the entity name waits for tick (it is done with the previous one)
+    :return: paho.mqtt.client.MQTTMessageInfo of the acknowledgement
+    '''
+    return client.publish(ACK_TOPIC, name + ' ' + str(tick), qos=QOS)
+
+
+def wait(client, name, tick, events, skip_before=None):
+    '''
+    Acknowledges tick and waits for the next event, acknowledging again every RETRY seconds without one
+    :param events: queue.Queue of the ticks (controller) or of the actions received (models)
+    :param skip_before: events lower than skip_before are skipped, e.g. the ticks published again
+    :return: the event
+    '''
+    start = time.time()
+    while True:
+        acknowledge(client, name, tick)
+        try:
+            event = events.get(timeout=RETRY)
+        except queue.Empty:
+            if time.time() - start > TIMEOUT:
+                raise TimeoutError(name + ' waited ' + str(TIMEOUT) + ' s for tick ' + str(tick))
+            continue
+        if skip_before is None or event >= skip_before:
+            return event
+
+
+# callback functions for communication
+def on_log(client, userdata, level, buf):
+    print("log: ",buf)
+
+def on_connect(client, userdata, flags, rc):
+    if rc==0:
+        print('clock connected')
+    else:
+        print('bad connection Returned code=', rc)
+
+def on_disconnect(client, userdata, flags, rc=0):
+    print('clock disconnected')
+
+def on_message_clock(client, userdata, msg):
+    if msg.topic == ACK_TOPIC:
+        name, tick = str(msg.payload.decode("utf-8", "ignore")).split()
+        clock.acks.put((name, int(tick)))
+
+
+if __name__ == '__main__':
+
+    # python clock.py [battery]: the entities are the controller, the boilers and, with battery, the battery
+    entities = ['controller', 'boiler1', 'boiler2'] + (['battery'] if 'battery' in sys.argv[1:] else [])
+    r = random.randrange(1, 100000)
+    clock = SimulationClock("Clock-" + str(r), entities)
+    clock.client.subscribe(ACK_TOPIC, qos=QOS)
+    clock.run()
+
+    # the controller paces itself with a 0.1 s sleep per simulation step of each control step
+    elapsed = clock.tick_times[-1] - clock.tick_times[1]
+    paced = len(CONTROL_STEPS) * 0.1 * (CONTROL_TIMESTEP / SIMU_TIMESTEP)
+    print('Simulated', HORIZON / 3600, 'h in', round(elapsed, 2), 's: control step mean',
+          round(1000 * elapsed / len(CONTROL_STEPS), 1), 'ms, speedup', round(paced / elapsed, 1),
+          'over the', paced, 's of sleeps of the paced controller')
+    time.sleep(1)
+    clock.client.loop_stop()
+    clock.client.disconnect(broker_address)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+def grid_cost(grid_power, sell_price, buy_price, control_timestep):
+    '''
+    :param grid_power: power bought from the grid (negative when sold) in Watts
+    :param sell_price: in CHF/kWh, broadcastable to grid_power
+    :param buy_price: in CHF/kWh, broadcastable to grid_power
+    :return: cost of the grid power over a control step in CHF, as Phi in mpc_lp.MPCProblem
+    '''
+    energy = grid_power * control_timestep / 60 / 1000         # in kWh
+    return np.maximum(buy_price * energy, sell_price * energy)
+
+
+class BatteryDP():
+    '''
+    Battery arbitrage by backward dynamic programming on a grid of states of charge: given the power exchanged with
+    the grid without the battery, finds the battery powers minimising the grid cost over the horizon, with the battery
+    model, power limits and state of charge bounds of mpc_lp.MPCProblem. The cost of a control step only depends on
+    the battery power, so on the move on the grid: the value function of a step is a minimum over a sliding window of
+    the value function of the next step, computed for all the states at once.
+    :param battery: dict with keys 'soc_min', 'soc_max', 'charge_power_limit', 'discharge_power_limit', 'efficiency'
+    :param control_timestep: in minutes
+    :param soc_step: in Watts-h, spacing of the state of charge grid (the moves are multiples of soc_step, within the
+    power limits)
+    '''
+    def __init__(self, battery, control_timestep, horizon_steps, soc_step):
+        self.battery = battery
+        self.control_timestep = control_timestep
+        self.horizon_steps = horizon_steps
+        self.soc_step = soc_step
+        self.grid = np.arange(battery['soc_min'], battery['soc_max'] + soc_step / 2, soc_step)
+        # energy stored per Watt of battery power over a control step: Ebat = Ebat_previous - Pbat * energy_per_watt
+        self.energy_per_watt = battery['efficiency'] * control_timestep / 60
+        max_up = int(np.floor(-battery['charge_power_limit'] * self.energy_per_watt / soc_step + 1e-9))
+        max_down = int(np.floor(battery['discharge_power_limit'] * self.energy_per_watt / soc_step + 1e-9))
+        self.moves = np.arange(-max_down, max_up + 1)               # in grid steps
+        self.move_powers = -self.moves * soc_step / self.energy_per_watt
+        # windows[i] indexes the states reachable from state i in a value function padded with max_down and max_up
+        # infinite values
+        self.max_down = max_down
+        self.windows = np.arange(len(self.grid))[:, None] + np.arange(len(self.moves))[None, :]
+        self.rows = np.arange(len(self.grid))
+        self.padded = np.full(len(self.grid) + len(self.moves) - 1, np.inf)
+
+    def solve(self, grid_power, sell_price, buy_price, soc_init):
+        '''
+        :param grid_power: power bought from the grid without the battery, in Watts, one entry per control step of
+        the horizon (e.g. minus the excess power)
+        :param soc_init: measured state of charge, in Watts-h. It does not need to lie on the grid, the first move
+        goes to the grid points reachable within the power limits (to the nearest one when none is)
+        :return: dict with the battery powers 'p_bat', the states of charge at the start of each step 'soc' and the
+        cost of the horizon 'cost'
+        '''
+        grid_power = np.asarray(grid_power, dtype=float)[:self.horizon_steps]
+        sell_price = np.asarray(sell_price, dtype=float)[:self.horizon_steps]
+        buy_price = np.asarray(buy_price, dtype=float)[:self.horizon_steps]
+        steps = len(grid_power)
+        # battery power is positive when discharging, it reduces the power bought from the grid
+        move_costs = grid_cost(grid_power[:, None] - self.move_powers[None, :], sell_price[:, None],
+                               buy_price[:, None], self.control_timestep)
+        no_states = len(self.grid)
+        policy = np.empty((steps, no_states), dtype=np.int16)
+        value = np.zeros(no_states)
+        padded, states = self.padded, slice(self.max_down, self.max_down + no_states)
+        for t in range(steps - 1, 0, -1):
+            padded[states] = value
+            total = padded[self.windows]
+            total += move_costs[t]
+            policy[t] = total.argmin(axis=1)
+            value = total[self.rows, policy[t]]
+
+        # first step, from the measured state of charge to the reachable grid points
+        powers = (soc_init - self.grid) / self.energy_per_watt
+        reachable = (powers >= self.battery['charge_power_limit'] - 1e-9) & \
+                    (powers <= self.battery['discharge_power_limit'] + 1e-9)
+        if not reachable.any():
+            reachable = np.abs(self.grid - soc_init) == np.abs(self.grid - soc_init).min()
+        first_costs = grid_cost(grid_power[0] - powers, sell_price[0], buy_price[0], self.control_timestep)
+        total = np.where(reachable, first_costs + (value if steps > 1 else 0), np.inf)
+        state = total.argmin()
+
+        p_bat = np.empty(steps)
+        soc = np.empty(steps)
+        soc[0] = soc_init
+        p_bat[0] = powers[state]
+        for t in range(1, steps):
+            soc[t] = self.grid[state]
+            move = policy[t, state]
+            p_bat[t] = self.move_powers[move]
+            state += self.moves[move]
+        return {'p_bat': p_bat, 'soc': soc, 'cost': total.min()}
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from datetime import timedelta
+from functools import lru_cache
+from EMS_simulation import data_loader
+from EMS_simulation import timeseries
+from EMS_simulation.water import d_WATER, C_WATER
+
+
+DATA_GRANULARITY = timedelta(minutes=10)            # granularity of the data_input workbooks
+
+
+def get_excess_power_forecast(control_timestep):
+    df = data_loader.read_excel('data_input/Energie - 00003 - Pache.xlsx', usecols=[0, 1])
+    # Convert the energy (kWh) to power (W) and power convention (buy positive and sell negative)
+    excess = df['Flux energie au point d\'injection (kWh)'].to_numpy() * (-6000)
+    excess = timeseries.on_regular_grid(df.index, excess, DATA_GRANULARITY)
+    return excess.resample(timedelta(minutes=control_timestep))
+
+
+def get_hot_water_energy_usage_forecast(control_timestep):
+    df = data_loader.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
+                                usecols=[0, 1])
+    # data is in [litres/CONTROL_TIMESTEP], divided by 2 cause 2 boilers
+    litres_forecast = df['Hot water usage (litres)'].to_numpy() / (10 / control_timestep) / 2
+    # Energy/TIMESLOT : [L * g/L * W*s/(g*K) * K]  # forecast is created considering volume forecast and T=40 degrees
+    energy_forecast = timeseries.on_regular_grid(df.index, litres_forecast * d_WATER * C_WATER * 40, DATA_GRANULARITY)
+    return energy_forecast.resample(timedelta(minutes=control_timestep))
+
+
+def get_energy_sell_price(control_timestep):
+    df = data_loader.read_excel('data_input/energy_sell_price_10min_granularity.xlsx', usecols=[0, 1])
+    sell_price = timeseries.on_regular_grid(df.index, df['Sell Price (CHF / kWh)'].to_numpy(), DATA_GRANULARITY)
+    return sell_price.resample(timedelta(minutes=control_timestep))
+
+
+def get_energy_buy_price(control_timestep):
+    df = data_loader.read_excel('data_input/energy_buy_price_10min_granularity.xlsx', usecols=[0, 1])
+    buy_price = timeseries.on_regular_grid(df.index, df['Buy Price (CHF / kWh)'].to_numpy(), DATA_GRANULARITY)
+    return buy_price.resample(timedelta(minutes=control_timestep))
+
+
+class ForecastProvider():
+    '''
+    Loads the disturbance forecasts and energy prices once and keeps them as regular time series with one sample per
+    control slot. Each MPC iteration gets the horizon starting at its current time as numpy views (no copy).
+    '''
+    def __init__(self, control_timestep):
+        self.control_timestep = control_timestep              # in minutes
+        self.excess_power = get_excess_power_forecast(control_timestep)
+        self.hot_water_energy = get_hot_water_energy_usage_forecast(control_timestep)
+        self.sell_price = get_energy_sell_price(control_timestep)
+        self.buy_price = get_energy_buy_price(control_timestep)
+
+    def window(self, current_time, no_slots):
+        '''
+        :return: excess power, hot water energy, sell price and buy price for the no_slots slots from current_time
+        '''
+        return self.excess_power.horizon(current_time, no_slots), \
+            self.hot_water_energy.horizon(current_time, no_slots), \
+            self.sell_price.horizon(current_time, no_slots), \
+            self.buy_price.horizon(current_time, no_slots)
+
+
+@lru_cache(maxsize=None)
+def get_forecast_provider(control_timestep):
+    # one provider per process and per control timestep, shared by the MPC modules
+    return ForecastProvider(control_timestep)
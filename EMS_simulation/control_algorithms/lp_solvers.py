@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+import time
+from scipy.optimize import linprog, OptimizeResult
+from scipy import sparse
+import numpy as np
+
+try:
+    import highspy
+except ImportError:     # the highs-* backends and warm start need the HiGHS python interface: pip install highspy
+    highspy = None
+
+try:
+    import clarabel
+except ImportError:     # optional interior point backend: pip install clarabel
+    clarabel = None
+
+LINPROG_OPTIONS = {"disp": False, "maxiter": 50000, "primal_feasibility_tolerance": 1e-6,
+                   "dual_feasibility_tolerance": 1e-6}
+MAX_CUT_ROUNDS = 50                                 # solves of one control step for a problem with lazy cuts
+MAX_COEF_CHANGES = 10000                            # forecast dependent coefficients HiGHS gets with changeCoeff
+
+
+def solve_lp(c, A_eq, b_eq, A_ub, b_ub, bounds, method='highs'):
+    return linprog(c, A_eq=A_eq, b_eq=b_eq, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method=method,
+                   options=LINPROG_OPTIONS)
+
+
+class LinprogSolver():
+    '''
+    Solves each LP of an MPCProblem from scratch with scipy's linprog. With lazy cuts, the violated cuts are stacked
+    under A_ub and the LP is solved again from scratch.
+    :param method: 'highs' (HiGHS chooses), 'highs-ds' (dual simplex) or 'highs-ipm' (interior point)
+    '''
+    def __init__(self, problem, method='highs'):
+        self.problem = problem
+        self.method = method
+        self.iterations = []
+        self.solve_times = []
+        self.cut_rounds = []                    # solves per control step
+        self.added_cuts = []                    # cuts added per control step by violated_cuts()
+
+    def solve(self):
+        p = self.problem
+        start = time.time()
+        A_ub, b_ub = p.A_ub, p.b_ub
+        cuts = p.carried_cuts() if p.lazy_cuts else None
+        if cuts is not None:
+            A_ub = sparse.vstack([A_ub, cuts[0]], format='csr')
+            b_ub = np.concatenate((b_ub, cuts[1]))
+        no_rows = A_ub.shape[0]
+        res = solve_lp(p.c, p.A_eq, p.b_eq, A_ub, b_ub, p.bounds, self.method)
+        rounds, iterations = 1, res.nit
+        while p.lazy_cuts and res.success and rounds < MAX_CUT_ROUNDS:
+            cuts = p.violated_cuts(res.x)
+            if cuts is None:
+                break
+            A_ub = sparse.vstack([A_ub, cuts[0]], format='csr')
+            b_ub = np.concatenate((b_ub, cuts[1]))
+            res = solve_lp(p.c, p.A_eq, p.b_eq, A_ub, b_ub, p.bounds, self.method)
+            rounds, iterations = rounds + 1, iterations + res.nit
+        res.nit = iterations
+        self.solve_times.append(time.time() - start)
+        self.iterations.append(iterations)
+        self.cut_rounds.append(rounds)
+        self.added_cuts.append(A_ub.shape[0] - no_rows)
+        return res
+
+
+class HighsSolver():
+    '''
+    Solves the successive LPs of an MPCProblem with HiGHS through highspy.
+    :param solver: 'simplex' (dual simplex) or 'ipm' (interior point, with crossover)
+    :param warm_start: simplex only. The optimal basis of a solve is shifted by one slot (the horizon recedes by one
+    slot between two control steps) and used as starting basis of the next solve.
+    The model is passed to HiGHS once, each solve only pushes what update() rewrote (see push_update()).
+    With lazy cuts, the violated cuts are added to the model in HiGHS, which solves again from the current basis.
+    '''
+    def __init__(self, problem, solver='simplex', warm_start=True):
+        if highspy is None:
+            raise ImportError('HighsSolver needs the highspy package (pip install highspy)')
+        self.problem = problem
+        self.solver = solver
+        self.warm_start = warm_start and solver == 'simplex'
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.setOptionValue('solver', solver)
+        self.highs.setOptionValue('simplex_strategy', 1)                 # dual simplex
+        self.highs.setOptionValue('primal_feasibility_tolerance', LINPROG_OPTIONS['primal_feasibility_tolerance'])
+        self.highs.setOptionValue('dual_feasibility_tolerance', LINPROG_OPTIONS['dual_feasibility_tolerance'])
+        self.highs.setOptionValue('simplex_iteration_limit', LINPROG_OPTIONS['maxiter'])
+        self.highs.passModel(self.model())
+        # rows of the model without the lazy cuts, and rows and columns of the coefficients rewritten by update()
+        self.no_rows = len(problem.b_eq) + len(problem.b_ub)
+        self.row_lower = np.concatenate((problem.b_eq, np.full(len(problem.b_ub), -highspy.kHighsInf)))
+        ub_rows = np.repeat(np.arange(len(problem.b_ub)), np.diff(problem.A_ub.indptr))
+        self.coef_rows = (len(problem.b_eq) + ub_rows[problem.forecast_data]).tolist()
+        self.coef_cols = problem.A_ub.indices[problem.forecast_data].tolist()
+        self.col_status = None                  # basis of the last solve, shifted by one slot
+        self.row_status = None
+        self.iterations = []
+        self.solve_times = []
+        self.cut_rounds = []                    # solves per control step
+        self.added_cuts = []                    # cuts added per control step by violated_cuts()
+
+    def model(self):
+        p = self.problem
+        A = sparse.vstack([p.A_eq, p.A_ub], format='csr')
+        lp = highspy.HighsLp()
+        lp.num_col_ = A.shape[1]
+        lp.num_row_ = A.shape[0]
+        lp.col_cost_ = p.c
+        lp.col_lower_ = p.bounds[:, 0]
+        lp.col_upper_ = p.bounds[:, 1]
+        lp.row_lower_ = np.concatenate((p.b_eq, np.full(len(p.b_ub), -highspy.kHighsInf)))
+        lp.row_upper_ = np.concatenate((p.b_eq, p.b_ub))
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_ = A.shape[1]
+        lp.a_matrix_.num_row_ = A.shape[0]
+        lp.a_matrix_.start_ = A.indptr
+        lp.a_matrix_.index_ = A.indices
+        lp.a_matrix_.value_ = A.data
+        return lp
+
+    def push_update(self):
+        '''
+        Writes the right-hand sides, the costs and the forecast dependent coefficients of A_ub (problem.forecast_data)
+        of the problem into the model in HiGHS. changeCoeff changes one coefficient per call, and a new model is passed
+        instead when there are more than MAX_COEF_CHANGES (most of the matrix of the condensed formulation).
+        '''
+        p = self.problem
+        if len(self.coef_rows) > MAX_COEF_CHANGES:
+            self.highs.passModel(self.model())
+            return
+        self.row_lower[:len(p.b_eq)] = p.b_eq
+        self.highs.changeRowsBounds(self.no_rows, np.arange(self.no_rows), self.row_lower,
+                                    np.concatenate((p.b_eq, p.b_ub)))
+        self.highs.changeColsCost(len(p.c), np.arange(len(p.c)), p.c)
+        for row, col, value in zip(self.coef_rows, self.coef_cols, p.A_ub.data[p.forecast_data].tolist()):
+            self.highs.changeCoeff(row, col, value)
+
+    def solve(self):
+        start = time.time()
+        no_rows = self.highs.getNumRow()
+        if no_rows > self.no_rows:              # lazy cuts of the previous step
+            self.highs.deleteRows(no_rows - self.no_rows, np.arange(self.no_rows, no_rows))
+        self.push_update()
+        self.highs.clearSolver()
+        carried_cuts = self.problem.carried_cuts() if self.problem.lazy_cuts else None
+        self.add_cuts(carried_cuts)
+        if self.warm_start and self.col_status is not None:
+            statuses = list(highspy.HighsBasisStatus.__members__.values())
+            basis = highspy.HighsBasis()
+            basis.col_status = [statuses[s] for s in self.col_status.tolist()]
+            basis.row_status = [statuses[s] for s in self.row_status.tolist()]
+            if carried_cuts is not None:      # cuts added because they were violated, most are active
+                basis.row_status += [highspy.HighsBasisStatus.kUpper] * len(carried_cuts[1])
+            basis.valid = True
+            basis.alien = True              # the shifted basis may not have exactly one basic variable per row
+            self.highs.setBasis(basis)
+        success, x, iterations = self.run()
+        rounds, added_cuts = 1, 0
+        while self.problem.lazy_cuts and success and rounds < MAX_CUT_ROUNDS:
+            cuts = self.problem.violated_cuts(x)
+            if cuts is None:
+                break
+            self.add_cuts(cuts)
+            success, x, cut_iterations = self.run()
+            rounds, iterations, added_cuts = rounds + 1, iterations + cut_iterations, added_cuts + len(cuts[1])
+        if self.warm_start and success:
+            basis = self.highs.getBasis()
+            col_status = np.array([s.value for s in basis.col_status])
+            row_status = np.array([s.value for s in basis.row_status[:self.no_rows]])      # without the lazy cuts
+            self.col_status, self.row_status = self.problem.shift_basis(col_status, row_status)
+        else:
+            self.col_status = self.row_status = None
+        self.solve_times.append(time.time() - start)
+        self.iterations.append(iterations)
+        self.cut_rounds.append(rounds)
+        self.added_cuts.append(added_cuts)
+        message = self.highs.modelStatusToString(self.highs.getModelStatus())
+        return OptimizeResult(x=x, fun=self.highs.getInfo().objective_function_value, success=success,
+                              status=0 if success else 4, nit=iterations, message=message)
+
+    def add_cuts(self, cuts):
+        if cuts is not None:
+            A, b = cuts
+            self.highs.addRows(len(b), np.full(len(b), -highspy.kHighsInf), b, A.nnz, A.indptr[:-1], A.indices,
+                               A.data)
+
+    def run(self):
+        self.highs.run()
+        info = self.highs.getInfo()
+        success = self.highs.getModelStatus() == highspy.HighsModelStatus.kOptimal
+        x = np.array(self.highs.getSolution().col_value)
+        iterations = info.simplex_iteration_count if self.solver == 'simplex' else info.ipm_iteration_count
+        return success, x, iterations
+
+
+class ClarabelSolver():
+    '''
+    Solves each LP of an MPCProblem with the Clarabel interior point solver (conic form, no crossover).
+    '''
+    def __init__(self, problem):
+        if clarabel is None:
+            raise ImportError('ClarabelSolver needs the clarabel package (pip install clarabel)')
+        if problem.lazy_cuts:
+            raise ValueError('lazy cuts need a linprog or highs backend')
+        self.problem = problem
+        self.settings = clarabel.DefaultSettings()
+        self.settings.verbose = False
+        self.iterations = []
+        self.solve_times = []
+
+    def solve(self):
+        p = self.problem
+        start = time.time()
+        # A x + s = b with s = 0 for the equalities and s >= 0 for the inequalities and the finite bounds
+        identity = sparse.identity(len(p.c), format='csr')
+        upper = np.isfinite(p.bounds[:, 1])
+        lower = np.isfinite(p.bounds[:, 0])
+        A = sparse.vstack([p.A_eq, p.A_ub, identity[upper], -identity[lower]], format='csc')
+        b = np.concatenate((p.b_eq, p.b_ub, p.bounds[upper, 1], -p.bounds[lower, 0]))
+        cones = [clarabel.ZeroConeT(len(p.b_eq)), clarabel.NonnegativeConeT(len(b) - len(p.b_eq))]
+        P = sparse.csc_matrix((len(p.c), len(p.c)))
+        solution = clarabel.DefaultSolver(P, p.c, A, b, cones, self.settings).solve()
+        success = str(solution.status) == 'Solved'
+        self.solve_times.append(time.time() - start)
+        self.iterations.append(solution.iterations)
+        return OptimizeResult(x=np.array(solution.x), fun=solution.obj_val, success=success,
+                              status=0 if success else 4, nit=solution.iterations, message=str(solution.status))
+
+
+# LP backends by name, 'warm' means the backend uses the shifted basis of the previous solve
+BACKENDS = {
+    'linprog': lambda problem: LinprogSolver(problem, 'highs'),
+    'linprog-ds': lambda problem: LinprogSolver(problem, 'highs-ds'),
+    'linprog-ipm': lambda problem: LinprogSolver(problem, 'highs-ipm'),
+    'highs-ds': lambda problem: HighsSolver(problem, 'simplex', warm_start=False),
+    'highs-ds-warm': lambda problem: HighsSolver(problem, 'simplex', warm_start=True),
+    'highs-ipm': lambda problem: HighsSolver(problem, 'ipm', warm_start=False),
+    'clarabel': lambda problem: ClarabelSolver(problem),
+}
+# what the highspy backends fall back to when highspy is not installed
+LINPROG_EQUIVALENT = {'highs-ds': 'linprog-ds', 'highs-ds-warm': 'linprog-ds', 'highs-ipm': 'linprog-ipm'}
+
+
+def available_backends():
+    return [name for name in BACKENDS if not (name.startswith('highs') and highspy is None)
+            and not (name == 'clarabel' and clarabel is None)]
+
+
+def make_solver(problem, backend):
+    if backend not in BACKENDS:
+        raise ValueError('unknown LP backend ' + backend + ', choose among ' + ', '.join(BACKENDS))
+    if highspy is None and backend in LINPROG_EQUIVALENT:
+        print('highspy not installed,', backend, 'replaced by', LINPROG_EQUIVALENT[backend])
+        backend = LINPROG_EQUIVALENT[backend]
+    return BACKENDS[backend](problem)
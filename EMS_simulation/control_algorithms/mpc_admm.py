@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+import time
+import numpy as np
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor
+from EMS_simulation.control_algorithms import mpc_assets
+try:
+    import clarabel
+except ImportError:         # optional, the asset subproblems are quadratic programs solved by Clarabel
+    clarabel = None
+
+
+## =========================    ADMM PARAMETERS    =============================== ##
+RHO = 1e-10                                         # penalty, in CHF per W^2 per slot
+TOLERANCE = 10                                      # in Watts, on the power balance and the change of the summed power
+MAX_ITERATIONS = 300
+## ==================================================================================== ##
+
+
+class AssetSubproblem():
+    '''
+    Subproblem of one asset: its constraints and mixing terms (mpc_assets.AssetMPCProblem without the grid) plus the
+    proximal term rho/2 * ||P - target||^2 on its powers, solved as a QP by Clarabel. The objective is divided by rho
+    to keep the Hessian entries at 1.
+    :param kind: 'boiler' or 'battery'
+    '''
+    def __init__(self, kind, asset, control_timestep, horizon_steps, schedule=None):
+        if clarabel is None:
+            raise ImportError('the decomposed MPC needs the clarabel package (pip install clarabel)')
+        boilers, batteries = ([asset], []) if kind == 'boiler' else ([], [asset])
+        self.problem = mpc_assets.AssetMPCProblem(boilers, batteries, control_timestep, horizon_steps, schedule,
+                                                  grid=False)
+        p = self.problem
+        var = p.boiler_vars(mpc_assets.PB) if kind == 'boiler' else p.battery_vars(mpc_assets.PBAT)
+        self.power_columns = p.column(var).ravel()
+        diagonal = np.zeros(p.no_ctrl_vars)
+        diagonal[self.power_columns] = 1
+        self.P = sparse.diags(diagonal, format='csc')
+        self.settings = clarabel.DefaultSettings()
+        self.settings.verbose = False
+
+    def solve(self, update, target, rho):
+        '''
+        :param update: arguments of AssetMPCProblem.update() for this asset
+        :param target: power of each slot the proximal term pulls towards
+        :return: powers of the asset in each slot and the cost of its mixing terms
+        '''
+        p = self.problem
+        p.update(*update)
+        # A x + s = b with s = 0 for the equalities and s >= 0 for the inequalities and the finite bounds, as in
+        # lp_solvers.ClarabelSolver
+        identity = sparse.identity(p.no_ctrl_vars, format='csr')
+        upper = np.isfinite(p.bounds[:, 1])
+        lower = np.isfinite(p.bounds[:, 0])
+        inequalities = [p.A_ub] if p.A_ub is not None else []
+        A = sparse.vstack([p.A_eq] + inequalities + [identity[upper], -identity[lower]], format='csc')
+        b = np.concatenate([p.b_eq] + ([p.b_ub] if p.A_ub is not None else []) +
+                           [p.bounds[upper, 1], -p.bounds[lower, 0]])
+        cones = [clarabel.ZeroConeT(len(p.b_eq)), clarabel.NonnegativeConeT(len(b) - len(p.b_eq))]
+        cost = p.c / rho
+        cost[self.power_columns] -= target
+        solution = clarabel.DefaultSolver(self.P, cost, A, b, cones, self.settings).solve()
+        if str(solution.status) != 'Solved':
+            raise RuntimeError('asset subproblem not solved: ' + str(solution.status))
+        x = np.array(solution.x)
+        return x[self.power_columns], p.c @ x
+
+
+class Subproblems(dict):
+    '''
+    Subproblems of the assets by index, built at their first solve (a task of the pool can run in any worker).
+    '''
+    def __init__(self, assets, control_timestep, horizon_steps, schedule):
+        super().__init__()
+        self.config = (assets, control_timestep, horizon_steps, schedule)
+
+    def __missing__(self, index):
+        assets, control_timestep, horizon_steps, schedule = self.config
+        self[index] = AssetSubproblem(*assets[index], control_timestep, horizon_steps, schedule)
+        return self[index]
+
+
+WORKER_SUBPROBLEMS = None               # subproblems of a worker process of the pool, set by init_worker()
+
+
+def init_worker(assets, control_timestep, horizon_steps, schedule):
+    global WORKER_SUBPROBLEMS
+    WORKER_SUBPROBLEMS = Subproblems(assets, control_timestep, horizon_steps, schedule)
+
+
+def solve_assets(indices, updates, targets, rho, subproblems=None):
+    '''
+    Solves the subproblems of the assets of indices, in a worker process or in the coordinator.
+    :param subproblems: Subproblems of the coordinator, None in a worker process
+    :return: list of (powers, mixing cost) in the order of indices
+    '''
+    subproblems = WORKER_SUBPROBLEMS if subproblems is None else subproblems
+    return [subproblems[index].solve(update, target, rho) for index, update, target in zip(indices, updates, targets)]
+
+
+class ADMMSolver():
+    '''
+    Decomposed MPC of a site of boilers and batteries (same problem as mpc_assets.AssetMPCProblem): ADMM on the power
+    balance in its sharing form. At each iteration, every asset solves its own subproblem with a proximal term on its
+    powers (in parallel on a process pool), then the coordinator solves the grid cost of the summed power in closed
+    form (the proximal operator of a piecewise linear cost per slot) and updates the scaled dual variables, which
+    are the grid prices seen by the assets. Stops when the powers of the assets and the grid balance within
+    tolerance in every slot. The solution returned is always feasible: the grid takes the remaining mismatch.
+    Successive control steps start from the previous solution moved by one slot.
+    :param workers: size of the process pool, None to solve the subproblems in this process
+    '''
+    def __init__(self, boilers, batteries, control_timestep, horizon_steps, schedule=None, workers=None,
+                 rho=RHO, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+        self.assets = [('boiler', boiler) for boiler in boilers] + [('battery', battery) for battery in batteries]
+        self.no_boilers = len(boilers)
+        self.horizon = mpc_assets.AssetMPCProblem([], [], control_timestep, horizon_steps, schedule)
+        self.rho = rho
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        config = (self.assets, control_timestep, horizon_steps, schedule)
+        if workers:
+            self.executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=config)
+            self.groups = np.array_split(np.arange(len(self.assets)), workers)
+        else:
+            self.executor = None
+            self.subproblems = Subproblems(*config)
+            self.groups = [np.arange(len(self.assets))]
+        no_slots = self.horizon.no_slots
+        self.powers = np.zeros((len(self.assets), no_slots))
+        self.u = np.zeros(no_slots)                         # scaled dual variables of the power balance
+        self.iterations = []
+        self.solve_times = []
+        self.history = []                                   # (primal, dual residual, cost) of the last solve
+
+    def asset_updates(self, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy,
+                      sell_price, buy_price):
+        no_steps = len(excess_power)
+        updates = []
+        for i in range(self.no_boilers):
+            updates.append((p_x, [energy_hot_water[i]], [temps_init[i]], [], excess_power, hot_water_energy[:, i:i + 1],
+                            sell_price, buy_price))
+        for soc in soc_init:
+            updates.append((p_x, [], [], [soc], excess_power, np.zeros((no_steps, 0)), sell_price, buy_price))
+        return updates
+
+    def grid_cost(self, grid_power, sell_price, buy_price):
+        energy = grid_power * self.horizon.slot_lengths / 60 / 1000
+        return np.maximum(buy_price * energy, sell_price * energy).sum()
+
+    def solve(self, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy, sell_price,
+              buy_price):
+        '''
+        Takes the arguments of AssetMPCProblem.update().
+        :return: dict with the powers of each asset in each slot 'powers' (one line per asset, boilers first), the
+        grid power 'grid_power', the objective 'cost' (grid cost and mixing terms, as the LP), the iterations and
+        'success' (converged within max_iterations)
+        '''
+        start = time.time()
+        updates = self.asset_updates(p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy,
+                                     sell_price, buy_price)
+        excess_power, _, sell_price, buy_price = self.horizon.aggregate(excess_power, hot_water_energy[:, :0],
+                                                                         sell_price, buy_price)
+        excess_power = np.concatenate(([p_x], excess_power[1:]))
+        kwh_per_watt = self.horizon.slot_lengths / 60 / 1000
+        no_assets = len(self.assets)
+        source = self.horizon.shift_source                 # previous solution moved by one slot
+        powers, u = self.powers[:, source], self.u[source]
+        mean = powers.mean(axis=0)
+        z = mean
+        self.history = []
+        for iteration in range(1, self.max_iterations + 1):
+            targets = powers - (mean - z + u)
+            args = [(group, [updates[i] for i in group], targets[group], self.rho) for group in self.groups]
+            if self.executor is None:
+                results = [solve_assets(*arg, self.subproblems) for arg in args]
+            else:
+                results = list(self.executor.map(solve_assets, *zip(*args)))
+            results = [result for group_results in results for result in group_results]
+            powers = np.array([result[0] for result in results])
+            mixing_cost = sum(result[1] for result in results)
+            mean = powers.mean(axis=0)
+            # z update: argmin of grid cost(N z) + N rho / 2 ||z - u - mean||^2, per slot, with the grid power
+            # -p_x - N z bought at the buy price and sold at the sell price
+            v = no_assets * (u + mean)
+            total = np.clip(-excess_power, v + no_assets * kwh_per_watt * sell_price / self.rho,
+                            v + no_assets * kwh_per_watt * buy_price / self.rho)
+            z_previous, z = z, total / no_assets
+            u = u + mean - z
+            primal = no_assets * np.abs(mean - z).max()         # in Watts
+            dual = no_assets * np.abs(z - z_previous).max()
+            cost = self.grid_cost(-excess_power - powers.sum(axis=0), sell_price, buy_price) + mixing_cost
+            self.history.append((primal, dual, cost))
+            if primal <= self.tolerance and dual <= self.tolerance:
+                break
+        self.powers, self.u = powers, u
+        self.iterations.append(iteration)
+        self.solve_times.append(time.time() - start)
+        return {'powers': powers, 'grid_power': -excess_power - powers.sum(axis=0), 'cost': cost,
+                'iterations': iteration, 'success': primal <= self.tolerance and dual <= self.tolerance}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from EMS_simulation.control_algorithms.mpc_lp import MPCProblem, SparseRows, EPSILON_WEIGHT, clip_temps
+
+
+# variables of each slot: Phi and Pg (GRID_VARS, only with the grid), then BOILER_VARS per boiler and BATTERY_VARS
+# per battery, asset after asset
+PHI, PG = range(2)
+GRID_VARS = 2
+PB, TB, ALPHA, EPSILON = range(4)                   # offsets in the variables of a boiler
+BOILER_VARS = 4
+PBAT, EBAT = range(2)                               # offsets in the variables of a battery
+BATTERY_VARS = 2
+
+
+class AssetMPCProblem(MPCProblem):
+    '''
+    MPC linear program of any number of boilers and batteries sharing one grid connection, with the boiler and battery
+    models of mpc_lp.MPCProblem. The constraints of all the assets are built and updated as arrays with one line per
+    slot and one column per asset (one column per boiler and tangent temperature for the cuts), so the build and
+    update times do not depend on a loop over the assets. The solvers of lp_solvers and shift_basis() work unchanged.
+    Use boiler_vars() and battery_vars() to index the variables of the assets, e.g.
+    problem.step_values(x, problem.boiler_vars(PB)) gives the boiler powers per control step, one column per boiler.
+    :param boilers: list of dicts with keys 'capacity', 'rated_p', 'temp_min', 'temp_max', 'temp_incoming' and
+    'temp_range', as in MPCProblem
+    :param batteries: list of dicts with keys 'soc_min', 'soc_max', 'charge_power_limit', 'discharge_power_limit' and
+    'efficiency', as in MPCProblem, possibly empty
+    :param control_timestep: in minutes
+    :param schedule: slot lengths along the horizon, see mpc_lp.slot_lengths()
+    :param grid: False for the assets alone, without Phi, Pg, the power balance and the grid cost (objective of the
+    mixing terms only), e.g. for the asset subproblems of mpc_admm
+    '''
+    def __init__(self, boilers, batteries, control_timestep, horizon_steps, schedule=None, grid=True):
+        self.init_horizon(boilers, None, control_timestep, horizon_steps, schedule)
+        self.batteries = batteries
+        self.grid = grid
+        self.lazy_cuts = False
+        no_slots = self.no_slots
+        no_boilers = len(boilers)
+        no_batteries = len(batteries)
+        grid_vars = GRID_VARS if grid else 0
+        self.boiler_offsets = grid_vars + BOILER_VARS * np.arange(no_boilers)
+        self.battery_offsets = grid_vars + BOILER_VARS * no_boilers + BATTERY_VARS * np.arange(no_batteries)
+        self.no_vars_ps = grid_vars + BOILER_VARS * no_boilers + BATTERY_VARS * no_batteries
+        self.no_ctrl_vars = self.no_vars_ps * no_slots
+        column = self.column
+        lengths = self.slot_lengths[:, None]                  # in minutes, one line per slot
+        capacities = np.array([boiler['capacity'] for boiler in boilers], dtype=float)
+        self.capacities = capacities
+        self.temps_incoming = np.array([boiler['temp_incoming'] for boiler in boilers], dtype=float)
+
+        # 1. Objective function: grid cost (Phi) plus a penalty on the mixing terms
+        self.c = np.zeros(self.no_ctrl_vars)
+        if grid:
+            self.c[column(PHI)] = 1
+        self.c[column(self.boiler_vars(EPSILON))] = EPSILON_WEIGHT
+
+        # 2. Bounds of the control variables
+        bounds = np.zeros((no_slots, self.no_vars_ps, 2))
+        if grid:
+            bounds[:, [PHI, PG], 0] = -np.inf
+            bounds[:, [PHI, PG], 1] = np.inf
+        for var, lower, upper in ((PB, 'rated_p', None), (TB, 'temp_min', 'temp_max'), (ALPHA, None, 'temp_max'),
+                                  (EPSILON, None, 'temp_max')):
+            bounds[:, self.boiler_vars(var), 0] = [boiler[lower] if lower else 0 for boiler in boilers]
+            bounds[:, self.boiler_vars(var), 1] = [boiler[upper] if upper else 0 for boiler in boilers]
+        for var, lower, upper in ((PBAT, 'charge_power_limit', 'discharge_power_limit'), (EBAT, 'soc_min', 'soc_max')):
+            bounds[:, self.battery_vars(var), 0] = [battery[lower] for battery in batteries]
+            bounds[:, self.battery_vars(var), 1] = [battery[upper] for battery in batteries]
+        self.bounds = bounds.reshape(self.no_ctrl_vars, 2)
+
+        # right-hand sides and forecast dependent coefficients are set by update(), zeros are placeholders
+        eq = SparseRows(self.no_ctrl_vars)
+        ub = SparseRows(self.no_ctrl_vars)
+
+        # 3. Power balance: the measured excess power is considered in the first slot, the forecasted one afterwards
+        eq_blocks = []                      # rows of each constraint family, used to shift a basis by one slot
+        ub_blocks = []
+        if grid:
+            self.balance_rows = eq.add_rows(np.zeros(no_slots))
+            eq_blocks.append(self.balance_rows)
+            powers = np.concatenate(([PG], self.boiler_vars(PB), self.battery_vars(PBAT)))
+            eq.add_terms(np.repeat(self.balance_rows, len(powers)), column(powers), 1)
+
+        # 4. Battery models: Ebat = Ebat_previous - Pbat * dt, one column per battery
+        if batteries:
+            efficiencies = np.array([battery['efficiency'] for battery in batteries], dtype=float)
+            self.battery_rows = eq.add_rows(np.zeros(no_slots * no_batteries)).reshape(no_slots, no_batteries)
+            eq.add_terms(self.battery_rows, column(self.battery_vars(EBAT)), 1)
+            eq.add_terms(self.battery_rows, column(self.battery_vars(PBAT)), efficiencies * lengths / 60)
+            eq.add_terms(self.battery_rows[1:], column(self.battery_vars(EBAT))[:-1], -1)
+            eq_blocks.append(self.battery_rows)
+
+        # 5. Boiler models, one column per boiler
+        # alpha constraints: alpha = Tb_previous - dt * Pb / C - hot water energy / C
+        self.alpha_rows = eq.add_rows(np.zeros(no_slots * no_boilers)).reshape(no_slots, no_boilers)
+        eq.add_terms(self.alpha_rows, column(self.boiler_vars(ALPHA)), 1)
+        eq.add_terms(self.alpha_rows, column(self.boiler_vars(PB)), (lengths * 60) / capacities)
+        eq.add_terms(self.alpha_rows[1:], column(self.boiler_vars(TB))[:-1], -1)
+        # Tb constraints: Tb = alpha + epsilon
+        rows = eq.add_rows(np.zeros(no_slots * no_boilers)).reshape(no_slots, no_boilers)
+        eq.add_terms(rows, column(self.boiler_vars(TB)), 1)
+        eq.add_terms(rows, column(self.boiler_vars(ALPHA)), -1)
+        eq.add_terms(rows, column(self.boiler_vars(EPSILON)), -1)
+        eq_blocks += [self.alpha_rows, rows]
+
+        # epsilon inequality constraints: tangents of K / (C * Tb_previous) at each temperature of temp_range, one
+        # column per (boiler, temperature) pair
+        self.cut_boilers = np.repeat(np.arange(no_boilers), [len(boiler['temp_range']) for boiler in boilers])
+        self.cut_temps = np.array([temp for boiler in boilers for temp in boiler['temp_range']], dtype=float)
+        no_cuts = len(self.cut_temps)
+        self.cut_rows = ub.add_rows(np.zeros(no_slots * no_cuts)).reshape(no_slots, no_cuts)
+        ub.add_terms(self.cut_rows, column(self.boiler_vars(EPSILON))[:, self.cut_boilers], -1)
+        cut_terms = ub.add_terms(self.cut_rows[1:], column(self.boiler_vars(TB))[:-1, self.cut_boilers], 0)
+        ub_blocks.append(self.cut_rows)
+
+        # 6. Grid inequality constraints: Phi is the cost of the grid power at the buy or at the sell price
+        self.price_terms = []
+        for price in ('buy', 'sell') if grid else ():       # same order as the prices in update()
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_terms(rows, column(PHI), -1)
+            self.price_terms.append(ub.add_terms(rows, column(PG), 0))
+            ub_blocks.append(rows)
+
+        self.A_eq, self.b_eq, _ = eq.matrix()
+        self.A_ub, self.b_ub, position_ub = ub.matrix()
+        self.cut_data = position_ub[cut_terms] if no_cuts else cut_terms
+        self.price_data = [position_ub[terms] for terms in self.price_terms]
+        self.forecast_data = np.concatenate([self.cut_data] + self.price_data)  # coefficients of A_ub set by update()
+        # rows numbered as in vstack(A_eq, A_ub), one line per slot
+        self.row_blocks = [rows.reshape(no_slots, -1) for rows in eq_blocks] + \
+                          [eq.no_rows + rows.reshape(no_slots, -1) for rows in ub_blocks]
+
+    def boiler_vars(self, var):
+        '''
+        :param var: PB, TB, ALPHA or EPSILON
+        :return: index of var in a slot for each boiler
+        '''
+        return self.boiler_offsets + var
+
+    def battery_vars(self, var):
+        '''
+        :param var: PBAT or EBAT
+        :return: index of var in a slot for each battery
+        '''
+        return self.battery_offsets + var
+
+    def update(self, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy, sell_price,
+               buy_price):
+        '''
+        Writes the measurements and the forecasts of the horizon (arrays with one entry per control step, aggregated
+        over the slots of the schedule) into the problem.
+        :param energy_hot_water: measured hot water energy of each boiler over the current control step
+        :param temps_init: measured temperature of each boiler
+        :param soc_init: measured state of charge of each battery
+        :param hot_water_energy: forecast, one line per control step and one column per boiler
+        '''
+        excess_power, hot_water_energy, sell_price, buy_price = \
+            self.aggregate(excess_power, hot_water_energy, sell_price, buy_price)
+        if self.grid:
+            self.b_eq[self.balance_rows] = -excess_power
+            self.b_eq[self.balance_rows[0]] = -p_x
+        if self.batteries:
+            self.b_eq[self.battery_rows[0]] = soc_init
+
+        self.temps_init = clip_temps(self.boilers, temps_init)
+        self.b_eq[self.alpha_rows] = -hot_water_energy / self.capacities
+        self.b_eq[self.alpha_rows[0]] = self.temps_init - np.asarray(energy_hot_water) / self.capacities
+
+        self.mixing_coefs = hot_water_energy * self.temps_incoming / self.capacities     # K / C
+        self.mixing_coefs[0] = np.asarray(energy_hot_water) * self.temps_incoming / self.capacities
+        mixing = self.mixing_coefs[:, self.cut_boilers]
+        slope = -mixing / self.cut_temps ** 2
+        rhs = -mixing * (2 / self.cut_temps)
+        rhs[0] -= slope[0] * self.temps_init[self.cut_boilers]  # in the first slot, Tb_previous is the measured one
+        if len(self.cut_temps):
+            self.b_ub[self.cut_rows] = rhs
+            self.A_ub.data[self.cut_data] = slope[1:].ravel()
+
+        for data, price in zip(self.price_data, (buy_price, sell_price)):
+            self.A_ub.data[data] = price / ((60 / self.slot_lengths) * 1000)  # price per watt-INTERVAL
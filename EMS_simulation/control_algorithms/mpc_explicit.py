@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_boilers
+
+# Run from EMS_simulation: python control_algorithms/mpc_explicit.py [path] [steps]
+# Builds the explicit policy of the first steps (a day by default) of mpc_boilers, reports its validation errors and
+# saves it to path (POLICY_PATH by default), the file to set as MPC_EXPLICIT_POLICY in the controller.
+
+
+## =========================    POLICY PARAMETERS    =============================== ##
+POLICY_PATH = 'data_input/explicit_policy_boilers.npz'
+TB1_POINTS = 6                                      # grid points over [temp_min, temp_max] of each boiler
+TB2_POINTS = 7
+P_X_OFFSETS = np.linspace(-4000, 4000, 9)           # in Watts, grid of p_x around the excess power forecast of the step
+PARAMETER_STEPS = np.array([0.01, 0.01, 10])        # finite differences of Tb1, Tb2 (degree celsius) and p_x (Watts)
+VALIDATION_SAMPLES = 20                             # random states per control step compared with the online solve
+## ==================================================================================== ##
+
+
+class ExplicitPolicy():
+    '''
+    Explicit MPC of mpc_boilers. At a given control step, the first action (pb1, pb2) of the LP is a piecewise affine
+    function of the measured (Tb1, Tb2, p_x): affine in each critical region (set of states with the same optimal
+    basis). The policy stores, on a regular grid of states per control step, the optimal first action and its affine
+    law (gradient in the critical region of the grid point), and applies at runtime the law of the nearest grid point,
+    clipped to the power limits of the boilers. Near the temperature limits the action changes by C / dt (about
+    11 kW per degree) so an interpolation between grid points would be far off, the affine law is exact as long as
+    the state is in the critical region of its grid point.
+    The grid of p_x is centred on the excess power forecast of each step, as the measured p_x follows it. The measured
+    hot water energy of the step lowers both temperatures by energy / capacity in the boiler model, so it is folded
+    into the temperatures: the grid is solved with the hot water forecast of the step. A p_x outside its grid or a
+    step not built has no action.
+    action_errors and cost_errors hold, per control step, the largest difference between the policy and the online
+    solve over VALIDATION_SAMPLES random states of the grid box (the error bound of the policy): on the first action
+    in Watts, and on the objective of the horizon in CHF when the first action is fixed to the one of the policy.
+    infeasible counts the states where the action of the policy makes the LP infeasible: an action a few Watts
+    above the one that brings a boiler exactly to its maximum temperature overshoots it by about 1e-4 degree.
+    '''
+    def __init__(self, first_iteration, actions, gradients, p_x_centres, hot_water_refs, action_errors=None,
+                 cost_errors=None, infeasible=None):
+        self.first_iteration = first_iteration
+        self.actions = actions                  # (steps, TB1_POINTS, TB2_POINTS, len(P_X_OFFSETS), 2)
+        self.gradients = gradients              # (steps, TB1_POINTS, TB2_POINTS, len(P_X_OFFSETS), 2, 3)
+        self.p_x_centres = p_x_centres
+        self.hot_water_refs = hot_water_refs
+        self.action_errors = action_errors
+        self.cost_errors = cost_errors
+        self.infeasible = infeasible
+        boiler1, boiler2 = mpc_boilers.BOILERS
+        self.capacities = np.array([boiler1['capacity'], boiler2['capacity']])
+        self.rated_powers = np.array([boiler1['rated_p'], boiler2['rated_p']], dtype=float)
+        self.lower = np.array([boiler1['temp_min'], boiler2['temp_min'], P_X_OFFSETS[0]], dtype=float)
+        self.upper = np.array([boiler1['temp_max'], boiler2['temp_max'], P_X_OFFSETS[-1]], dtype=float)
+        self.last = np.array(actions.shape[1:4]) - 1
+        self.spacing = (self.upper - self.lower) / self.last
+
+    @classmethod
+    def build(cls, iterations):
+        '''
+        Solves the LP of mpc_boilers at every grid point of the control steps of iterations (consecutive). The model
+        of a step is passed to HiGHS once, each grid point only changes the row bounds of the measurements, and the
+        dual simplex restarts from the optimal basis of the previous point.
+        '''
+        if lp_solvers.highspy is None:
+            raise ImportError('building an explicit policy needs the highspy package (pip install highspy)')
+        builder = PolicyBuilder()
+        grids = [builder.step_grid(iteration) for iteration in iterations]
+        policy = cls(iterations[0], *[np.array(values) for values in zip(*grids)])
+        policy.action_errors, policy.cost_errors, policy.infeasible = builder.validate(policy, iterations)
+        policy.build_stats = builder.stats()
+        return policy
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(int(data['first_iteration']), data['actions'], data['gradients'], data['p_x_centres'],
+                   data['hot_water_refs'], data['action_errors'], data['cost_errors'], data['infeasible'])
+
+    def save(self, path):
+        np.savez(path, first_iteration=self.first_iteration, actions=self.actions, gradients=self.gradients,
+                 p_x_centres=self.p_x_centres, hot_water_refs=self.hot_water_refs, action_errors=self.action_errors,
+                 cost_errors=self.cost_errors, infeasible=self.infeasible)
+
+    def covers(self, iteration):
+        return 0 <= iteration - self.first_iteration < len(self.actions)
+
+    def evaluate(self, iteration, p_x, energy_hot_water, Tb1, Tb2):
+        '''
+        :return: first action (pb1, pb2), None if the step is not built or p_x is outside the grid
+        '''
+        step = iteration - self.first_iteration
+        if not 0 <= step < len(self.actions):
+            return None
+        drop = (energy_hot_water - self.hot_water_refs[step]) / self.capacities
+        point = np.array([Tb1 - drop[0], Tb2 - drop[1], p_x - self.p_x_centres[step]])
+        if not self.lower[2] <= point[2] <= self.upper[2]:
+            return None
+        nearest = np.clip(np.rint((point - self.lower) / self.spacing).astype(int), 0, self.last)
+        index = (step, *nearest)
+        action = self.actions[index] + self.gradients[index] @ (point - self.lower - nearest * self.spacing)
+        return np.clip(action, self.rated_powers, 0)
+
+
+class PolicyBuilder():
+    '''
+    The LP of mpc_boilers (full formulation, same schedule, without lazy cuts whose rows would change between grid
+    points) solved by HiGHS for the grid points and the validation samples of ExplicitPolicy.
+    '''
+    def __init__(self):
+        self.problem = mpc_lp.MPCProblem(mpc_boilers.BOILERS, None, mpc_boilers.CONTROL_TIMESTEP, mpc_boilers.no_slots,
+                                         mpc_boilers.SLOT_SCHEDULE)
+        self.solver = lp_solvers.HighsSolver(self.problem, 'simplex', warm_start=False)
+        self.provider = forecasts.get_forecast_provider(mpc_boilers.CONTROL_TIMESTEP)
+        self.no_rows = len(self.problem.b_eq) + len(self.problem.b_ub)
+        self.first_actions = np.array([mpc_lp.PB1, mpc_lp.PB2])       # columns of the first action
+        self.step = None                        # control step of the model in HiGHS
+        self.solves = 0
+        self.failures = 0
+        self.solve_time = 0
+
+    def window(self, iteration):
+        current_time = datetime.strptime(mpc_boilers.MPC_START_TIME, "%m.%d.%Y %H:%M:%S") + \
+            timedelta(minutes=iteration * mpc_boilers.CONTROL_TIMESTEP)
+        return self.provider.window(current_time, mpc_boilers.no_slots)
+
+    def solve(self, iteration, p_x, energy_hot_water, temps, first_action=None):
+        '''
+        :param first_action: (pb1, pb2) to fix the first action to, None to optimize it
+        :return: first action (pb1, pb2) and objective of the LP, NaNs if it is not solved
+        '''
+        p = self.problem
+        highs = self.solver.highs
+        start = time.time()
+        p.update(p_x, energy_hot_water, temps, None, *self.window(iteration))
+        if self.step != iteration:              # the forecasts of the step are in the matrix
+            self.solver.push_update()
+            highs.clearSolver()
+            self.step = iteration
+        else:
+            highs.changeRowsBounds(self.no_rows, np.arange(self.no_rows),
+                                   np.concatenate((p.b_eq, np.full(len(p.b_ub), -np.inf))),
+                                   np.concatenate((p.b_eq, p.b_ub)))
+        if first_action is not None:
+            highs.changeColsBounds(2, self.first_actions, first_action, first_action)
+        success, x, _ = self.solver.run()
+        objective = highs.getInfo().objective_function_value if success else np.nan
+        if first_action is not None:
+            bounds = p.bounds[self.first_actions]
+            highs.changeColsBounds(2, self.first_actions, bounds[:, 0], bounds[:, 1])
+        self.solves += 1
+        self.solve_time += time.time() - start
+        if not success:
+            self.failures += first_action is None
+            return np.full(2, np.nan), np.nan
+        return x[self.first_actions], objective
+
+    def step_grid(self, iteration):
+        '''
+        :return: first actions and their gradients on the grid of the step, the centre of its p_x grid and its hot water
+        reference
+        '''
+        excess_power, hot_water_energy, _, _ = self.window(iteration)
+        boiler1, boiler2 = mpc_boilers.BOILERS
+        temps1 = np.linspace(boiler1['temp_min'], boiler1['temp_max'], TB1_POINTS)
+        temps2 = np.linspace(boiler2['temp_min'], boiler2['temp_max'], TB2_POINTS)
+        actions = np.zeros((TB1_POINTS, TB2_POINTS, len(P_X_OFFSETS), 2))
+        gradients = np.zeros((TB1_POINTS, TB2_POINTS, len(P_X_OFFSETS), 2, 3))
+        for i, Tb1 in enumerate(temps1):
+            for j, Tb2 in enumerate(temps2):
+                for k, offset in enumerate(P_X_OFFSETS):
+                    point = np.array([Tb1, Tb2, excess_power[0] + offset])
+                    actions[i, j, k], _ = self.solve(iteration, point[2], hot_water_energy[0], point[:2])
+                    # one-sided differences, towards the inside of the temperature ranges
+                    directions = np.where(np.array([i, j, 0]) == np.array([TB1_POINTS - 1, TB2_POINTS - 1, -1]), -1, 1)
+                    for m in range(3):
+                        moved = point.copy()
+                        moved[m] += directions[m] * PARAMETER_STEPS[m]
+                        action, _ = self.solve(iteration, moved[2], hot_water_energy[0], moved[:2])
+                        gradients[i, j, k, :, m] = (action - actions[i, j, k]) / (directions[m] * PARAMETER_STEPS[m])
+        # an unsolved point keeps no action (the LP is infeasible there, e.g. a boiler too cold to be kept above its
+        # minimum), its neighbours cover the states around it
+        return np.nan_to_num(actions), np.nan_to_num(gradients), excess_power[0], hot_water_energy[0]
+
+    def validate(self, policy, iterations):
+        '''
+        :return: per control step, the largest error of the policy over random states of the grid box, on the first
+        action in Watts and on the objective in CHF, and the number of states where the LP is infeasible with the
+        action of the policy
+        '''
+        rng = np.random.default_rng(1)
+        action_errors = np.zeros(len(iterations))
+        cost_errors = np.zeros(len(iterations))
+        infeasible = np.zeros(len(iterations), dtype=int)
+        for step, iteration in enumerate(iterations):
+            for _ in range(VALIDATION_SAMPLES):
+                temps = rng.uniform(policy.lower[:2], policy.upper[:2])
+                p_x = policy.p_x_centres[step] + rng.uniform(policy.lower[2], policy.upper[2])
+                energy_hot_water = policy.hot_water_refs[step] * rng.uniform(0.5, 1.5)
+                solved, objective = self.solve(iteration, p_x, energy_hot_water, temps)
+                if np.isnan(objective):
+                    continue
+                action = policy.evaluate(iteration, p_x, energy_hot_water, *temps)
+                _, fixed_objective = self.solve(iteration, p_x, energy_hot_water, temps, action)
+                action_errors[step] = max(action_errors[step], np.abs(action - solved).max())
+                if np.isnan(fixed_objective):
+                    infeasible[step] += 1
+                else:
+                    cost_errors[step] = max(cost_errors[step], fixed_objective - objective)
+        return action_errors, cost_errors, infeasible
+
+    def stats(self):
+        return {'solves': self.solves, 'failures': self.failures, 'solve time': self.solve_time}
+
+if __name__ == '__main__':
+
+    path = sys.argv[1] if len(sys.argv) > 1 else POLICY_PATH
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else int(1440 / mpc_boilers.CONTROL_TIMESTEP)
+    start = time.time()
+    policy = ExplicitPolicy.build(range(steps))
+    print('explicit policy of', steps, 'control steps built in', round(time.time() - start, 1), 's:',
+          policy.build_stats['solves'], 'LP solves,', policy.build_stats['failures'], 'failed, mean',
+          round(1000 * policy.build_stats['solve time'] / policy.build_stats['solves'], 3), 'ms')
+    print('error bound over', VALIDATION_SAMPLES, 'random states per step: first action max',
+          round(policy.action_errors.max(), 1), 'W (mean of the steps', round(policy.action_errors.mean(), 1),
+          'W), objective of the horizon max', '{:.2e}'.format(policy.cost_errors.max()), 'CHF (mean of the steps',
+          '{:.2e}'.format(policy.cost_errors.mean()), 'CHF),', policy.infeasible.sum(), 'states infeasible with the action of'
+          ' the policy')
+    policy.save(path)
+    print('saved to', path, '-', round((policy.actions.nbytes + policy.gradients.nbytes) / 1e6, 2), 'MB')
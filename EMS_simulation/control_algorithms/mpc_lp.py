@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+
+from scipy import sparse
+import numpy as np
+from EMS_simulation.control_algorithms import lp_solvers
+
+
+# decision variables of each time slot, the last two only exist when the problem includes the battery
+PHI, PG, PB1, PB2, TB1, TB2, ALPHA1, ALPHA2, EPSILON1, EPSILON2, PBAT, EBAT = range(12)
+NO_VARS_PS_BOILERS = 10
+NO_VARS_PS_BATTERY = 12
+
+EPSILON_WEIGHT = 0.2                                # 0.2 weights on epsilon give good results
+
+INITIAL_CUTS = 2                                    # tangent cuts per slot built upfront with lazy cuts
+CUT_TOLERANCE = 1e-3                                # in degree celsius, epsilon below the tangents that adds a cut
+
+
+def slot_lengths(control_timestep, horizon_steps, schedule=None):
+    '''
+    :param schedule: list of (duration, slot length) in minutes covering the horizon from its start, e.g.
+    [(60, 5), (300, 15), (360, 60)] for 5-minute slots during the first hour, 15-minute slots up to hour 6 and hourly
+    slots up to hour 12. None for horizon_steps slots of control_timestep.
+    :return: length of each slot of the horizon in minutes
+    '''
+    if schedule is None:
+        return np.full(horizon_steps, control_timestep)
+    lengths = []
+    for duration, length in schedule:
+        if duration % length or length % control_timestep:
+            raise ValueError('slot length ' + str(length) + ' must divide the duration ' + str(duration)
+                             + ' and be a multiple of the control timestep')
+        lengths += [length] * (duration // length)
+    lengths = np.array(lengths)
+    if lengths[0] != control_timestep:
+        raise ValueError('the first slot must last one control timestep, its decision is the one applied')
+    if lengths.sum() != horizon_steps * control_timestep:
+        raise ValueError('the schedule covers ' + str(lengths.sum()) + ' minutes instead of the '
+                         + str(horizon_steps * control_timestep) + ' minutes of the horizon')
+    return lengths
+
+
+def clip_temps(boilers, temps):
+    '''
+    The boiler models overshoot the linear model of the MPC slightly (their hot water use depends on the temperature),
+    and a measured temperature past a bound would make the first slot infeasible whatever the powers.
+    :return: the measured temperatures clipped into the bounds of each boiler
+    '''
+    return np.clip(np.asarray(temps, dtype=float), [boiler['temp_min'] for boiler in boilers],
+                   [boiler['temp_max'] for boiler in boilers])
+
+
+def prefix_pairs(no_slots, strict=False):
+    # (k, j) pairs of slots with j <= k (j < k if strict), ordered by k then j
+    return np.tril_indices(no_slots, -1 if strict else 0)
+
+
+class SparseRows():
+    '''
+    Constraint rows stored as coordinate triplets (row, column, coefficient), added a whole block of rows at a time
+    and assembled into one sparse matrix at the end.
+    '''
+    def __init__(self, no_cols):
+        self.no_cols = no_cols
+        self.no_rows = 0
+        self.no_terms = 0
+        self.rows = []
+        self.cols = []
+        self.coefs = []
+        self.rhs = []
+
+    def add_rows(self, rhs):
+        '''
+        :return: indices of the new rows, to be used with add_terms
+        '''
+        rows = np.arange(self.no_rows, self.no_rows + len(rhs))
+        self.rhs.append(np.asarray(rhs, dtype=float))
+        self.no_rows += len(rhs)
+        return rows
+
+    def add_terms(self, rows, cols, coefs):
+        '''
+        :param coefs: scalar shared by all rows or one coefficient per row
+        :return: indices of the new terms, matrix() maps them to their position in the data of the sparse matrix
+        '''
+        rows = np.ravel(rows)
+        self.rows.append(rows)
+        self.cols.append(np.ravel(cols))
+        self.coefs.append(np.broadcast_to(np.asarray(coefs, dtype=float).ravel(), rows.shape))
+        terms = np.arange(self.no_terms, self.no_terms + len(rows))
+        self.no_terms += len(rows)
+        return terms
+
+    def add_prefix_terms(self, rows, cols, coefs, strict=False):
+        '''
+        Terms of cumulative sums: the row(s) of slot k get a term on cols[j] with coefficient coefs[j] for every slot
+        j <= k (j < k if strict).
+        :param rows: one row per slot, or one line of rows per slot
+        :return: indices of the new terms, in the order of rows[k_terms] with k_terms, j_terms = prefix_pairs(...)
+        '''
+        k_terms, j_terms = prefix_pairs(len(cols), strict)
+        rows = rows[k_terms]
+        per_row = (-1,) + (1,) * (rows.ndim - 1)          # same column and coefficient for the rows of a line
+        cols = np.broadcast_to(np.asarray(cols)[j_terms].reshape(per_row), rows.shape)
+        coefs = np.broadcast_to(np.asarray(coefs, dtype=float)[j_terms].reshape(per_row), rows.shape)
+        return self.add_terms(rows, cols, coefs)
+
+    def matrix(self):
+        '''
+        :return: CSR matrix, right-hand side and, for each term, its position in the data array of the matrix
+        '''
+        if not self.no_rows:
+            return None, None, None
+        rows = np.concatenate(self.rows)
+        cols = np.concatenate(self.cols)
+        # CSR layout built by hand (instead of coo.tocsr) to know where every term ends up in A.data
+        order = np.lexsort((cols, rows))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=self.no_rows))))
+        A = sparse.csr_matrix((np.concatenate(self.coefs)[order], cols[order], indptr),
+                              shape=(self.no_rows, self.no_cols))
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        return A, np.concatenate(self.rhs), position
+
+
+class MPCProblem():
+    '''
+    MPC linear program of the two boilers (and the battery if battery is not None) over a horizon of horizon_steps
+    control steps. The structure of the problem (objective, bounds, sparsity pattern and constant coefficients) is
+    built once. At each control step, update() only rewrites the right-hand sides and the coefficients that depend on
+    the forecasts.
+    :param boilers: list of two dicts with keys 'capacity', 'rated_p', 'temp_min', 'temp_max', 'temp_incoming' and
+    'temp_range' (temperatures of the tangent cuts linearising the hot water mixing term)
+    :param battery: dict with keys 'soc_min', 'soc_max', 'charge_power_limit', 'discharge_power_limit', 'efficiency'
+    :param control_timestep: in minutes
+    :param schedule: slot lengths along the horizon, see slot_lengths(). Longer slots far in the horizon (move
+    blocking) give a smaller problem: the inputs are held over each slot and the states are only bounded at its end.
+    :param lazy_cuts: only INITIAL_CUTS tangent cuts per slot are built, the solvers add the cuts of temp_range
+    returned by violated_cuts() and solve again until the solution satisfies all of them (within CUT_TOLERANCE)
+    '''
+    def __init__(self, boilers, battery, control_timestep, horizon_steps, schedule=None, lazy_cuts=False):
+        self.init_horizon(boilers, battery, control_timestep, horizon_steps, schedule)
+        self.lazy_cuts = lazy_cuts
+        no_slots = self.no_slots
+        self.no_vars_ps = NO_VARS_PS_BATTERY if battery else NO_VARS_PS_BOILERS
+        self.no_ctrl_vars = self.no_vars_ps * no_slots
+        slots = np.arange(no_slots)
+        column = self.column
+
+        # 1. Objective function: grid cost (Phi) plus a penalty on the mixing terms
+        self.c = np.zeros(self.no_ctrl_vars)
+        self.c[column(PHI)] = 1
+        self.c[column(EPSILON1)] = EPSILON_WEIGHT
+        self.c[column(EPSILON2)] = EPSILON_WEIGHT
+
+        # 2. Bounds of the control variables
+        bounds = np.zeros((no_slots, self.no_vars_ps, 2))
+        bounds[:, [PHI, PG], 0] = -np.inf
+        bounds[:, [PHI, PG], 1] = np.inf
+        for i, boiler in enumerate(boilers):
+            bounds[:, PB1 + i] = (boiler['rated_p'], 0)
+            bounds[:, TB1 + i] = (boiler['temp_min'], boiler['temp_max'])
+            bounds[:, ALPHA1 + i] = (0, boiler['temp_max'])       # for T in temp_bounds, alpha cannot be negative
+            bounds[:, EPSILON1 + i] = (0, boiler['temp_max'])
+        if battery:
+            bounds[:, PBAT] = (battery['charge_power_limit'], battery['discharge_power_limit'])
+            bounds[:, EBAT] = (battery['soc_min'], battery['soc_max'])
+        self.bounds = bounds.reshape(self.no_ctrl_vars, 2)
+
+        # right-hand sides and forecast dependent coefficients are set by update(), zeros are placeholders
+        eq = SparseRows(self.no_ctrl_vars)
+        ub = SparseRows(self.no_ctrl_vars)
+
+        # 3. Power balance: the measured excess power is considered in the first slot, the forecasted one afterwards
+        self.balance_rows = eq.add_rows(np.zeros(no_slots))
+        eq_blocks = [self.balance_rows]     # rows of each constraint family, used to shift a basis by one slot
+        ub_blocks = []
+        for var in ([PG, PB1, PB2, PBAT] if battery else [PG, PB1, PB2]):
+            eq.add_terms(self.balance_rows, column(var), 1)
+
+        # 4. Battery model: Ebat = Ebat_previous - Pbat * dt
+        if battery:
+            self.battery_rows = eq.add_rows(np.zeros(no_slots))
+            eq.add_terms(self.battery_rows, column(EBAT), 1)
+            eq.add_terms(self.battery_rows, column(PBAT), battery['efficiency'] * self.slot_lengths / 60)
+            eq.add_terms(self.battery_rows[1:], column(EBAT, slots[:-1]), -1)
+            eq_blocks.append(self.battery_rows)
+
+        # 5. Boiler models
+        self.alpha_rows = []
+        self.cut_rows = []
+        self.cut_terms = []
+        self.cut_temps = []
+        self.lazy_pairs = []                    # (slots, temperatures) of the lazy cuts added, for each boiler
+        for i, boiler in enumerate(boilers):
+            # alpha constraints: alpha = Tb_previous - dt * Pb / C - hot water energy / C
+            rows = eq.add_rows(np.zeros(no_slots))
+            eq.add_terms(rows, column(ALPHA1 + i), 1)
+            eq.add_terms(rows, column(PB1 + i), (self.slot_lengths * 60) / boiler['capacity'])
+            eq.add_terms(rows[1:], column(TB1 + i, slots[:-1]), -1)
+            self.alpha_rows.append(rows)
+            eq_blocks.append(rows)
+
+            # Tb constraints: Tb = alpha + epsilon
+            rows = eq.add_rows(np.zeros(no_slots))
+            eq.add_terms(rows, column(TB1 + i), 1)
+            eq.add_terms(rows, column(ALPHA1 + i), -1)
+            eq.add_terms(rows, column(EPSILON1 + i), -1)
+            eq_blocks.append(rows)
+
+            # epsilon inequality constraints: tangents of K / (C * Tb_previous) at each temperature of temp_range
+            temps = np.asarray(boiler['temp_range'], dtype=float)
+            if lazy_cuts:       # evenly spread subset of temp_range, its ends included
+                temps = temps[np.unique(np.linspace(0, len(temps) - 1, INITIAL_CUTS).round().astype(int))]
+            self.cut_temps.append(temps)
+            no_temps = len(temps)
+            self.lazy_pairs.append((np.zeros(0, dtype=int), np.zeros(0)))
+            rows = ub.add_rows(np.zeros(no_slots * no_temps)).reshape(no_slots, no_temps)
+            ub.add_terms(rows, np.repeat(column(EPSILON1 + i), no_temps), -1)
+            self.cut_terms.append(ub.add_terms(rows[1:], np.repeat(column(TB1 + i, slots[:-1]), no_temps), 0))
+            self.cut_rows.append(rows)
+            ub_blocks.append(rows)
+
+        # 6. Grid inequality constraints: Phi is the cost of the grid power at the buy or at the sell price
+        self.price_terms = []
+        for price in ('buy', 'sell'):            # same order as the prices in update()
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_terms(rows, column(PHI), -1)
+            self.price_terms.append(ub.add_terms(rows, column(PG), 0))
+            ub_blocks.append(rows)
+
+        self.A_eq, self.b_eq, _ = eq.matrix()
+        self.A_ub, self.b_ub, position_ub = ub.matrix()
+        self.cut_data = [position_ub[terms] for terms in self.cut_terms]
+        self.price_data = [position_ub[terms] for terms in self.price_terms]
+        self.forecast_data = np.concatenate(self.cut_data + self.price_data)   # coefficients of A_ub set by update()
+        # rows numbered as in vstack(A_eq, A_ub), one line per slot
+        self.row_blocks = [rows.reshape(no_slots, -1) for rows in eq_blocks] + \
+                          [eq.no_rows + rows.reshape(no_slots, -1) for rows in ub_blocks]
+
+    def init_horizon(self, boilers, battery, control_timestep, horizon_steps, schedule):
+        self.boilers = boilers
+        self.battery = battery
+        self.control_timestep = control_timestep
+        self.horizon_steps = horizon_steps
+        self.schedule = schedule
+        self.slot_lengths = slot_lengths(control_timestep, horizon_steps, schedule)   # in minutes
+        self.slot_starts = np.concatenate(([0], np.cumsum(self.slot_lengths // control_timestep)[:-1]))
+        self.no_slots = len(self.slot_lengths)
+        # slot whose basis statuses each slot takes at the next step: the leading slots of one control timestep move
+        # by one slot, the longer slots that follow are kept in place
+        slots = np.arange(self.no_slots)
+        longer = np.flatnonzero(self.slot_lengths != control_timestep)
+        self.lead = longer[0] if len(longer) else self.no_slots
+        self.shift_source = np.where(slots < self.lead - 1, slots + 1, slots)
+
+    def column(self, var, slots=None):
+        '''
+        :param var: index of a variable in a slot, or array of indices (one column per index)
+        '''
+        if slots is None:
+            slots = np.arange(self.no_slots)
+        return np.add.outer(slots * self.no_vars_ps, var)
+
+    def aggregate(self, excess_power, hot_water_energy, sell_price, buy_price):
+        '''
+        :return: the forecasts given per control step, averaged (powers and prices) or summed (energies) over each slot
+        '''
+        if self.schedule is None:
+            return excess_power, hot_water_energy, sell_price, buy_price
+        steps = self.slot_lengths // self.control_timestep
+        return np.add.reduceat(excess_power, self.slot_starts) / steps, \
+            np.add.reduceat(hot_water_energy, self.slot_starts), \
+            np.add.reduceat(sell_price, self.slot_starts) / steps, \
+            np.add.reduceat(buy_price, self.slot_starts) / steps
+
+    def update(self, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy, sell_price,
+               buy_price):
+        '''
+        Writes the measurements and the forecasts of the horizon (arrays with one entry per control step, aggregated
+        over the slots of the schedule) into the problem.
+        '''
+        excess_power, hot_water_energy, sell_price, buy_price = \
+            self.aggregate(excess_power, hot_water_energy, sell_price, buy_price)
+        self.b_eq[self.balance_rows] = -excess_power
+        self.b_eq[self.balance_rows[0]] = -p_x
+        if self.battery:
+            self.b_eq[self.battery_rows[0]] = soc_init
+
+        temps_init = clip_temps(self.boilers, temps_init)
+        self.temps_init = temps_init
+        self.mixing_coefs = []
+        for i, boiler in enumerate(self.boilers):
+            if self.lazy_cuts:      # the lazy cuts of the previous step move by one slot, as in shift_basis
+                slots, temps = self.lazy_pairs[i]
+                slots = np.where(slots < self.lead, slots - 1, slots)
+                self.lazy_pairs[i] = (slots[slots >= 0], temps[slots >= 0])
+            capacity = boiler['capacity']
+            self.b_eq[self.alpha_rows[i]] = -hot_water_energy / capacity
+            self.b_eq[self.alpha_rows[i][0]] = temps_init[i] - energy_hot_water / capacity
+
+            temps = self.cut_temps[i]
+            K = hot_water_energy * boiler['temp_incoming']
+            K[0] = energy_hot_water * boiler['temp_incoming']   # the measured hot water use, as in the first slot drop
+            self.mixing_coefs.append(K / capacity)
+            slope = -(K / capacity)[:, None] / temps ** 2
+            rhs = -(K / capacity)[:, None] * (2 / temps)
+            rhs[0] -= slope[0] * temps_init[i]        # in the first slot, Tb_previous is the measured temperature
+            self.b_ub[self.cut_rows[i]] = rhs
+            self.A_ub.data[self.cut_data[i]] = slope[1:].ravel()
+
+        for data, price in zip(self.price_data, (buy_price, sell_price)):
+            self.A_ub.data[data] = price / ((60 / self.slot_lengths) * 1000)  # price per watt-INTERVAL
+
+    def shift_basis(self, col_status, row_status):
+        '''
+        Moves the basis statuses of the variables and rows of each slot to the previous slot, for the next step of the
+        receding horizon (see shift_source). Rows are numbered as in vstack(A_eq, A_ub).
+        '''
+        col_status = col_status.reshape(self.no_slots, self.no_vars_ps)[self.shift_source].ravel()
+        shifted_row_status = row_status.copy()
+        for rows in self.row_blocks:
+            shifted_row_status[rows] = row_status[rows[self.shift_source]]
+        return col_status, shifted_row_status
+
+    def full_solution(self, x):
+        '''
+        :return: the solution x in the variable layout of MPCProblem (no_vars_ps variables per slot)
+        '''
+        return x
+
+    def step_values(self, x, var):
+        '''
+        :return: values of var in the solution x, one per control step of the horizon
+        '''
+        return np.repeat(x[self.column(var)], self.slot_lengths // self.control_timestep, axis=0)
+
+    def step_states(self, x, var, initial):
+        '''
+        :param x: solution in the variable layout of MPCProblem (see full_solution)
+        :param initial: measured value of the state var at the start of the horizon (one per index if var is an array)
+        :return: values of the state var predicted at the start of each control step of the horizon, interpolated
+        linearly inside the longer slots (the inputs are held over a slot)
+        '''
+        ends = np.concatenate(([0], np.cumsum(self.slot_lengths // self.control_timestep)))
+        values = np.concatenate(([initial], x.reshape(self.no_slots, -1)[:, var]))
+        steps = np.arange(self.horizon_steps)
+        slots = np.searchsorted(ends, steps, side='right') - 1
+        weights = ((steps - ends[slots]) / (ends[slots + 1] - ends[slots])).reshape((-1,) + (1,) * (values.ndim - 1))
+        return (1 - weights) * values[slots] + weights * values[slots + 1]
+
+    def violated_cuts(self, x):
+        '''
+        Separation of the tangent cuts with lazy cuts: for each slot where epsilon is more than CUT_TOLERANCE below
+        the tangents of temp_range at Tb_previous, the most violated tangent is returned as a new inequality row.
+        :return: (A, b) rows to add to A_ub x <= b_ub, None when x satisfies all the cuts
+        '''
+        x = x.reshape(self.no_slots, self.no_vars_ps)
+        pairs = []
+        for i, boiler in enumerate(self.boilers):
+            temps = np.asarray(boiler['temp_range'], dtype=float)
+            previous = np.concatenate(([self.temps_init[i]], x[:-1, TB1 + i]))
+            tangents = self.mixing_coefs[i][:, None] * (2 / temps - previous[:, None] / temps ** 2)
+            best = tangents.argmax(axis=1)
+            slots = np.flatnonzero(tangents[np.arange(self.no_slots), best] - x[:, EPSILON1 + i] > CUT_TOLERANCE)
+            pairs.append((slots, temps[best[slots]]))
+            self.lazy_pairs[i] = tuple(np.concatenate(arrays) for arrays in zip(self.lazy_pairs[i], pairs[i]))
+        return self.tangent_rows(pairs)
+
+    def carried_cuts(self):
+        '''
+        With lazy cuts, the cuts added during the previous control step (moved by one slot by update()) with the
+        current forecasts. The solvers add them before the first solve of the step.
+        :return: (A, b) rows to add to A_ub x <= b_ub, None if there are none
+        '''
+        return self.tangent_rows(self.lazy_pairs)
+
+    def tangent_rows(self, pairs):
+        '''
+        :param pairs: for each boiler, slots and temperatures of the tangent cuts
+        :return: (A, b) inequality rows of the cuts, None if there are none
+        '''
+        rows, cols, coefs, rhs = [], [], [], []
+        no_cuts = 0
+        for i, (slots, temps) in enumerate(pairs):
+            mixing = self.mixing_coefs[i][slots]
+            slope = -mixing / temps ** 2
+            cut_rhs = -mixing * (2 / temps)
+            cut_rhs[slots == 0] -= slope[slots == 0] * self.temps_init[i]  # the measured temperature in the first slot
+            new_rows = no_cuts + np.arange(len(slots))
+            rows += [new_rows, new_rows[slots > 0]]
+            cols += [self.column(EPSILON1 + i, slots), self.column(TB1 + i, slots[slots > 0] - 1)]
+            coefs += [np.full(len(slots), -1.0), slope[slots > 0]]
+            rhs.append(cut_rhs)
+            no_cuts += len(slots)
+        if not no_cuts:
+            return None
+        A = sparse.csr_matrix((np.concatenate(coefs), (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(no_cuts, self.no_ctrl_vars))
+        return A, np.concatenate(rhs)
+
+
+# decision variables kept by the condensed formulation, in their order within a slot
+CONDENSED_VARS_BOILERS = [PHI, PG, PB1, PB2, EPSILON1, EPSILON2]
+CONDENSED_VARS_BATTERY = CONDENSED_VARS_BOILERS + [PBAT]
+
+
+class CondensedMPCProblem(MPCProblem):
+    '''
+    Same linear program as MPCProblem with the states substituted by the dynamics: the temperatures, alphas and
+    battery energy are cumulative sums of the inputs from the measured states, and their bounds become inequality rows
+    on these sums. Only Phi, Pg, Pb1, Pb2, epsilon1, epsilon2 (and Pbat) remain as variables and the power balance is
+    the only equality. The state rows are dense in the previous slots, the problem is smaller but has more nonzeros.
+    column() takes the variables of MPCProblem and full_solution() rebuilds the states.
+    '''
+    def __init__(self, boilers, battery, control_timestep, horizon_steps, schedule=None, lazy_cuts=False):
+        if lazy_cuts:
+            raise ValueError('lazy cuts are only available with the full formulation')
+        self.init_horizon(boilers, battery, control_timestep, horizon_steps, schedule)
+        self.lazy_cuts = False
+        no_slots = self.no_slots
+        self.vars = CONDENSED_VARS_BATTERY if battery else CONDENSED_VARS_BOILERS
+        self.position = {var: i for i, var in enumerate(self.vars)}
+        self.no_vars_ps = len(self.vars)
+        self.no_ctrl_vars = self.no_vars_ps * no_slots
+        column = self.column
+        position = self.position
+
+        # 1. Objective function: grid cost (Phi) plus a penalty on the mixing terms
+        self.c = np.zeros(self.no_ctrl_vars)
+        self.c[column(PHI)] = 1
+        self.c[column(EPSILON1)] = EPSILON_WEIGHT
+        self.c[column(EPSILON2)] = EPSILON_WEIGHT
+
+        # 2. Bounds of the control variables
+        bounds = np.zeros((no_slots, self.no_vars_ps, 2))
+        bounds[:, [position[PHI], position[PG]], 0] = -np.inf
+        bounds[:, [position[PHI], position[PG]], 1] = np.inf
+        for i, boiler in enumerate(boilers):
+            bounds[:, position[PB1 + i]] = (boiler['rated_p'], 0)
+            bounds[:, position[EPSILON1 + i]] = (0, boiler['temp_max'])
+        if battery:
+            bounds[:, position[PBAT]] = (battery['charge_power_limit'], battery['discharge_power_limit'])
+        self.bounds = bounds.reshape(self.no_ctrl_vars, 2)
+
+        # right-hand sides and forecast dependent coefficients are set by update(), zeros are placeholders
+        eq = SparseRows(self.no_ctrl_vars)
+        ub = SparseRows(self.no_ctrl_vars)
+
+        # 3. Power balance: the measured excess power is considered in the first slot, the forecasted one afterwards
+        self.balance_rows = eq.add_rows(np.zeros(no_slots))
+        eq_blocks = [self.balance_rows]
+        ub_blocks = []
+        for var in ([PG, PB1, PB2, PBAT] if battery else [PG, PB1, PB2]):
+            eq.add_terms(self.balance_rows, column(var), 1)
+
+        # 4. Battery energy: Ebat = Ebat_init - sum of Pbat * dt over the slots so far, within soc_min and soc_max
+        if battery:
+            self.pbat_coefs = battery['efficiency'] * self.slot_lengths / 60
+            self.soc_max_rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_prefix_terms(self.soc_max_rows, column(PBAT), -self.pbat_coefs)
+            self.soc_min_rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_prefix_terms(self.soc_min_rows, column(PBAT), self.pbat_coefs)
+            ub_blocks += [self.soc_max_rows, self.soc_min_rows]
+
+        # 5. Boiler models: Tb = Tb_init - sum of (dt * Pb + hot water energy) / C + sum of epsilon over past slots
+        self.pb_coefs = []
+        self.temp_max_rows = []
+        self.temp_min_rows = []
+        self.alpha_rows = []
+        self.cut_rows = []
+        cut_pb_terms = []
+        cut_epsilon_terms = []
+        for i, boiler in enumerate(boilers):
+            pb_coefs = (self.slot_lengths * 60) / boiler['capacity']
+            self.pb_coefs.append(pb_coefs)
+            epsilon_coefs = np.ones(no_slots)
+
+            # Tb <= temp_max and Tb >= temp_min
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_prefix_terms(rows, column(PB1 + i), -pb_coefs)
+            ub.add_prefix_terms(rows, column(EPSILON1 + i), epsilon_coefs)
+            self.temp_max_rows.append(rows)
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_prefix_terms(rows, column(PB1 + i), pb_coefs)
+            ub.add_prefix_terms(rows, column(EPSILON1 + i), -epsilon_coefs)
+            self.temp_min_rows.append(rows)
+
+            # alpha = Tb_previous - (dt * Pb + hot water energy) / C >= 0, alpha <= temp_max follows from Tb <= temp_max
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_prefix_terms(rows, column(PB1 + i), pb_coefs)
+            ub.add_prefix_terms(rows, column(EPSILON1 + i), -epsilon_coefs, strict=True)
+            self.alpha_rows.append(rows)
+            ub_blocks += [self.temp_max_rows[i], self.temp_min_rows[i], rows]
+
+            # epsilon inequality constraints: tangents of K / (C * Tb_previous) at each temperature of temp_range,
+            # Tb_previous being a cumulative sum their coefficients are the slopes times the dynamics coefficients
+            no_temps = len(boiler['temp_range'])
+            rows = ub.add_rows(np.zeros(no_slots * no_temps)).reshape(no_slots, no_temps)
+            ub.add_terms(rows, np.repeat(column(EPSILON1 + i), no_temps), -1)
+            cut_pb_terms.append(ub.add_prefix_terms(rows, column(PB1 + i), np.zeros(no_slots), strict=True))
+            cut_epsilon_terms.append(ub.add_prefix_terms(rows, column(EPSILON1 + i), np.zeros(no_slots), strict=True))
+            self.cut_rows.append(rows)
+            ub_blocks.append(rows)
+
+        # 6. Grid inequality constraints: Phi is the cost of the grid power at the buy or at the sell price
+        self.price_terms = []
+        for price in ('buy', 'sell'):            # same order as the prices in update()
+            rows = ub.add_rows(np.zeros(no_slots))
+            ub.add_terms(rows, column(PHI), -1)
+            self.price_terms.append(ub.add_terms(rows, column(PG), 0))
+            ub_blocks.append(rows)
+
+        self.A_eq, self.b_eq, _ = eq.matrix()
+        self.A_ub, self.b_ub, position_ub = ub.matrix()
+        self.cut_slots, self.cut_previous_slots = prefix_pairs(no_slots, strict=True)
+        self.cut_pb_data = [position_ub[terms] for terms in cut_pb_terms]
+        self.cut_epsilon_data = [position_ub[terms] for terms in cut_epsilon_terms]
+        self.price_data = [position_ub[terms] for terms in self.price_terms]
+        self.forecast_data = np.concatenate(self.cut_pb_data + self.cut_epsilon_data + self.price_data)
+        # rows numbered as in vstack(A_eq, A_ub), one line per slot
+        self.row_blocks = [rows.reshape(no_slots, -1) for rows in eq_blocks] + \
+                          [eq.no_rows + rows.reshape(no_slots, -1) for rows in ub_blocks]
+        self.temps_init = None
+        self.soc_init = None
+        self.temp_drops = None
+
+    def column(self, var, slots=None):
+        if slots is None:
+            slots = np.arange(self.no_slots)
+        return slots * self.no_vars_ps + self.position[var]
+
+    def update(self, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy, sell_price,
+               buy_price):
+        '''
+        Writes the measurements and the forecasts of the horizon (arrays with one entry per control step, aggregated
+        over the slots of the schedule) into the problem.
+        '''
+        excess_power, hot_water_energy, sell_price, buy_price = \
+            self.aggregate(excess_power, hot_water_energy, sell_price, buy_price)
+        self.b_eq[self.balance_rows] = -excess_power
+        self.b_eq[self.balance_rows[0]] = -p_x
+        if self.battery:
+            self.b_ub[self.soc_max_rows] = self.battery['soc_max'] - soc_init
+            self.b_ub[self.soc_min_rows] = soc_init - self.battery['soc_min']
+
+        temps_init = clip_temps(self.boilers, temps_init)
+        self.temps_init = temps_init
+        self.soc_init = soc_init
+        self.temp_drops = []
+        for i, boiler in enumerate(self.boilers):
+            capacity = boiler['capacity']
+            # temperature drop due to the hot water use up to the end of each slot
+            drop = hot_water_energy / capacity
+            drop[0] = energy_hot_water / capacity
+            drop = np.cumsum(drop)
+            self.temp_drops.append(drop)
+            self.b_ub[self.temp_max_rows[i]] = boiler['temp_max'] - temps_init[i] + drop
+            self.b_ub[self.temp_min_rows[i]] = temps_init[i] - drop - boiler['temp_min']
+            self.b_ub[self.alpha_rows[i]] = temps_init[i] - drop
+
+            temps = np.asarray(boiler['temp_range'], dtype=float)
+            K = hot_water_energy * boiler['temp_incoming']
+            K[0] = energy_hot_water * boiler['temp_incoming']   # the measured hot water use, as in the first slot drop
+            slope = -(K / capacity)[:, None] / temps ** 2
+            rhs = -(K / capacity)[:, None] * (2 / temps)
+            previous = temps_init[i] - np.concatenate(([0], drop[:-1]))     # Tb_previous without the inputs
+            self.b_ub[self.cut_rows[i]] = rhs - slope * previous[:, None]
+            slope = slope[self.cut_slots]
+            self.A_ub.data[self.cut_pb_data[i]] = \
+                (slope * -self.pb_coefs[i][self.cut_previous_slots, None]).ravel()
+            self.A_ub.data[self.cut_epsilon_data[i]] = slope.ravel()
+
+        for data, price in zip(self.price_data, (buy_price, sell_price)):
+            self.A_ub.data[data] = price / ((60 / self.slot_lengths) * 1000)  # price per watt-INTERVAL
+
+    def full_solution(self, x):
+        '''
+        :return: the solution x in the variable layout of MPCProblem, with the states of the last update()
+        '''
+        x = x.reshape(self.no_slots, self.no_vars_ps)
+        full = np.zeros((self.no_slots, NO_VARS_PS_BATTERY if self.battery else NO_VARS_PS_BOILERS))
+        full[:, self.vars] = x
+        for i in range(len(self.boilers)):
+            full[:, TB1 + i] = self.temps_init[i] - self.temp_drops[i] - \
+                np.cumsum(self.pb_coefs[i] * full[:, PB1 + i]) + np.cumsum(full[:, EPSILON1 + i])
+            full[:, ALPHA1 + i] = full[:, TB1 + i] - full[:, EPSILON1 + i]
+        if self.battery:
+            full[:, EBAT] = self.soc_init - np.cumsum(self.pbat_coefs * full[:, PBAT])
+        return full.ravel()
+
+
+# MPC formulations by name, they share the constructor and update() signatures
+FORMULATIONS = {'full': MPCProblem, 'condensed': CondensedMPCProblem}
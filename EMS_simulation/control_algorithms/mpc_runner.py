@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+def plan_action(plan, plan_iteration, iteration):
+    '''
+    :param plan: actions per control step planned by the solve of iteration plan_iteration
+    :return: the actions the plan has for iteration, None if it ends before
+    '''
+    if plan is None or iteration - plan_iteration >= len(plan[1]):
+        return None
+    return {key: actions[iteration - plan_iteration] for key, actions in plan.items()}
+
+
+class DeadlineMPC():
+    '''
+    Runs the MPC iterations in a worker thread with a time budget per control step. When the solve of a step misses
+    its deadline or fails, action() returns the action planned for this step by the last successful solve, or None if
+    no plan covers it (the controller then falls back on a rule-based algorithm). A solve that misses its deadline
+    cannot be interrupted: it keeps running, its plan is taken when it completes and no new solve starts until then,
+    the MPC problem being updated in place (for the same reason, use a single DeadlineMPC per MPC module).
+    :param mpc_iteration: mpc_boilers.mpc_iteration or mpc_batteries.mpc_iteration
+    :param deadline: in seconds, None to wait for every solve
+    '''
+    def __init__(self, mpc_iteration, deadline):
+        self.mpc_iteration = mpc_iteration
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None                     # (iteration, start time, future) of the solve in progress
+        self.plan = None                        # actions per control step planned by the last successful solve
+        self.plan_iteration = None
+        self.steps = 0
+        self.deadline_misses = 0
+        self.failures = 0
+        self.fallbacks = {'plan': 0, 'rule': 0}
+        self.solve_times = []
+
+    def action(self, iteration, args):
+        '''
+        :param args: arguments of mpc_iteration before the iteration
+        :return: actions of the control step and their source: 'mpc', 'plan' or 'rule' (actions are None)
+        '''
+        self.steps += 1
+        start = time.time()
+        while True:
+            if self.pending is None:
+                self.pending = (iteration, time.time(), self.executor.submit(self.mpc_iteration, *args, iteration))
+            solve_iteration, solve_start, future = self.pending
+            timeout = None if self.deadline is None else max(0, self.deadline - (time.time() - start))
+            try:
+                outputs = future.result(timeout=timeout)
+            except TimeoutError:
+                self.deadline_misses += 1
+                return self.fallback(iteration)
+            except Exception as error:  # the solve raised: count it as a failure and fall back on the plan
+                self.pending = None
+                self.solve_times.append(time.time() - solve_start)
+                self.failures += 1
+                print('MPC solve of iteration', solve_iteration, 'failed:', repr(error))
+                if solve_iteration == iteration:
+                    return self.fallback(iteration)
+                continue
+            self.pending = None
+            self.solve_times.append(time.time() - solve_start)
+            if outputs['success']:
+                self.plan, self.plan_iteration = outputs['plan'], solve_iteration
+            else:
+                self.failures += 1
+            if solve_iteration == iteration:
+                return (outputs, 'mpc') if outputs['success'] else self.fallback(iteration)
+            # the late solve of a previous step just completed, this step is solved with the budget left
+
+    def fallback(self, iteration):
+        actions = plan_action(self.plan, self.plan_iteration, iteration)
+        if actions is not None:
+            self.fallbacks['plan'] += 1
+            return actions, 'plan'
+        self.fallbacks['rule'] += 1
+        return None, 'rule'
+
+    def report(self):
+        solve_times = self.solve_times or [0]
+        return 'MPC deadline ' + str(self.deadline) + ' s: ' + str(self.deadline_misses) + ' deadline misses and ' + \
+            str(self.failures) + ' solver failures in ' + str(self.steps) + ' control steps, ' + \
+            str(self.fallbacks['plan']) + ' actions from the previous plan and ' + str(self.fallbacks['rule']) + \
+            ' from the rule-based algorithm, solve time mean ' + str(round(sum(solve_times) / len(solve_times), 3)) + \
+            ' s max ' + str(round(max(solve_times), 3)) + ' s'
+
+
+class AsyncMPC():
+    '''
+    Solves the MPC in a worker thread and actuates from the active plan. At each control step, action() returns
+    without waiting the actions the active plan has for this step, and starts a solve with the latest measurements if
+    the worker is idle. When a solve completes, its plan becomes the active plan: the (iteration, plan) pair is
+    replaced in one assignment, so action() never reads a plan with the iteration of another one. Before the first
+    plan, action() returns None (the controller then uses a rule-based algorithm).
+    :param mpc_iteration: mpc_boilers.mpc_iteration or mpc_batteries.mpc_iteration, a single AsyncMPC per module
+    '''
+    def __init__(self, mpc_iteration):
+        self.mpc_iteration = mpc_iteration
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None                      # solve in progress or last solve
+        self.active = (None, None)              # (iteration, plan) of the last successful solve
+        self.steps = 0
+        self.solves = 0
+        self.failures = 0
+        self.fallbacks = {'plan': 0, 'rule': 0}
+        self.plan_ages = []                     # control steps between the solve and the use of each plan action
+        self.solve_times = []
+
+    def action(self, iteration, args):
+        '''
+        :param args: arguments of mpc_iteration before the iteration
+        :return: actions of the control step and their source: 'plan' or 'rule' (actions are None)
+        '''
+        self.steps += 1
+        if self.future is None or self.future.done():
+            self.solves += 1
+            self.future = self.executor.submit(self.solve, iteration, args)
+        plan_iteration, plan = self.active
+        actions = plan_action(plan, plan_iteration, iteration)
+        if actions is None:
+            self.fallbacks['rule'] += 1
+            return None, 'rule'
+        self.fallbacks['plan'] += 1
+        self.plan_ages.append(iteration - plan_iteration)
+        return actions, 'plan'
+
+    def solve(self, iteration, args):
+        start = time.time()
+        try:
+            outputs = self.mpc_iteration(*args, iteration)
+        except Exception as error:      # nothing waits on the future: count the error as a failure and keep the plan
+            self.solve_times.append(time.time() - start)
+            self.failures += 1
+            print('MPC solve of iteration', iteration, 'failed:', repr(error))
+            return
+        self.solve_times.append(time.time() - start)
+        if outputs['success']:
+            self.active = (iteration, outputs['plan'])
+        else:
+            self.failures += 1
+
+    def report(self):
+        solve_times = self.solve_times or [0]
+        plan_ages = self.plan_ages or [0]
+        return 'Asynchronous MPC: ' + str(self.solves) + ' solves and ' + str(self.failures) + \
+            ' solver failures in ' + str(self.steps) + ' control steps, ' + str(self.fallbacks['plan']) + \
+            ' actions from the active plan (plan age mean ' + str(round(sum(plan_ages) / len(plan_ages), 2)) + \
+            ' max ' + str(max(plan_ages)) + ' steps) and ' + str(self.fallbacks['rule']) + \
+            ' from the rule-based algorithm, solve time mean ' + str(round(sum(solve_times) / len(solve_times), 3)) + \
+            ' s max ' + str(round(max(solve_times), 3)) + ' s'
+
+
+class EventTriggeredMPC():
+    '''
+    Solves the MPC only when the plan no longer describes the system. At each control step, the measurements are
+    compared to the values the active plan predicted for this step: the MPC is solved again when a deviation exceeds
+    its threshold, when the plan is max_age control steps old or when no plan covers the step. Otherwise action()
+    returns the actions the plan has for this step. A failed solve falls back on the active plan, then on the
+    rule-based algorithm.
+    :param mpc_iteration: mpc_boilers.mpc_iteration or mpc_batteries.mpc_iteration
+    :param arg_names: names of the arguments of mpc_iteration before the iteration (ITERATION_ARGS of its module)
+    :param thresholds: maximum absolute deviation from the plan by measurement name, e.g. {'Tb1': 0.5, 'Tb2': 0.5,
+    'soc_bat': 100, 'p_x': 500} (in degree celsius, Watts-h and Watts), measurements not given or not in arg_names
+    are not compared
+    :param max_age: in control steps, a plan is used at most max_age steps after its solve
+    '''
+    def __init__(self, mpc_iteration, arg_names, thresholds, max_age):
+        self.mpc_iteration = mpc_iteration
+        self.arg_names = arg_names
+        self.thresholds = {name: threshold for name, threshold in thresholds.items() if name in arg_names}
+        self.max_age = max_age
+        self.plan = None                        # actions and predicted measurements of the last successful solve
+        self.plan_iteration = None
+        self.steps = 0
+        self.failures = 0
+        self.triggers = dict.fromkeys(['no plan', 'age'] + list(self.thresholds), 0)
+        self.fallbacks = {'plan': 0, 'rule': 0}
+        self.solve_times = []
+
+    def trigger(self, iteration, measurements):
+        '''
+        :return: the reason to solve the MPC at this step, None to follow the plan
+        '''
+        predicted = plan_action(self.plan, self.plan_iteration, iteration)
+        if predicted is None:
+            return 'no plan'
+        if iteration - self.plan_iteration >= self.max_age:
+            return 'age'
+        for name, threshold in self.thresholds.items():
+            if abs(measurements[name] - predicted[name]) > threshold:
+                return name
+        return None
+
+    def action(self, iteration, args):
+        '''
+        :param args: arguments of mpc_iteration before the iteration
+        :return: actions of the control step and their source: 'mpc', 'plan' or 'rule' (actions are None)
+        '''
+        self.steps += 1
+        reason = self.trigger(iteration, dict(zip(self.arg_names, args)))
+        if reason is not None:
+            self.triggers[reason] += 1
+            start = time.time()
+            outputs = self.mpc_iteration(*args, iteration)
+            self.solve_times.append(time.time() - start)
+            if outputs['success']:
+                self.plan, self.plan_iteration = outputs['plan'], iteration
+                return outputs, 'mpc'
+            self.failures += 1
+        actions = plan_action(self.plan, self.plan_iteration, iteration)
+        if actions is None:
+            self.fallbacks['rule'] += 1
+            return None, 'rule'
+        self.fallbacks['plan'] += 1
+        return actions, 'plan'
+
+    def report(self):
+        solve_times = self.solve_times or [0]
+        return 'Event-triggered MPC: ' + str(len(self.solve_times)) + ' solves (' + \
+            ', '.join(name + ' ' + str(count) for name, count in self.triggers.items()) + ') and ' + \
+            str(self.failures) + ' solver failures in ' + str(self.steps) + ' control steps, ' + \
+            str(self.fallbacks['plan']) + ' actions from the plan and ' + str(self.fallbacks['rule']) + \
+            ' from the rule-based algorithm, solve time mean ' + str(round(sum(solve_times) / len(solve_times), 3)) + \
+            ' s max ' + str(round(max(solve_times), 3)) + ' s'
+
+
+class CachedMPC():
+    '''
+    Memoization of mpc_iteration: calls with the same iteration and the same measurements, quantized to the given
+    resolutions, return the outputs of the first successful solve. The measurements without a resolution are part of
+    the key as they are. The least recently used outputs are dropped beyond maxsize entries. A CachedMPC is called as
+    mpc_iteration and can be shared by the runners of several scenarios, as long as they use the same MPC module and
+    configuration (the key does not include the forecasts, the prices or the problem parameters).
+    :param mpc_iteration: mpc_boilers.mpc_iteration or mpc_batteries.mpc_iteration
+    :param arg_names: names of the arguments of mpc_iteration before the iteration (ITERATION_ARGS of its module)
+    :param resolutions: quantization step by measurement name, e.g. {'Tb1': 0.1, 'Tb2': 0.1, 'soc_bat': 10,
+    'p_x': 50} (in degree celsius, Watts-h and Watts)
+    :param maxsize: maximum number of cached outputs
+    '''
+    def __init__(self, mpc_iteration, arg_names, resolutions, maxsize):
+        self.mpc_iteration = mpc_iteration
+        self.arg_names = arg_names
+        self.resolutions = resolutions
+        self.maxsize = maxsize
+        self.outputs = OrderedDict()            # key: outputs, from the least to the most recently used
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, args, iteration):
+        return (iteration,) + tuple(round(value / self.resolutions[name]) if name in self.resolutions else value
+                                    for name, value in zip(self.arg_names, args))
+
+    def __call__(self, *args):
+        *args, iteration = args
+        key = self.key(args, iteration)
+        outputs = self.outputs.get(key)
+        if outputs is not None:
+            self.hits += 1
+            self.outputs.move_to_end(key)
+            return outputs
+        self.misses += 1
+        outputs = self.mpc_iteration(*args, iteration)
+        if outputs['success']:                  # failed solves are attempted again
+            self.outputs[key] = outputs
+            if len(self.outputs) > self.maxsize:
+                self.outputs.popitem(last=False)
+                self.evictions += 1
+        return outputs
+
+    def report(self):
+        calls = max(1, self.hits + self.misses)
+        return 'MPC cache: ' + str(self.hits) + ' hits and ' + str(self.misses) + ' misses (hit rate ' + \
+            str(round(100 * self.hits / calls, 1)) + ' %), ' + str(len(self.outputs)) + ' cached outputs and ' + \
+            str(self.evictions) + ' evictions'
+
+
+class ExplicitMPC():
+    '''
+    Actuates from an explicit policy (mpc_explicit.ExplicitPolicy) instead of solving the MPC. When the policy has no
+    action for the control step (step not built, or p_x outside its grid), the MPC is solved online, and the
+    rule-based algorithm is used when this solve fails.
+    :param policy: mpc_explicit.ExplicitPolicy of mpc_boilers
+    :param mpc_iteration: mpc_boilers.mpc_iteration
+    '''
+    def __init__(self, policy, mpc_iteration):
+        self.policy = policy
+        self.mpc_iteration = mpc_iteration
+        self.steps = 0
+        self.failures = 0
+        self.sources = {'explicit': 0, 'mpc': 0, 'rule': 0}
+        self.evaluation_times = []
+        self.solve_times = []
+
+    def action(self, iteration, args):
+        '''
+        :param args: arguments of mpc_iteration before the iteration
+        :return: actions of the control step and their source: 'explicit', 'mpc' or 'rule' (actions are None)
+        '''
+        self.steps += 1
+        start = time.time()
+        actions = self.policy.evaluate(iteration, *args)
+        self.evaluation_times.append(time.time() - start)
+        if actions is not None:
+            self.sources['explicit'] += 1
+            return {1: actions[0], 2: actions[1], 'success': True}, 'explicit'
+        start = time.time()
+        outputs = self.mpc_iteration(*args, iteration)
+        self.solve_times.append(time.time() - start)
+        if outputs['success']:
+            self.sources['mpc'] += 1
+            return outputs, 'mpc'
+        self.failures += 1
+        self.sources['rule'] += 1
+        return None, 'rule'
+
+    def report(self):
+        evaluation_times = self.evaluation_times or [0]
+        solve_times = self.solve_times or [0]
+        return 'Explicit MPC: ' + str(self.sources['explicit']) + ' actions from the policy, ' + \
+            str(self.sources['mpc']) + ' from online solves and ' + str(self.sources['rule']) + \
+            ' from the rule-based algorithm in ' + str(self.steps) + ' control steps, evaluation time mean ' + \
+            str(round(1e6 * sum(evaluation_times) / len(evaluation_times), 1)) + ' us, online solve time mean ' + \
+            str(round(sum(solve_times) / len(solve_times), 3)) + ' s'
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import operator
+import numpy as np
+from EMS_simulation.water import d_WATER, C_WATER
 
 ## =========================    SIMULATION PARAMETERS    =============================== ##
 SIMU_TIMESTEP = 30                                  # in seconds
@@ -32,9 +34,6 @@ SOC_MIN = 200                                       # Min State-of-Charge batter
 PMAX_CH = -5000                                     # Max battery charging power (W)
 PMAX_DISCH = 5000                                   # Max battery discharging power (W)
 
-d_WATER = 997                                       # in [g/L]
-C_WATER = 4.186                                     # in [W*s/k*K]
-
 C_BOILER =  (C_WATER * d_WATER * BOILER1_VOLUME)    # in [(Watt*sec)/K]
 
 TEMP = 0                 # boiler state variable n0
@@ -42,6 +41,15 @@ POWER = 1                # boiler state variable n1
 HYST = 2                 # boiler state variable n2
 SOC = 0                  # battery state variable n0
 
+# the boilers as arrays (boiler i at index i-1) for the array versions of the algorithms, which take any such arrays
+BOILERS_ARRAYS = {'temp_min': np.array([BOILER1_TEMP_MIN, BOILER2_TEMP_MIN], dtype=float),
+                  'temp_max': np.array([BOILER1_TEMP_MAX, BOILER2_TEMP_MAX], dtype=float),
+                  'temp_delta': np.array([BOILER1_TEMP_DELTA, BOILER2_TEMP_DELTA]),
+                  'rated_p': np.array([BOILER1_RATED_P, BOILER2_RATED_P], dtype=float),
+                  'capacity': np.array([C_BOILER, C_BOILER])}
+for values in BOILERS_ARRAYS.values():      # shared by every call without boilers, not to be changed in place
+    values.setflags(write=False)
+
 def algo_scenario0(boiler_states):
     '''
     :param boiler_states:
@@ -132,3 +140,77 @@ def algo_scenario2(boiler_states, p_x, battery_state):
     return outputs
 
 
+def hysteresis(temps, hyst_states, boilers):
+    '''
+    :return: hysteresis state variables of the boilers (arrays), as determined in the algorithms
+    '''
+    return np.where(temps >= boilers['temp_delta'], 0, np.where(temps <= boilers['temp_min'], 1, hyst_states))
+
+
+def allocate_surplus(temps, powers, hyst_states, p_x, boilers):
+    '''
+    Surplus allocation of algo_scenario1 and algo_scenario2 over arrays of boilers: the boilers in the order of their
+    states (temperature, power, hysteresis state, then index, as sorted() on the state lists), those in hysteresis
+    at rated power and the others taking the surplus left, up to their rated power and the power bringing them to their
+    maximum temperature in a second. The surplus left before each boiler is the surplus minus the cumulated demands of
+    the previous boilers (np.subtract.accumulate, in the order of the sequential updates and so with the same results)
+    as long as it is positive, after which only the boilers in hysteresis change it.
+    :return: actions and hysteresis state variables of the boilers, and the surplus left
+    '''
+    hyst = hysteresis(temps, hyst_states, boilers)
+    order = np.lexsort((hyst_states, powers, temps))
+    heating = hyst[order] == 1
+    rated_p = boilers['rated_p'][order]
+    demands = np.where(heating, -rated_p, np.minimum(np.maximum(0, boilers['temp_max'][order] - temps[order]) /
+                                                     boilers['capacity'][order], -rated_p))
+    surplus = np.subtract.accumulate(np.concatenate(([p_x], demands)))
+    actions = np.empty(len(order))
+    actions[order] = np.where(heating, rated_p, np.where(surplus[:-1] > 0, -np.minimum(demands, surplus[:-1]), 0))
+
+    # surplus left: after the first boiler it does not cover, changed only by the boilers in hysteresis
+    exhausted = np.flatnonzero(surplus[1:] <= 0)
+    if p_x <= 0:
+        left, first = p_x, 0
+    elif not len(exhausted):
+        return actions, hyst, surplus[-1]
+    else:
+        left, first = (surplus[exhausted[0] + 1] if heating[exhausted[0]] else 0.0), exhausted[0] + 1
+    left = np.subtract.accumulate(np.append(left, demands[first:][heating[first:]]))[-1]
+    return actions, hyst, left
+
+
+def algo_scenario0_arrays(temps, powers, hyst_states, boilers=None):
+    '''
+    algo_scenario0 over arrays of boiler states (temperatures, powers and hysteresis state variables)
+    :param boilers: dict of arrays as BOILERS_ARRAYS, the two boilers of the scenarios if None
+    :return: arrays of the actions and of the hysteresis state variables
+    '''
+    boilers = BOILERS_ARRAYS if boilers is None else boilers
+    hyst = hysteresis(temps, hyst_states, boilers)
+    return {'actions': np.where(hyst == 1, boilers['rated_p'], 0), 'hyst_states': hyst}
+
+
+def algo_scenario1_arrays(temps, powers, hyst_states, p_x, boilers=None):
+    '''
+    algo_scenario1 over arrays of boiler states (temperatures, powers and hysteresis state variables)
+    :param boilers: dict of arrays as BOILERS_ARRAYS, the two boilers of the scenarios if None
+    :return: arrays of the actions and of the hysteresis state variables
+    '''
+    boilers = BOILERS_ARRAYS if boilers is None else boilers
+    actions, hyst, _ = allocate_surplus(temps, powers, hyst_states, p_x, boilers)
+    return {'actions': actions, 'hyst_states': hyst}
+
+
+def algo_scenario2_arrays(temps, powers, hyst_states, p_x, battery_state, boilers=None):
+    '''
+    algo_scenario2 over arrays of boiler states (temperatures, powers and hysteresis state variables)
+    :param boilers: dict of arrays as BOILERS_ARRAYS, the two boilers of the scenarios if None
+    :return: arrays of the actions and of the hysteresis state variables, and the action of the battery
+    '''
+    boilers = BOILERS_ARRAYS if boilers is None else boilers
+    actions, hyst, p_x = allocate_surplus(temps, powers, hyst_states, p_x, boilers)
+    if p_x > 0:
+        u_bat = max((battery_state[SOC] - SOC_MAX)/(CONTROL_TIMESTEP/3600), PMAX_CH , -p_x)
+    else:
+        u_bat = min((battery_state[SOC] - SOC_MIN)/(CONTROL_TIMESTEP/3600) , PMAX_DISCH , -p_x)
+    return {'actions': actions, 'bat': u_bat, 'hyst_states': hyst}
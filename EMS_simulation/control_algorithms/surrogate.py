@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import mpc_boilers
+from EMS_simulation.control_algorithms import mpc_batteries
+
+
+## =========================    SURROGATE PARAMETERS    =============================== ##
+MODEL_PATHS = {'boilers': 'data_input/surrogate_boilers.npz', 'battery': 'data_input/surrogate_battery.npz'}
+HIDDEN_UNITS = (32, 32)                             # tanh layers of the MLP
+EPOCHS = 3000
+BATCH_SIZE = 256
+LEARNING_RATE = 3e-3                                # Adam
+WEIGHT_DECAY = 1e-5
+# horizon windows of the forecast features, in control steps from the current one (excluded)
+FORECAST_WINDOWS = [(1, 13), (13, 37), (37, 145)]
+## ==================================================================================== ##
+
+# per MPC module: its arguments, the actions of its outputs and their limits
+MODULES = {'boilers': {'arg_names': mpc_boilers.ITERATION_ARGS, 'actions': [1, 2],
+                       'lower': [boiler['rated_p'] for boiler in mpc_boilers.BOILERS], 'upper': [0, 0]},
+           'battery': {'arg_names': mpc_batteries.ITERATION_ARGS, 'actions': [1, 2, 'bat'],
+                       'lower': [boiler['rated_p'] for boiler in mpc_batteries.BOILERS] +
+                                [mpc_batteries.BATTERY['charge_power_limit']],
+                       'upper': [0, 0, mpc_batteries.BATTERY['discharge_power_limit']]}}
+
+
+def features(module, iteration, args):
+    '''
+    :param module: 'boilers' (mpc_boilers) or 'battery' (mpc_batteries)
+    :param args: arguments of the mpc_iteration of the module before the iteration
+    :return: the measurements, the time of day, and the forecasts of the MPC horizon averaged (excess power, prices)
+    or summed (hot water energy) over FORECAST_WINDOWS
+    '''
+    measurements = dict(zip(MODULES[module]['arg_names'], args))
+    current_time = datetime.strptime(mpc_boilers.MPC_START_TIME, "%m.%d.%Y %H:%M:%S") + \
+        timedelta(minutes=iteration * mpc_boilers.CONTROL_TIMESTEP)
+    excess_power, hot_water_energy, sell_price, buy_price = \
+        forecasts.get_forecast_provider(mpc_boilers.CONTROL_TIMESTEP).window(current_time, mpc_boilers.no_slots)
+    day_fraction = (current_time.hour * 60 + current_time.minute) / 1440
+    values = [measurements['p_x'], measurements['energy_hot_water'], measurements['Tb1'], measurements['Tb2']]
+    if 'soc_bat' in measurements:
+        values.append(measurements['soc_bat'])
+    values += [np.sin(2 * np.pi * day_fraction), np.cos(2 * np.pi * day_fraction), sell_price[0], buy_price[0]]
+    for start, end in FORECAST_WINDOWS:
+        values += [excess_power[start:end].mean(), hot_water_energy[start:end].sum(), buy_price[start:end].mean()]
+    return np.array(values)
+
+
+class Surrogate():
+    '''
+    Controller distilled from an MPC module: a multilayer perceptron (tanh hidden layers, linear output) from the
+    features() of a control step to the actions of the MPC, clipped to the power limits. Inference is a few small
+    matrix products in NumPy. action() has the interface of the runners of mpc_runner.
+    :param module: 'boilers' or 'battery'
+    :param weights: list of (W, b) per layer
+    :param feature_mean, feature_std: standardization of the features
+    '''
+    def __init__(self, module, weights, feature_mean, feature_std):
+        self.module = module
+        self.weights = weights
+        self.feature_mean = feature_mean
+        self.feature_std = feature_std
+        self.lower = np.array(MODULES[module]['lower'], dtype=float)
+        self.upper = np.array(MODULES[module]['upper'], dtype=float)
+        self.steps = 0
+        self.inference_times = []
+
+    @classmethod
+    def fit(cls, module, inputs, targets, seed=1):
+        '''
+        Trains the MLP by minibatch Adam on the mean squared error of the actions scaled to [-1, 1].
+        :param inputs: features() of each sample, one line per sample
+        :param targets: MPC actions of each sample, in the order of MODULES[module]['actions']
+        '''
+        rng = np.random.default_rng(seed)
+        feature_mean, feature_std = inputs.mean(axis=0), inputs.std(axis=0) + 1e-9
+        surrogate = cls(module, [], feature_mean, feature_std)
+        x = (inputs - feature_mean) / feature_std
+        y = surrogate.scale(targets)
+        sizes = [x.shape[1], *HIDDEN_UNITS, y.shape[1]]
+        surrogate.weights = [(rng.normal(0, np.sqrt(1 / n_in), (n_in, n_out)), np.zeros(n_out))
+                             for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+        moments = [[np.zeros_like(p) for p in layer] for layer in surrogate.weights]
+        squares = [[np.zeros_like(p) for p in layer] for layer in surrogate.weights]
+        t = 0
+        for epoch in range(EPOCHS):
+            order = rng.permutation(len(x))
+            for batch in np.array_split(order, max(1, len(x) // BATCH_SIZE)):
+                gradients = surrogate.gradients(x[batch], y[batch])
+                t += 1
+                for layer, gradient, moment, square in zip(surrogate.weights, gradients, moments, squares):
+                    for p, g, m, v in zip(layer, gradient, moment, square):
+                        g = g + WEIGHT_DECAY * p
+                        m[:] = 0.9 * m + 0.1 * g
+                        v[:] = 0.999 * v + 0.001 * g ** 2
+                        p -= LEARNING_RATE * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+        return surrogate
+
+    def gradients(self, x, y):
+        activations = [x]
+        for W, b in self.weights[:-1]:
+            activations.append(np.tanh(activations[-1] @ W + b))
+        W, b = self.weights[-1]
+        error = 2 * (activations[-1] @ W + b - y) / len(x)
+        gradients = []
+        for (W, b), activation in zip(reversed(self.weights), reversed(activations)):
+            gradients.append((activation.T @ error, error.sum(axis=0)))
+            error = (error @ W.T) * (1 - activation ** 2)
+        return gradients[::-1]
+
+    def scale(self, actions):
+        return 2 * (actions - self.lower) / (self.upper - self.lower) - 1
+
+    def predict(self, inputs):
+        '''
+        :param inputs: features() of a control step, or one line per control step
+        :return: actions, clipped to the power limits
+        '''
+        x = (inputs - self.feature_mean) / self.feature_std
+        for W, b in self.weights[:-1]:
+            x = np.tanh(x @ W + b)
+        W, b = self.weights[-1]
+        actions = self.lower + (x @ W + b + 1) * (self.upper - self.lower) / 2
+        return np.clip(actions, self.lower, self.upper)
+
+    def project(self, actions, measurements):
+        '''
+        Safety layer of the regression: restricts the actions to those keeping the temperatures and the state of
+        charge predicted for the next control step (one step of the boiler and battery models, the hot water drawn
+        during the step mixed with incoming water) within the limits of the MPC, as far as the power limits allow.
+        '''
+        dt = mpc_boilers.CONTROL_TIMESTEP * 60                                          # in seconds
+        lower, upper = self.lower.copy(), self.upper.copy()
+        for i, (boiler, temp) in enumerate(zip(mpc_boilers.BOILERS, (measurements['Tb1'], measurements['Tb2']))):
+            drop = measurements['energy_hot_water'] * (temp - boiler['temp_incoming']) / (boiler['capacity'] * temp)
+            lower[i] = max(lower[i], (temp - drop - boiler['temp_max']) * boiler['capacity'] / dt)
+            upper[i] = min(upper[i], (temp - drop - boiler['temp_min']) * boiler['capacity'] / dt)
+        if 'soc_bat' in measurements:
+            battery = mpc_batteries.BATTERY
+            lower[2] = max(lower[2], (measurements['soc_bat'] - battery['soc_max']) * 60 / mpc_boilers.CONTROL_TIMESTEP)
+            upper[2] = min(upper[2], (measurements['soc_bat'] - battery['soc_min']) * 60 / mpc_boilers.CONTROL_TIMESTEP)
+        # when the limits cannot be met, the actions closest to them within the power limits
+        return np.clip(np.clip(actions, lower, upper), self.lower, self.upper)
+
+    def action(self, iteration, args):
+        '''
+        :param args: arguments of the mpc_iteration of the module before the iteration
+        :return: actions of the control step (projected on the limits of the next step) and their source 'surrogate'
+        '''
+        self.steps += 1
+        start = time.time()
+        actions = self.project(self.predict(features(self.module, iteration, args)),
+                               dict(zip(MODULES[self.module]['arg_names'], args)))
+        self.inference_times.append(time.time() - start)
+        outputs = dict(zip(MODULES[self.module]['actions'], actions.tolist()))
+        outputs['success'] = True
+        return outputs, 'surrogate'
+
+    def size(self):
+        '''
+        :return: number of parameters (weights, biases and standardization) and their size in bytes
+        '''
+        parameters = [p for layer in self.weights for p in layer] + [self.feature_mean, self.feature_std]
+        return sum(p.size for p in parameters), sum(p.nbytes for p in parameters)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        no_layers = len([name for name in data.files if name.startswith('W')])
+        weights = [(data['W' + str(i)], data['b' + str(i)]) for i in range(no_layers)]
+        return cls(str(data['module']), weights, data['feature_mean'], data['feature_std'])
+
+    def save(self, path):
+        layers = {}
+        for i, (W, b) in enumerate(self.weights):
+            layers['W' + str(i)], layers['b' + str(i)] = W, b
+        np.savez(path, module=self.module, feature_mean=self.feature_mean, feature_std=self.feature_std, **layers)
+
+    def report(self):
+        inference_times = self.inference_times or [0]
+        parameters, size = self.size()
+        return 'Surrogate of the MPC (' + self.module + '): ' + str(self.steps) + ' control steps, ' + \
+            str(parameters) + ' parameters (' + str(round(size / 1000, 1)) + ' kB), inference time mean ' + \
+            str(round(1e6 * sum(inference_times) / len(inference_times), 1)) + ' us'
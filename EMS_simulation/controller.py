@@ -8,10 +8,17 @@ import random
 import matplotlib.pyplot as plt
 import paho.mqtt.client as mqtt
 import time
+import queue
 from datetime import timedelta
 from EMS_simulation.control_algorithms import scenarios
 from EMS_simulation.control_algorithms import mpc_boilers
 from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.control_algorithms import mpc_runner
+from EMS_simulation.control_algorithms import mpc_explicit
+from EMS_simulation.control_algorithms import surrogate
+from EMS_simulation import data_loader
+from EMS_simulation import clock
+from EMS_simulation.water import d_WATER, C_WATER
 broker_address ="mqtt.teserakt.io"   # use external broker (alternative broker address: "test.mosquitto.org")
 
 
@@ -26,6 +33,27 @@ CONTROL_TIMESTEP = 5*60                 # in seconds
 scenario = 'Scenario2'
 
 FORECAST_INACCURACY_COEF = 0.1  # 0 for perfect accuracy, 1 for big inaccuracy
+
+# MPC solve budget in seconds (None to wait for every solve). A late or failed solve is replaced by the action the
+# previous plan has for this step, or by Scenario1 (MPCboilers) / Scenario2 (MPCbattery) without such a plan.
+MPC_DEADLINE = None
+# solve the MPC in the background and publish the actions of the last plan at once (MPC_DEADLINE is then not used)
+MPC_ASYNC = False
+# solve the MPC only when a measurement deviates from the prediction of the last plan by more than its threshold, or
+# when the plan is MPC_MAX_PLAN_AGE control steps old, e.g. {'Tb1': 0.5, 'Tb2': 0.5, 'soc_bat': 100, 'p_x': 500}
+# (degree celsius, Watts-h, Watts). None to solve at every control step
+MPC_EVENT_THRESHOLDS = None
+MPC_MAX_PLAN_AGE = 12
+# reuse the MPC outputs of a previous call with the same control step and measurements quantized to these resolutions,
+# e.g. {'Tb1': 0.1, 'Tb2': 0.1, 'soc_bat': 10, 'p_x': 50}, keeping at most MPC_CACHE_SIZE outputs. None for no cache
+MPC_CACHE_RESOLUTIONS = None
+MPC_CACHE_SIZE = 2000
+# MPCboilers: actuate from an explicit policy built offline by control_algorithms/mpc_explicit.py (path of the .npz
+# file), the MPC being solved online only for the states outside the policy. None to solve online
+MPC_EXPLICIT_POLICY = None
+# actuate from the regression model distilled from the MPC by benchmarks/surrogate.py (surrogate.MODEL_PATHS), without
+# solving the MPC online
+MPC_SURROGATE = False
 ## ==================================================================================== ##
 
 
@@ -33,19 +61,17 @@ CONTROL_STEPS = range(0, int(HORIZON/SIMU_TIMESTEP), int(CONTROL_TIMESTEP/SIMU_T
 SIMU_STEPS = range(int(HORIZON/SIMU_TIMESTEP)-int(CONTROL_TIMESTEP/SIMU_TIMESTEP))
 SIMU_STEPS = range(int(HORIZON/SIMU_TIMESTEP)-10)
 
-if scenario == 'Scenario2' or scenario == 'MPCbattery':
-    BATTERY = True
-else:
-    BATTERY = False
+def has_battery(scenario):
+    return scenario == 'Scenario2' or scenario == 'MPCbattery'
+
 
-d_WATER = 977
-C_WATER = 4.186
+BATTERY = has_battery(scenario)
 
 
 class Controller():
-    def __init__(self, description):
+    def __init__(self, description, connect=True):
         self.description = description
-        self.client = self.setup_client()
+        self.client = self.setup_client() if connect else None     # no MQTT client in the lockstep simulation
         self.control_iter = 0
         self.Tb1 = 0
         self.pb1 = 0
@@ -63,11 +89,86 @@ class Controller():
         self.sb2_list = []
         self.soc_bat_list = []
         self.p_bat_list = []
+        self.ticks = queue.Queue()     # control steps started by the simulation clock (clock.VIRTUAL_CLOCK)
+        self.mpc = None
+        self.mpc_cache = None
+        for name, module, assets in (('MPCboilers', mpc_boilers, 'boilers'), ('MPCbattery', mpc_batteries, 'battery')):
+            if name not in description:
+                continue
+            mpc_iteration = module.mpc_iteration
+            if MPC_CACHE_RESOLUTIONS is not None:
+                self.mpc_cache = mpc_runner.CachedMPC(mpc_iteration, module.ITERATION_ARGS, MPC_CACHE_RESOLUTIONS,
+                                                      MPC_CACHE_SIZE)
+                mpc_iteration = self.mpc_cache
+            if MPC_SURROGATE:
+                self.mpc = surrogate.Surrogate.load(surrogate.MODEL_PATHS[assets])
+            elif name == 'MPCboilers' and MPC_EXPLICIT_POLICY is not None:
+                self.mpc = mpc_runner.ExplicitMPC(mpc_explicit.ExplicitPolicy.load(MPC_EXPLICIT_POLICY), mpc_iteration)
+            elif MPC_ASYNC:
+                self.mpc = mpc_runner.AsyncMPC(mpc_iteration)
+            elif MPC_EVENT_THRESHOLDS is not None:
+                self.mpc = mpc_runner.EventTriggeredMPC(mpc_iteration, module.ITERATION_ARGS, MPC_EVENT_THRESHOLDS,
+                                                        MPC_MAX_PLAN_AGE)
+            else:
+                self.mpc = mpc_runner.DeadlineMPC(mpc_iteration, MPC_DEADLINE)
 
 
     def run_algorithm(self, p_x, water):
 
-        if 'Scenario0' in self.description:
+        for name in ('Scenario0', 'Scenario1', 'Scenario2'):
+            if name in self.description:
+                return self.run_rule_based(name, p_x)
+
+        if 'MPCboilers' in self.description:
+            start = time.time()
+            output, source = self.mpc.action(self.control_iter, (p_x, water, self.Tb1, self.Tb2))
+            if source == 'rule':
+                output = self.run_rule_based('Scenario1', p_x)
+            print("---------MPC computing time =", time.time()-start, "- action from", source)
+            self.control_iter += 1
+            return output
+
+        if 'MPCbattery' in self.description:
+            print("battery soc ", self.soc_bat)
+            start = time.time()
+            output, source = self.mpc.action(self.control_iter, (p_x, self.soc_bat, water, self.Tb1, self.Tb2))
+            if source == 'rule':
+                output = self.run_rule_based('Scenario2', p_x)
+            print("---------MPC computing time =", time.time()-start, "- action from", source)
+            self.control_iter += 1
+            return output
+
+    def receive(self, topic, value):
+        '''
+        Measurement published by a boiler or battery model on topic
+        '''
+        if topic == 'boiler1_sensor/power':
+            self.pb1 = value
+            self.pb1_list.append(self.pb1)
+
+        if topic == 'boiler1_sensor/temp':
+            self.Tb1 = value
+            self.Tb1_list.append(self.Tb1)
+
+        if topic == 'boiler2_sensor/power':
+            self.pb2 = value
+            self.pb2_list.append(self.pb2)
+
+        if topic == 'boiler2_sensor/temp':
+            self.Tb2 = value
+            self.Tb2_list.append(self.Tb2)
+
+        if topic == 'battery/soc':
+            self.soc_bat = value
+            self.soc_bat_list.append(self.soc_bat)
+
+        if topic == 'battery/power':
+            self.p_bat = value
+            self.p_bat_list.append(self.p_bat)
+
+    def run_rule_based(self, name, p_x):
+
+        if 'Scenario0' == name:
             output = scenarios.algo_scenario0({1: [self.Tb1, self.pb1, self.sb1], 2: [self.Tb2, self.pb2, self.sb2]})
             self.sb1 = output['hyst_states'][1]
             self.sb1_list.append(self.sb1)
@@ -75,7 +176,7 @@ class Controller():
             self.sb2_list.append(self.sb2)
             return output['actions']
 
-        if 'Scenario1' in self.description:
+        if 'Scenario1' == name:
             output = scenarios.algo_scenario1({1:[self.Tb1, self.pb1, self.sb1], 2:[self.Tb2, self.pb2, self.sb2]}, p_x)
             self.sb1 = output['hyst_states'][1]
             self.sb1_list.append(self.sb1)
@@ -83,7 +184,7 @@ class Controller():
             self.sb2_list.append(self.sb2)
             return output['actions']
 
-        if 'Scenario2' in self.description:
+        if 'Scenario2' == name:
             output = scenarios.algo_scenario2({1: [self.Tb1, self.pb1, self.sb1], 2: [self.Tb2, self.pb2, self.sb2]},
                                               p_x, [self.soc_bat, self.p_bat] )
             self.sb1 = output['hyst_states'][1]
@@ -92,21 +193,6 @@ class Controller():
             self.sb2_list.append(self.sb2)
             return output['actions']
 
-        if 'MPCboilers' in self.description:
-            start = time.time()
-            output = mpc_boilers.mpc_iteration(p_x, water, self.Tb1, self.Tb2, self.control_iter)
-            print("---------MPC computing time =", time.time()-start)
-            self.control_iter += 1
-            return output
-
-        if 'MPCbattery' in self.description:
-            print("battery soc ", self.soc_bat)
-            start = time.time()
-            output = mpc_batteries.mpc_iteration(p_x, water, self.Tb1, self.Tb2, self.soc_bat, self.control_iter)
-            print("---------MPC computing time =", time.time()-start)
-            self.control_iter += 1
-            return output
-
     def setup_client(self):
         client = mqtt.Client(self.description)
         client.on_connect = on_connect
@@ -129,7 +215,7 @@ def new_resolution(y, step, days):
 
 def get_excess_power_forecast():
     # Data acquisition. Simulation of daily power excess (P_PV - P_nc)
-    excess_df = pd.read_excel('data_input/Energie - 00003 - Pache.xlsx', index_col=[0], usecols=[0, 1])
+    excess_df = data_loader.read_excel('data_input/Energie - 00003 - Pache.xlsx', usecols=[0, 1])
     # Convert the energy (kWh) to power (W) and power convention (buy positive and sell negative)
     excess_df['P_PV - P_nc (kW)'] = excess_df[
                                      'Flux energie au point d\'injection (kWh)'] * 6 * -1000
@@ -157,9 +243,20 @@ def get_excess_power_simulation(p_x_forecast):
 
     return p_x
 
+def get_excess_power_simulations(p_x_forecast, coef, realisations, rng):
+    '''
+    Vectorized get_excess_power_simulation: realisations of the measured excess power, with the same distribution
+    :param coef: forecast inaccuracy coefficient, as FORECAST_INACCURACY_COEF
+    :param rng: numpy.random.Generator
+    :return: array of shape (realisations, simulation steps)
+    '''
+    p_x_forecast = np.asarray(p_x_forecast, dtype=float)
+    r = rng.random((realisations, len(p_x_forecast)))
+    return np.where(p_x_forecast > 0, p_x_forecast + coef*p_x_forecast*(2*r - 1), p_x_forecast - coef*p_x_forecast*r)
+
 def get_energy_hot_water_usage_simu():
-    measured = pd.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
-                             index_col=[0], usecols=[0,2])
+    measured = data_loader.read_excel('data_input/hot_water_consumption_artificial_profile_10min_granularity.xlsx',
+                                      usecols=[0,2])
     # hot_water_usage divided by 2 cause two boilers, with same consumption
     hot_water_usage = measured['Actual'].to_numpy()/2  /(10 / (CONTROL_TIMESTEP/60)) # data was in [litres/10min]
     hot_water_usage = np.repeat(hot_water_usage, int(10 / (CONTROL_TIMESTEP/60)))
@@ -168,13 +265,13 @@ def get_energy_hot_water_usage_simu():
     return water_energy_usage.tolist()
 
 def get_energy_sell_price():
-    df = pd.read_excel('data_input/energy_sell_price_10min_granularity.xlsx', index_col=[0], usecols=[0, 1])
+    df = data_loader.read_excel('data_input/energy_sell_price_10min_granularity.xlsx', usecols=[0, 1])
     sell_price = df['Sell Price (CHF / kWh)'].to_numpy()
     sell_price = new_resolution(sell_price, SIMU_TIMESTEP, len(sell_price)*10/(60*24))
     return sell_price
 
 def get_energy_buy_price():
-    df = pd.read_excel('data_input/energy_buy_price_10min_granularity.xlsx', index_col=[0], usecols=[0, 1])
+    df = data_loader.read_excel('data_input/energy_buy_price_10min_granularity.xlsx', usecols=[0, 1])
     buy_price = df['Buy Price (CHF / kWh)'].to_numpy()
     buy_price = new_resolution(buy_price, SIMU_TIMESTEP, len(buy_price)*10/(60*24))
     return buy_price
@@ -196,29 +293,75 @@ def on_message_controller(client, userdata, msg):
     message_handler(client, msg)
 
 def message_handler(client, msg):
-    if msg.topic == 'boiler1_sensor/power':
-        controller.pb1 = float(msg.payload)
-        controller.pb1_list.append(controller.pb1)
+    if msg.topic == clock.TICK_TOPIC:
+        controller.ticks.put(int(msg.payload))
+        return
+    controller.receive(msg.topic, float(msg.payload))
+
 
-    if msg.topic == 'boiler1_sensor/temp':
-        controller.Tb1 = float(msg.payload)
-        controller.Tb1_list.append(controller.Tb1)
+def daily_cost(controller, p_x_measured, sell_price, buy_price, battery=BATTERY):
+    '''
+    :return: cost of the simulated power exchange with the grid (negative when electricity is bought), from the
+    measurements received by the controller at each simulation step
+    '''
+    cost = 0
+    for h in SIMU_STEPS:
+        p_grid_silutation = (p_x_measured[h] + controller.pb1_list[h] + controller.pb2_list[h]) \
+                            / (3600/SIMU_TIMESTEP) * 0.001 # convert Watt to kWh
+        if battery:
+            p_grid_silutation += controller.p_bat_list[h] / (3600/SIMU_TIMESTEP) * 0.001 # convert Watt to kWh
 
-    if msg.topic == 'boiler2_sensor/power':
-        controller.pb2 = float(msg.payload)
-        controller.pb2_list.append(controller.pb2)
+        if p_grid_silutation > 0:
+            cost += p_grid_silutation * sell_price[h]
+        if p_grid_silutation <= 0:
+            cost += p_grid_silutation * buy_price[h]
+    return cost
 
-    if msg.topic == 'boiler2_sensor/temp':
-        controller.Tb2 = float(msg.payload)
-        controller.Tb2_list.append(controller.Tb2)
 
-    if msg.topic == 'battery/soc':
-        controller.soc_bat = float(msg.payload)
-        controller.soc_bat_list.append(controller.soc_bat)
+def plot_results(controller, p_x_measured, cost, scenario=scenario, battery=BATTERY):
+    '''
+    Plots the measurements received by the controller and saves the figure to simu_output/results_<scenario>.pdf
+    '''
+    positions = [0, 120 * 3, 120 * 6, 120 * 9, 120 * 12, 120 * 15, 120 * 18, 120 * 21, 120 * 24]
+    labels = [0, 3, 6, 9, 12, 15, 18, 21, 24]
+
+    fig, ax = plt.subplots(2, 1)
+    plt.setp(ax, xticks=positions, xticklabels=labels)
+
+    ax[0].set_title('(daily cost: ' + str(round(-cost, 2)) + ' CHF)', fontsize=15)
+    ax[0].plot(range(len(controller.pb1_list)), controller.pb1_list, label='Power B1', color='blue', linestyle='-.')
+    ax[0].plot(range(len(controller.pb2_list)), controller.pb2_list, label='Power B2', color='cyan', alpha=0.7)
+    if battery:
+        ax[0].plot(range(len(controller.p_bat_list)), controller.p_bat_list, label='Power battery', color='green')
+    ax[0].plot(range(len(p_x_measured)), p_x_measured, label='P_pv - P_load', color='grey', alpha=0.7)
+    ax[0].plot(range(len(p_x_measured)), [0 for i in range(len(p_x_measured))], color='black', alpha=0.7,
+               linestyle='-.')
+    ax0 = ax[0].twinx()
+    ax0.plot(range(len(p_x_measured)), [40 for i in range(len(p_x_measured))], color='red', linestyle='-.',
+             linewidth=0.7)
+    ax0.plot(range(len(p_x_measured)), [50 for i in range(len(p_x_measured))], color='red', linestyle='-.',
+             linewidth=0.7)
+    ax0.plot(range(len(p_x_measured)), [30 for i in range(len(p_x_measured))], color='orange', linestyle='-.',
+             linewidth=0.7)
+    ax0.plot(range(len(p_x_measured)), [60 for i in range(len(p_x_measured))], color='orange', linestyle='-.',
+             linewidth=0.7)
+    ax0.plot(range(len(controller.Tb1_list)), controller.Tb1_list, label='Temperature B1', color='red', linestyle='-.')
+    ax0.plot(range(len(controller.Tb2_list)), controller.Tb2_list, label='Temperature B2', color='orange')
+    if battery:
+        ax[1].plot(range(len(controller.soc_bat_list)), controller.soc_bat_list, label='Battery SoC', color='orange')
 
-    if msg.topic == 'battery/power':
-        controller.p_bat = float(msg.payload)
-        controller.p_bat_list.append(controller.p_bat)
+    ax[1].set_xlabel("Time [h]", fontsize=15)
+    if battery:
+        ax[1].set_ylabel('Battery SoC [Wh]', fontsize=15)
+    ax0.set_ylim(28, 61)
+    ax[0].set_xlabel("Time [h]", fontsize=15)
+    ax0.set_ylabel('Temperature [C]', fontsize=15)
+    ax[0].set_ylabel('Power [W]', fontsize=15)
+    ax0.legend(loc=1, fontsize=15)
+    ax[0].legend(loc=2, fontsize=15)
+    if battery:
+        ax[1].legend(loc=2, fontsize=15)
+    plt.savefig('simu_output/results_'+scenario+'.pdf')
 
 
 if __name__ == '__main__':
@@ -234,6 +377,8 @@ if __name__ == '__main__':
     if scenario == 'Scenario2' or scenario == 'MPCbattery':
         controller.client.subscribe("battery/soc")
         controller.client.subscribe("battery/power")
+    if clock.VIRTUAL_CLOCK:
+        controller.client.subscribe(clock.TICK_TOPIC, qos=clock.QOS)
 
     # get non-controllable variables
     sell_price = get_energy_sell_price()
@@ -243,22 +388,33 @@ if __name__ == '__main__':
     energy_hot_water_use = get_energy_hot_water_usage_simu()
 
     # wait until other entities are instantiated
-    while controller.Tb1 == 0 or controller.Tb2 == 0:
-        time.sleep(0.01)
-    if BATTERY:
-        while controller.soc_bat == 0:
+    if clock.VIRTUAL_CLOCK:     # subscribed to the measurements, the models publish their first ones on tick 0
+        clock.wait(controller.client, 'controller', 0, controller.ticks)
+    else:
+        while controller.Tb1 == 0 or controller.Tb2 == 0:
             time.sleep(0.01)
+        if BATTERY:
+            while controller.soc_bat == 0:
+                time.sleep(0.01)
 
     # launch control algo each CONTROL STEP taking last measurements from entities
     for h in CONTROL_STEPS:
         print("controller control action at ", h/2,'min')
-        time.sleep(0.1*(CONTROL_TIMESTEP/SIMU_TIMESTEP))
+        if clock.VIRTUAL_CLOCK:     # done with the previous control step, wait for the clock to start this one
+            tick = h // int(CONTROL_TIMESTEP/SIMU_TIMESTEP) + 1
+            clock.wait(controller.client, 'controller', tick, controller.ticks, skip_before=tick)
+        else:
+            time.sleep(0.1*(CONTROL_TIMESTEP/SIMU_TIMESTEP))
         #print("len(controller.pb1), len(controller.Tb2) ", len(controller.pb1_list), len(controller.Tb2_list))
         actions = controller.run_algorithm(p_x_measured[h], energy_hot_water_use[int(h/(CONTROL_TIMESTEP/SIMU_TIMESTEP))])
-        controller.client.publish('boiler1_actuator', str(actions[1]))
-        controller.client.publish('boiler2_actuator', str(actions[2]))
+        qos = clock.QOS if clock.VIRTUAL_CLOCK else 0     # the models wait for the actions
+        controller.client.publish('boiler1_actuator', str(actions[1]), qos=qos)
+        controller.client.publish('boiler2_actuator', str(actions[2]), qos=qos)
         if BATTERY:
-            controller.client.publish('batteryMS', str(actions['bat']))
+            controller.client.publish('batteryMS', str(actions['bat']), qos=qos)
+    if clock.VIRTUAL_CLOCK:         # the last tick tells that the models published all their measurements
+        clock.wait(controller.client, 'controller', len(CONTROL_STEPS) + 1, controller.ticks,
+                   skip_before=len(CONTROL_STEPS) + 1)
 
     # first measurement received was an init message. we remove it
     controller.pb1_list.pop(0)
@@ -284,65 +440,17 @@ if __name__ == '__main__':
     print("hot_water_use = ", energy_hot_water_use)'''
 
     # compute cost of the simulated power exchange with the grid
-    cost = 0
-    for h in SIMU_STEPS:
-        p_grid_silutation = (p_x_measured[h] + controller.pb1_list[h] + controller.pb2_list[h]) \
-                            / (3600/SIMU_TIMESTEP) * 0.001 # convert Watt to kWh
-        if BATTERY:
-            p_grid_silutation += controller.p_bat_list[h] / (3600/SIMU_TIMESTEP) * 0.001 # convert Watt to kWh
-
-        if p_grid_silutation > 0:
-            cost += p_grid_silutation * sell_price[h]
-        if p_grid_silutation <= 0:
-            cost += p_grid_silutation * buy_price[h]
+    cost = daily_cost(controller, p_x_measured, sell_price, buy_price)
     print("Daily electricity cost with ", scenario, 'is:', round(cost,2))
+    if controller.mpc is not None:
+        print(controller.mpc.report())
+    if controller.mpc_cache is not None:
+        print(controller.mpc_cache.report())
 
     # plotting results
-    positions = [0, 120 * 3, 120 * 6, 120 * 9, 120 * 12, 120 * 15, 120 * 18, 120 * 21, 120 * 24]
-    labels = [0, 3, 6, 9, 12, 15, 18, 21, 24]
-
-    fig, ax = plt.subplots(2, 1)
-    plt.setp(ax, xticks=positions, xticklabels=labels)
-
-    ax[0].set_title('(daily cost: ' + str(round(-cost, 2)) + ' CHF)', fontsize=15)
-    ax[0].plot(range(len(controller.pb1_list)), controller.pb1_list, label='Power B1', color='blue', linestyle='-.')
-    ax[0].plot(range(len(controller.pb2_list)), controller.pb2_list, label='Power B2', color='cyan', alpha=0.7)
-    if BATTERY:
-        ax[0].plot(range(len(controller.p_bat_list)), controller.p_bat_list, label='Power battery', color='green')
-    ax[0].plot(range(len(p_x_measured)), p_x_measured, label='P_pv - P_load', color='grey', alpha=0.7)
-    ax[0].plot(range(len(p_x_measured)), [0 for i in range(len(p_x_measured))], color='black', alpha=0.7,
-               linestyle='-.')
-    ax0 = ax[0].twinx()
-    ax0.plot(range(len(p_x_measured)), [40 for i in range(len(p_x_measured))], color='red', linestyle='-.',
-             linewidth=0.7)
-    ax0.plot(range(len(p_x_measured)), [50 for i in range(len(p_x_measured))], color='red', linestyle='-.',
-             linewidth=0.7)
-    ax0.plot(range(len(p_x_measured)), [30 for i in range(len(p_x_measured))], color='orange', linestyle='-.',
-             linewidth=0.7)
-    ax0.plot(range(len(p_x_measured)), [60 for i in range(len(p_x_measured))], color='orange', linestyle='-.',
-             linewidth=0.7)
-    ax0.plot(range(len(controller.Tb1_list)), controller.Tb1_list, label='Temperature B1', color='red', linestyle='-.')
-    ax0.plot(range(len(controller.Tb2_list)), controller.Tb2_list, label='Temperature B2', color='orange')
-    if BATTERY:
-        ax[1].plot(range(len(controller.soc_bat_list)), controller.soc_bat_list, label='Battery SoC', color='orange')
-
-    ax[1].set_xlabel("Time [h]", fontsize=15)
-    if BATTERY:
-        ax[1].set_ylabel('Battery SoC [Wh]', fontsize=15)
-    ax0.set_ylim(28, 61)
-    ax[0].set_xlabel("Time [h]", fontsize=15)
-    ax0.set_ylabel('Temperature [C]', fontsize=15)
-    ax[0].set_ylabel('Power [W]', fontsize=15)
-    ax0.legend(loc=1, fontsize=15)
-    ax[0].legend(loc=2, fontsize=15)
-    if BATTERY:
-        ax[1].legend(loc=2, fontsize=15)
-    plt.savefig('simu_output/results_'+scenario+'.pdf')
+    plot_results(controller, p_x_measured, cost)
 
     time.sleep(1)
     controller.client.publish('boilers', 'End')
     controller.client.loop_stop()
     controller.client.disconnect(broker_address)
-
-
-
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import hashlib
+import pandas as pd
+import numpy as np
+
+CACHE_FOLDER = 'cache'              # created next to the workbooks, e.g. 'data_input/cache'
+CACHE_VERSION = 1                   # bump when the cache layout changes
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def cache_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, CACHE_FOLDER, name + '.npz')
+
+
+def load_cache(path, stat):
+    try:
+        cache = np.load(cache_path(path), allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if int(cache['version']) != CACHE_VERSION:
+        return None
+    # mtime and size are enough most of the time, the content hash covers files copied or touched without changes
+    if int(cache['source_mtime_ns']) != stat.st_mtime_ns or int(cache['source_size']) != stat.st_size:
+        if str(cache['source_sha1']) != file_hash(path):
+            return None
+    columns = cache['columns'].tolist()
+    data = {name: cache['col_' + str(i)] for i, name in enumerate(columns)}
+    index = pd.Index(cache['index'], name=str(cache['index_name']) or None)
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def write_cache(path, stat, df):
+    destination = cache_path(path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    arrays = {'col_' + str(i): df[name].to_numpy() for i, name in enumerate(df.columns)}
+    # the four simulation processes start together: write to a private file and rename it atomically
+    tmp = destination + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=CACHE_VERSION, source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size,
+                     source_sha1=file_hash(path), index=df.index.to_numpy(), index_name=df.index.name or '',
+                     columns=np.array([str(name) for name in df.columns]), **arrays)
+        os.replace(tmp, destination)
+    except (OSError, ValueError):     # a cache that cannot be written only costs a new parse next time
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_excel(path, usecols=None):
+    '''
+    Same as pd.read_excel(path, index_col=[0], usecols=usecols), but the workbook is parsed only once: its columns are
+    kept in a binary cache (data_input/cache/<workbook>.npz) which is used as long as the workbook does not change.
+    :param usecols: positions of the columns in the sheet, 0 being the index column
+    '''
+    stat = os.stat(path)
+    df = load_cache(path, stat)
+    if df is None:
+        df = pd.read_excel(path, index_col=[0])
+        write_cache(path, stat, df)
+    if usecols is not None:
+        df = df.iloc[:, [col - 1 for col in usecols if col != 0]]
+    return df
+
+
+if __name__ == '__main__':
+
+    # report cold (parse + cache creation) and warm (cache) load times of the input workbooks
+    for name in sorted(os.listdir('data_input')):
+        if not name.endswith('.xlsx'):
+            continue
+        path = os.path.join('data_input', name)
+        if os.path.exists(cache_path(path)):
+            os.remove(cache_path(path))
+        start = time.time()
+        read_excel(path)
+        cold = time.time() - start
+        start = time.time()
+        read_excel(path)
+        warm = time.time() - start
+        print(name, ': cold load', round(cold, 3), 's, warm load', round(warm, 4), 's')
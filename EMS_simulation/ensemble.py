@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from EMS_simulation import controller as control
+from EMS_simulation import simulation
+
+# Run from EMS_simulation: python ensemble.py [realisations]
+# Monte Carlo study of the forecast inaccuracy: simulates a day of each scenario of SCENARIOS (simulation.py) for
+# REALISATIONS measured excess powers per coefficient of COEFFICIENTS, perturbed from the forecast as in
+# controller.get_excess_power_simulation, on a process pool. Prints the distribution of the daily cost per scenario
+# and coefficient.
+
+## =========================    ENSEMBLE PARAMETERS    =============================== ##
+SCENARIOS = ['Scenario0', 'Scenario1', 'Scenario2']       # the MPC scenarios run too, at the time of their solves
+COEFFICIENTS = [0.05, 0.1, 0.2, 0.5]                        # forecast inaccuracy coefficients
+REALISATIONS = 200                                          # perturbed excess powers per coefficient
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+WORKERS = 4                                                 # size of the process pool, None to run in this process
+CHUNK = 20                                                  # realisations per task of the pool
+SEED = 1
+## ==================================================================================== ##
+
+WORKER_DATA = None                  # inputs and perturbation banks of a worker process of the pool, set by init_worker
+
+
+def perturbation_banks(p_x_forecast, coefficients, realisations, seed):
+    '''
+    Measured excess powers of the ensemble, drawn with a numpy Generator per coefficient (independent streams of the
+    seed). The scenarios are simulated on the same realisations.
+    :return: array of shape (coefficients, realisations, simulation steps)
+    '''
+    streams = np.random.SeedSequence(seed).spawn(len(coefficients))
+    return np.stack([control.get_excess_power_simulations(p_x_forecast, coef, realisations,
+                                                          np.random.default_rng(stream))
+                     for coef, stream in zip(coefficients, streams)])
+
+
+def init_worker(inputs, banks):
+    global WORKER_DATA
+    WORKER_DATA = (inputs, banks)
+
+
+def simulate(scenario, coef_index, indices, data=None):
+    '''
+    Simulates a day of scenario for the realisations indices of the bank of coefficient coef_index
+    :param data: (inputs, banks), defaults to those of the worker
+    :return: list of the daily costs
+    '''
+    inputs, banks = WORKER_DATA if data is None else data
+    return [simulation.LockstepSimulation(scenario, inputs, banks[coef_index, i]).run() for i in indices]
+
+
+def run_ensemble(scenarios, coefficients, realisations, workers=WORKERS, seed=SEED):
+    '''
+    :return: dict of the daily costs per scenario, arrays of shape (coefficients, realisations) as computed by the
+    controller (negative when electricity is bought)
+    '''
+    inputs = simulation.load_inputs()
+    banks = perturbation_banks(inputs['p_x'], coefficients, realisations, seed)
+    chunks = [np.arange(start, min(start + CHUNK, realisations)) for start in range(0, realisations, CHUNK)]
+    tasks = [(scenario, c, indices) for scenario in scenarios for c in range(len(coefficients)) for indices in chunks]
+    if workers:
+        # the inputs and banks are sent once to each worker, the tasks only carry their indices
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(inputs, banks)) as executor:
+            results = list(executor.map(simulate, *zip(*tasks)))
+    else:
+        results = [simulate(*task, data=(inputs, banks)) for task in tasks]
+    costs = {scenario: np.empty((len(coefficients), realisations)) for scenario in scenarios}
+    for (scenario, c, indices), task_costs in zip(tasks, results):
+        costs[scenario][c, indices] = task_costs
+    return costs
+
+
+def summary(costs, coefficients, quantiles=QUANTILES):
+    '''
+    :return: lines of the mean, standard deviation and quantiles of the daily cost paid (the opposite of the cost of
+    the controller) per scenario and coefficient
+    '''
+    lines = ['{:10s} {:>6s} {:>8s} {:>7s} '.format('scenario', 'coef', 'mean', 'std') +
+             ' '.join('{:>7s}'.format('q' + str(int(100 * q))) for q in quantiles)]
+    for scenario, scenario_costs in costs.items():
+        for coef, paid in zip(coefficients, -scenario_costs):
+            lines.append('{:10s} {:6.2f} {:8.3f} {:7.3f} '.format(scenario, coef, paid.mean(), paid.std()) +
+                         ' '.join('{:7.3f}'.format(value) for value in np.quantile(paid, quantiles)))
+    return lines
+
+
+if __name__ == '__main__':
+
+    realisations = int(sys.argv[1]) if len(sys.argv) > 1 else REALISATIONS
+    start = time.time()
+    costs = run_ensemble(SCENARIOS, COEFFICIENTS, realisations)
+    elapsed = time.time() - start
+    runs = len(SCENARIOS) * len(COEFFICIENTS) * realisations
+    print('Simulated', runs, 'days,', realisations, 'realisations per scenario and coefficient, in', round(elapsed, 2),
+          's:', round(runs / elapsed, 1), 'days/s with', WORKERS, 'workers')
+    print('Daily electricity cost paid, in CHF:')
+    for line in summary(costs, COEFFICIENTS):
+        print(line)
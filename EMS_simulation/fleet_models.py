@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from EMS_simulation.water import d_WATER, C_WATER
+
+## =========================    SIMULATION PARAMETERS    =============================== ##
+SIMU_TIMESTEP = 30                                  # in seconds
+## ==================================================================================== ##
+
+
+def advance_temperature(temp, energy_hot_water, heating, volume, temp_incoming, trace=False):
+    '''
+    Temperature of a boiler of boiler1_model or boiler2_model after the simulation steps of energy_hot_water at a
+    constant power (Boiler.model_advance). The update is not linear in the temperature (the hot water drawn mixes with
+    incoming water), so the steps are computed in sequence.
+    :param energy_hot_water: list of the energies of the hot water drawn at each step
+    :param heating: temperature drop due to the power over a step, (1/capacity) * dt*power
+    :param trace: also return the temperature at the start of each step
+    :return: final temperature, and with trace the array of the temperatures at the start of each step, else None
+    '''
+    temps = np.empty(len(energy_hot_water)) if trace else None
+    for i, energy in enumerate(energy_hot_water):
+        if trace:
+            temps[i] = temp
+        D = energy / (C_WATER*d_WATER * temp) / volume
+        temp = (1 - D) * temp - heating + D*temp_incoming
+    return temp, temps
+
+
+class BoilerFleet():
+    '''
+    Boilers of boiler1_model.Boiler as arrays, one entry per unit: model() advances every unit by a simulation step
+    with the update of Boiler.model (bit for bit the same results per unit).
+    The arguments are broadcast to the number of units.
+    :param rated_p: in Watts (negative)
+    :param min_temp, max_temp: setpoints, in degree celsius
+    :param volumes: in litres
+    :param temps: initial temperatures, in degree celsius
+    :param energy_hot_water: energy of the hot water drawn at each simulation step, shape (steps,) for a profile shared
+    by the units or (steps, units)
+    :param hot_water_shares: factor of the profile per unit
+    :param temp_incoming: temperature of the incoming water, in degree celsius
+    '''
+    def __init__(self, simu_timestep, rated_p, min_temp, max_temp, volumes, temps, energy_hot_water,
+                 hot_water_shares=1, temp_incoming=20):
+        units = np.broadcast(np.asarray(rated_p), np.asarray(min_temp), np.asarray(max_temp), np.asarray(volumes),
+                             np.asarray(temps), np.asarray(hot_water_shares)).shape
+        self.dt = simu_timestep
+        self.max_power = np.broadcast_to(np.asarray(rated_p, dtype=float), units).copy()
+        self.min_temp = np.broadcast_to(np.asarray(min_temp, dtype=float), units).copy()
+        self.max_temp = np.broadcast_to(np.asarray(max_temp, dtype=float), units).copy()
+        self.volumes = np.broadcast_to(np.asarray(volumes, dtype=float), units).copy()
+        self.current_temp = np.broadcast_to(np.asarray(temps, dtype=float), units).copy()
+        self.hot_water_shares = np.broadcast_to(np.asarray(hot_water_shares, dtype=float), units).copy()
+        self.temp_incoming = np.broadcast_to(np.asarray(temp_incoming, dtype=float), units).copy()
+        self.capacities = C_WATER * d_WATER * self.volumes                  # in degree/(Watt*sec)
+        self.energy_hot_water = np.asarray(energy_hot_water, dtype=float)
+        self.power = np.zeros(units)
+        self.time_step = 0
+        self.time = 0
+
+    def __len__(self):
+        return len(self.current_temp)
+
+    def model(self):
+        energy_hot_water = self.energy_hot_water[self.time_step] * self.hot_water_shares
+        D = energy_hot_water / (C_WATER*d_WATER * self.current_temp) / self.volumes
+        self.current_temp = (1 - D) * self.current_temp - (1/self.capacities) * self.dt*self.power + \
+            D*self.temp_incoming
+        self.time_step += 1
+        self.time += self.dt
+
+    def model_advance(self, k, trace=False):
+        '''
+        Advances every unit by k simulation steps at the current powers, as k calls of model()
+        :param trace: return the temperatures at the start of each step (the measurements published at each step)
+        :return: with trace, array of shape (k, units), else None
+        '''
+        temps = np.empty((k, len(self))) if trace else None
+        heating = (1/self.capacities) * self.dt*self.power
+        temp = self.current_temp.copy()
+        D = np.empty(len(self))
+        water = np.empty(len(self))
+        for i in range(k):              # in place, with the operations of model() in the same order
+            if trace:
+                temps[i] = temp
+            np.multiply(self.energy_hot_water[self.time_step + i], self.hot_water_shares, out=D)
+            np.multiply(C_WATER*d_WATER, temp, out=water)
+            D /= water
+            D /= self.volumes
+            np.subtract(1, D, out=water)
+            temp *= water
+            temp -= heating
+            D *= self.temp_incoming
+            temp += D
+        self.current_temp = temp
+        self.time_step += k
+        self.time += k*self.dt
+        return temps
+
+
+class BatteryFleet():
+    '''
+    Batteries of battery_model.Battery as arrays, one entry per unit: model() advances every unit by a simulation
+    step with the update of Battery.model. The arguments are broadcast to the number of units.
+    :param max_charge_power, max_discharge_power: in Watts
+    :param min_soc, max_soc: in Watts-h
+    :param socs: initial states of charge, in Watts-h
+    '''
+    def __init__(self, time_slot, max_charge_power, max_discharge_power, min_soc, max_soc, socs):
+        units = np.broadcast(np.asarray(max_charge_power), np.asarray(max_discharge_power), np.asarray(min_soc),
+                             np.asarray(max_soc), np.asarray(socs)).shape
+        self.dt = time_slot
+        self.max_charge_power = np.broadcast_to(np.asarray(max_charge_power, dtype=float), units).copy()
+        self.max_discharge_power = np.broadcast_to(np.asarray(max_discharge_power, dtype=float), units).copy()
+        self.min_soc = np.broadcast_to(np.asarray(min_soc, dtype=float), units).copy()
+        self.max_soc = np.broadcast_to(np.asarray(max_soc, dtype=float), units).copy()
+        self.current_soc = np.broadcast_to(np.asarray(socs, dtype=float), units).copy()
+        self.current_power = np.zeros(units)
+        self.time_step = 0
+
+    def __len__(self):
+        return len(self.current_soc)
+
+    def model(self):
+        self.current_soc = self.current_soc - (self.dt/3600) * self.current_power
+        self.time_step += self.dt
+
+    def model_advance(self, k, trace=False):
+        '''
+        Advances every unit by k simulation steps at the current powers, as k calls of model()
+        :param trace: return the states of charge at the start of each step (the measurements published at each step)
+        :return: with trace, array of shape (k, units), else None
+        '''
+        socs = np.empty((k, len(self))) if trace else None
+        decrement = (self.dt/3600) * self.current_power
+        soc = self.current_soc.copy()
+        for i in range(k):
+            if trace:
+                socs[i] = soc
+            soc -= decrement
+        self.current_soc = soc
+        self.time_step += k*self.dt
+        return socs
@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 
 import subprocess
+from EMS_simulation import clock
 
 ## =========================    SIMULATION PARAMETERS    =============================== ##
-BATTERY = False
+# True: controller and models in lockstep in one process on a virtual clock (simulation.py), with the scenario of
+# controller.py. False: one process per entity, synchronised over the MQTT broker by the simulation clock (clock.py)
+# or in real time (see clock.VIRTUAL_CLOCK)
+IN_PROCESS = True
+BATTERY = False                 # MQTT only, the battery model is started (in process, it follows the scenario)
 #BATTERY = True
 ## ===================================================================================== ##
 
 if __name__ == '__main__':
 
     print('Starting simulation!')
-    if BATTERY:
+    if IN_PROCESS:
+        subprocess.run("python3 simulation.py", shell=True)
+    elif BATTERY:
         subprocess.run("python3 controller.py & python3 boiler1_model.py & python3 boiler2_model.py "
-                       "& python3 battery_model.py", shell=True)
+                       "& python3 battery_model.py" + (" & python3 clock.py battery" if clock.VIRTUAL_CLOCK else ""),
+                       shell=True)
     else:
-        subprocess.run("python3 controller.py & python3 boiler1_model.py & python3 boiler2_model.py", shell=True)
+        subprocess.run("python3 controller.py & python3 boiler1_model.py & python3 boiler2_model.py" +
+                       (" & python3 clock.py" if clock.VIRTUAL_CLOCK else ""), shell=True)
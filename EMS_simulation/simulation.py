@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import time
+from EMS_simulation import controller as control
+from EMS_simulation import boiler1_model
+from EMS_simulation import boiler2_model
+from EMS_simulation import battery_model
+
+# Run from EMS_simulation: python simulation.py
+# Simulates a day of the scenario chosen in controller.py in this process, without broker.
+
+
+def load_inputs():
+    '''
+    Non-controllable variables of a simulation, as read from data_input by the controller and the boiler models
+    (loaded once, they are shared by the simulations of ensemble.py)
+    :return: dict of the prices, the excess power forecast and the hot water profiles of the controller and the boilers
+    '''
+    return {'sell_price': control.get_energy_sell_price(), 'buy_price': control.get_energy_buy_price(),
+            'p_x': control.get_excess_power_forecast(),
+            'energy_hot_water_use': control.get_energy_hot_water_usage_simu(),
+            'energy_hot_water_boiler1': boiler1_model.get_energy_hot_water_usage_simu(),
+            'energy_hot_water_boiler2': boiler2_model.get_energy_hot_water_usage_simu()}
+
+
+class LockstepSimulation():
+    '''
+    Runs controller.Controller, the boiler models and the battery model in lockstep on a virtual clock, in the order
+    their MQTT messages follow when each entity waits for the others: at each simulation step the models publish
+    their measurements (received at once by the controller) and advance by SIMU_TIMESTEP, and at each control step the
+    controller runs its algorithm on the last measurements and actuates the models before they advance. Nothing
+    sleeps: the virtual clock advances as soon as every entity is done with the step. The models advance a control
+    step at a time, the measurements of its simulation steps being received in order.
+    :param scenario: defaults to the scenario of the parameters of controller.py, which tells if there is a battery
+    :param inputs: dict of load_inputs(), loaded if not given
+    :param p_x_measured: measured excess power at each simulation step, defaults to the perturbed forecast of
+    controller.get_excess_power_simulation
+    '''
+    def __init__(self, scenario=None, inputs=None, p_x_measured=None):
+        self.scenario = control.scenario if scenario is None else scenario
+        self.has_battery = control.has_battery(self.scenario)
+        inputs = load_inputs() if inputs is None else inputs
+        self.controller = control.Controller(self.scenario, connect=False)
+        self.boilers = {1: boiler1_model.Boiler('Boiler1', boiler1_model.SIMU_TIMESTEP, boiler1_model.BOILER1_RATED_P,
+                                                boiler1_model.BOILER1_TEMP_MIN, boiler1_model.BOILER1_TEMP_MAX,
+                                                boiler1_model.BOILER1_INITIAL_TEMP, connect=False,
+                                                energy_hot_water=inputs['energy_hot_water_boiler1']),
+                        2: boiler2_model.Boiler('Boiler2', boiler2_model.SIMU_TIMESTEP, boiler2_model.BOILER2_RATED_P,
+                                                boiler2_model.BOILER2_TEMP_MIN, boiler2_model.BOILER2_TEMP_MAX,
+                                                boiler2_model.BOILER2_INITIAL_TEMP, connect=False,
+                                                energy_hot_water=inputs['energy_hot_water_boiler2'])}
+        self.battery = None
+        if self.has_battery:
+            self.battery = battery_model.Battery('Battery', battery_model.SIMU_TIMESTEP, battery_model.PMAX_CH,
+                                                 battery_model.PMAX_DISCH, battery_model.SOC_MIN,
+                                                 battery_model.SOC_MAX, current_soc=battery_model.SOC_MIN,
+                                                 connect=False)
+        self.time = 0                                   # virtual clock, in seconds
+
+        # non-controllable variables, as in the controller
+        self.sell_price = inputs['sell_price']
+        self.buy_price = inputs['buy_price']
+        self.p_x = inputs['p_x']
+        self.p_x_measured = control.get_excess_power_simulation(self.p_x) if p_x_measured is None else p_x_measured
+        self.energy_hot_water_use = inputs['energy_hot_water_use']
+
+    def advance(self, substeps):
+        '''
+        Advances the models by substeps simulation steps at the actuated powers (Boiler.model_advance and
+        Battery.model_advance), the controller receiving the measurements the models publish at each step
+        '''
+        measurements = {}
+        for i, boiler in self.boilers.items():
+            measurements['boiler' + str(i) + '_sensor/temp'] = boiler.model_advance(substeps, trace=True).tolist()
+            measurements['boiler' + str(i) + '_sensor/power'] = [boiler.power] * substeps
+        if self.battery is not None:
+            measurements['battery/soc'] = self.battery.model_advance(substeps, trace=True).tolist()
+            measurements['battery/power'] = [self.battery.current_power] * substeps
+        for step in range(substeps):
+            for topic, values in measurements.items():
+                self.controller.receive(topic, values[step])
+
+    def run(self):
+        '''
+        :return: daily cost of the power exchanged with the grid, as computed by the controller
+        '''
+        # first messages of the models, which simulate the measurements prior to t=0
+        for i, boiler in self.boilers.items():
+            self.controller.receive('boiler' + str(i) + '_sensor/power', boiler.power)
+            self.controller.receive('boiler' + str(i) + '_sensor/temp', boiler.current_temp)
+        if self.battery is not None:
+            self.controller.receive('battery/power', self.battery.current_power)
+            self.controller.receive('battery/soc', self.battery.current_soc)
+
+        substeps = int(control.CONTROL_TIMESTEP / control.SIMU_TIMESTEP)
+        for h in boiler1_model.SIMU_STEPS[::substeps]:          # control steps, the models wait for the actions
+            actions = self.controller.run_algorithm(self.p_x_measured[h], self.energy_hot_water_use[h // substeps])
+            self.boilers[1].power = float(actions[1])
+            self.boilers[2].power = float(actions[2])
+            if self.battery is not None:
+                self.battery.current_power = float(actions['bat'])
+            self.advance(substeps)
+            self.time += control.CONTROL_TIMESTEP
+
+        # first measurement received was an init message. we remove it
+        for measurements in (self.controller.pb1_list, self.controller.pb2_list, self.controller.Tb1_list,
+                             self.controller.Tb2_list, self.controller.p_bat_list, self.controller.soc_bat_list):
+            if measurements:
+                measurements.pop(0)
+        return control.daily_cost(self.controller, self.p_x_measured, self.sell_price, self.buy_price,
+                                  battery=self.has_battery)
+
+
+if __name__ == '__main__':
+
+    simulation = LockstepSimulation()
+    start = time.time()
+    cost = simulation.run()
+    print('Simulated', simulation.time / 3600, 'h in', round(time.time() - start, 3), 's')
+    print("Daily electricity cost with ", simulation.scenario, 'is:', round(cost, 2))
+    if simulation.controller.mpc is not None:
+        print(simulation.controller.mpc.report())
+    if simulation.controller.mpc_cache is not None:
+        print(simulation.controller.mpc_cache.report())
+    control.plot_results(simulation.controller, simulation.p_x_measured, cost, scenario=simulation.scenario,
+                         battery=simulation.has_battery)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+import numpy as np
+
+
+class RegularTimeSeries():
+    '''
+    Values sampled on a regular time grid (start, start + step, start + 2*step, ...). A timestamp is mapped to its
+    position in the grid arithmetically, so looking up a time slot costs the same whatever the length of the series.
+    '''
+    def __init__(self, values, start, step):
+        self.values = np.ascontiguousarray(values, dtype=float)
+        self.start = pd.Timestamp(start)
+        self.step = pd.Timedelta(step)
+
+    def __len__(self):
+        return len(self.values)
+
+    def offset(self, timestamp):
+        offset, remainder = divmod(pd.Timestamp(timestamp) - self.start, self.step)
+        if remainder or not 0 <= offset < len(self.values):
+            raise ValueError(str(timestamp) + ' is not a time slot of the series (' + str(self.start) + ' every '
+                             + str(self.step) + ', ' + str(len(self.values)) + ' slots)')
+        return int(offset)
+
+    def horizon(self, timestamp, no_slots):
+        '''
+        :return: the no_slots values starting at timestamp, as a view on the series (no copy)
+        '''
+        offset = self.offset(timestamp)
+        if offset + no_slots > len(self.values):
+            raise ValueError('horizon of ' + str(no_slots) + ' slots from ' + str(timestamp)
+                             + ' ends after the last slot of the series')
+        return self.values[offset:offset + no_slots]
+
+    def resample(self, step):
+        # finer grid: each value is held over the new slots it covers
+        factor = self.step / pd.Timedelta(step)
+        if factor < 1 or factor != int(factor):
+            raise ValueError('new step must divide the step of the series')
+        return RegularTimeSeries(np.repeat(self.values, int(factor)), self.start, step)
+
+
+def on_regular_grid(index, values, step):
+    '''
+    :param index: timestamps of the samples, increasing but possibly with jitter (13:50:01) or missing samples
+    :return: RegularTimeSeries with the samples rounded to the nearest slot, missing slots hold the previous value
+    '''
+    index = pd.DatetimeIndex(index)
+    step = pd.Timedelta(step)
+    start = index[0].round(step)
+    positions = np.rint((index - start) / step).astype(int)
+    regular = np.full(positions[-1] + 1, np.nan)
+    regular[positions] = values
+    filled = np.where(np.isnan(regular), 0, np.arange(len(regular)))
+    regular = regular[np.maximum.accumulate(filled)]
+    return RegularTimeSeries(regular, start, step)
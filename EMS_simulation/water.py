@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+# Properties of the water of the boilers, shared by the boiler models, the controller and the MPC: the plant and the
+# models of the controller must agree on the thermal capacity of the boilers and the energy of the hot water use.
+
+d_WATER = 977                                       # in grams/liter
+C_WATER = 4.186                                     # in degree/(gram*Watt)
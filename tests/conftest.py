@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules are imported as EMS_simulation.* and read their data as data_input/..., relative to EMS_simulation
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.join(ROOT, 'EMS_simulation'))
@@ -0,0 +1,31 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+from EMS_simulation import data_loader
+
+# the workbooks and columns read by the simulation
+READS = [('Energie - 00003 - Pache.xlsx', [0, 1]),
+         ('hot_water_consumption_artificial_profile_10min_granularity.xlsx', [0, 1]),
+         ('hot_water_consumption_artificial_profile_10min_granularity.xlsx', [0, 2]),
+         ('hot_water_consumption_artificial_profile_10min_granularity.xlsx', None),
+         ('energy_sell_price_10min_granularity.xlsx', [0, 1]),
+         ('energy_buy_price_10min_granularity.xlsx', [0, 1])]
+
+
+@pytest.mark.parametrize('name, usecols', READS)
+def test_read_excel_matches_pandas(name, usecols, tmp_path):
+    path = str(tmp_path / name)         # a copy, the first read parses it and creates its cache
+    shutil.copy(os.path.join('data_input', name), path)
+    reference = pd.read_excel(path, index_col=[0], usecols=usecols)
+    pd.testing.assert_frame_equal(data_loader.read_excel(path, usecols=usecols), reference)
+    assert os.path.exists(data_loader.cache_path(path))
+    pd.testing.assert_frame_equal(data_loader.read_excel(path, usecols=usecols), reference)
+
+
+def test_changed_workbook_is_parsed_again(tmp_path):
+    path = str(tmp_path / 'price.xlsx')
+    shutil.copy(os.path.join('data_input', 'energy_sell_price_10min_granularity.xlsx'), path)
+    data_loader.read_excel(path)
+    shutil.copy(os.path.join('data_input', 'energy_buy_price_10min_granularity.xlsx'), path)
+    pd.testing.assert_frame_equal(data_loader.read_excel(path), pd.read_excel(path, index_col=[0]))
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from EMS_simulation import boiler1_model
+from EMS_simulation import boiler2_model
+from EMS_simulation import battery_model
+from EMS_simulation.benchmarks import fleet_models
+
+SUBSTEPS = fleet_models.SUBSTEPS                    # simulation steps of a control step
+CONTROL_STEPS = len(boiler1_model.SIMU_STEPS) // SUBSTEPS
+
+
+def boilers():
+    return [boiler1_model.Boiler('Boiler1', boiler1_model.SIMU_TIMESTEP, boiler1_model.BOILER1_RATED_P,
+                                 boiler1_model.BOILER1_TEMP_MIN, boiler1_model.BOILER1_TEMP_MAX,
+                                 boiler1_model.BOILER1_INITIAL_TEMP, connect=False),
+            boiler2_model.Boiler('Boiler2', boiler2_model.SIMU_TIMESTEP, boiler2_model.BOILER2_RATED_P,
+                                 boiler2_model.BOILER2_TEMP_MIN, boiler2_model.BOILER2_TEMP_MAX,
+                                 boiler2_model.BOILER2_INITIAL_TEMP, connect=False)]
+
+
+def battery():
+    return battery_model.Battery('Battery', battery_model.SIMU_TIMESTEP, battery_model.PMAX_CH,
+                                 battery_model.PMAX_DISCH, battery_model.SOC_MIN, battery_model.SOC_MAX,
+                                 current_soc=battery_model.SOC_MIN, connect=False)
+
+
+@pytest.mark.parametrize('make_models, state, powers', [
+    (boilers, 'current_temp', (boiler1_model.BOILER1_RATED_P, 0)),
+    (lambda: [battery()], 'current_soc', (battery_model.PMAX_CH, battery_model.PMAX_DISCH))],
+    ids=['boilers', 'battery'])
+def test_model_advance_matches_model(make_models, state, powers):
+    # model() is the step of the MQTT models, model_advance() the control step of the lockstep simulation
+    stepped, advanced = make_models(), make_models()
+    rng = np.random.default_rng(1)
+    for _ in range(CONTROL_STEPS):
+        power = rng.uniform(*powers, len(stepped))
+        for models in (stepped, advanced):
+            for model, model_power in zip(models, power):
+                model.power = model.current_power = model_power
+        measurements = []
+        for _ in range(SUBSTEPS):
+            measurements.append([getattr(model, state) for model in stepped])
+            for model in stepped:
+                model.model()
+        traces = np.column_stack([model.model_advance(SUBSTEPS, trace=True) for model in advanced])
+        assert np.array_equal(traces, measurements)
+        assert [getattr(model, state) for model in advanced] == [getattr(model, state) for model in stepped]
+
+
+def test_fleets_match_models():
+    assert fleet_models.check(np.random.default_rng(1))
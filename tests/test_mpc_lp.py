@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+from EMS_simulation.control_algorithms import forecasts
+from EMS_simulation.control_algorithms import lp_solvers
+from EMS_simulation.control_algorithms import mpc_lp
+from EMS_simulation.control_algorithms import mpc_batteries
+from EMS_simulation.benchmarks import common
+from EMS_simulation.control_algorithms.mpc_lp import PHI, PG, PB1, TB1, ALPHA1, EPSILON1, PBAT, EBAT
+
+NO_SLOTS = 24                                       # short horizon, the dense reference has one column per variable
+ITERATIONS = [0, 150, 250]                          # night, noon and evening of the shipped day
+TEMPS_INIT = [45, 42]
+SOC_INIT = 1000
+SCHEDULES = {'uniform': (NO_SLOTS, None), '5/15/60 min': (common.NO_SLOTS, [(60, 5), (300, 15), (360, 60)])}
+TOLERANCE = 1e-6
+
+
+def window(iteration, horizon_steps):
+    provider = forecasts.get_forecast_provider(common.CONTROL_TIMESTEP)
+    return provider.window(common.step_time(iteration), horizon_steps)
+
+
+def measurements(iteration, horizon_steps):
+    excess_power, hot_water_energy, sell_price, buy_price = window(iteration, horizon_steps)
+    return (excess_power[0], hot_water_energy[0], TEMPS_INIT, SOC_INIT, excess_power, hot_water_energy, sell_price,
+            buy_price)
+
+
+def dense_lp(boilers, battery, p_x, energy_hot_water, temps_init, soc_init, excess_power, hot_water_energy,
+             sell_price, buy_price):
+    '''
+    The LP of the original mpc_boilers and mpc_batteries, built slot by slot as dense rows, with the changes of the
+    sparse formulation: the tangent cuts of the first slot are taken at the measured temperature, with the measured
+    hot water energy.
+    :return: c, A_eq, b_eq, A_ub, b_ub and bounds for linprog
+    '''
+    no_vars_ps = mpc_lp.NO_VARS_PS_BATTERY if battery else mpc_lp.NO_VARS_PS_BOILERS
+    no_slots = len(excess_power)
+    dt = common.CONTROL_TIMESTEP
+    c, bounds, A_eq, b_eq, A_ub, b_ub = [], [], [], [], [], []
+
+    def row(*terms):
+        values = np.zeros(no_vars_ps * no_slots)
+        for col, coef in terms:
+            values[col] += coef
+        return values
+
+    for x in range(no_slots):
+        slot = x * no_vars_ps
+        previous = slot - no_vars_ps
+        c += [1, 0, 0, 0, 0, 0, 0, 0, mpc_lp.EPSILON_WEIGHT, mpc_lp.EPSILON_WEIGHT] + [0, 0] * bool(battery)
+        bounds += [(None, None), (None, None)] + [(boiler['rated_p'], 0) for boiler in boilers] + \
+            [(boiler['temp_min'], boiler['temp_max']) for boiler in boilers] + \
+            [(0, boiler['temp_max']) for boiler in boilers] * 2
+        if battery:
+            bounds += [(battery['charge_power_limit'], battery['discharge_power_limit']),
+                       (battery['soc_min'], battery['soc_max'])]
+
+        powers = [PG, PB1, PB1 + 1] + ([PBAT] if battery else [])
+        A_eq.append(row(*[(slot + var, 1) for var in powers]))
+        b_eq.append(-p_x if x == 0 else -excess_power[x])
+        if battery:
+            terms = [(slot + EBAT, 1), (slot + PBAT, battery['efficiency'] * dt / 60)]
+            A_eq.append(row(*terms, *([(previous + EBAT, -1)] if x else [])))
+            b_eq.append(soc_init if x == 0 else 0)
+
+        for i, boiler in enumerate(boilers):
+            capacity = boiler['capacity']
+            terms = [(slot + ALPHA1 + i, 1), (slot + PB1 + i, (dt * 60) / capacity)]
+            A_eq.append(row(*terms, *([(previous + TB1 + i, -1)] if x else [])))
+            b_eq.append(temps_init[i] - energy_hot_water / capacity if x == 0 else -hot_water_energy[x] / capacity)
+        for i in range(len(boilers)):
+            A_eq.append(row((slot + TB1 + i, 1), (slot + ALPHA1 + i, -1), (slot + EPSILON1 + i, -1)))
+            b_eq.append(0)
+
+        for i, boiler in enumerate(boilers):
+            capacity = boiler['capacity']
+            K = (energy_hot_water if x == 0 else hot_water_energy[x]) * boiler['temp_incoming']
+            for temp in boiler['temp_range']:
+                slope = -(K / capacity) / temp ** 2
+                rhs = -(K / capacity) * (2 / temp)
+                if x == 0:
+                    A_ub.append(row((slot + EPSILON1 + i, -1)))
+                    b_ub.append(rhs - slope * temps_init[i])
+                else:
+                    A_ub.append(row((slot + EPSILON1 + i, -1), (previous + TB1 + i, slope)))
+                    b_ub.append(rhs)
+
+        for price in (buy_price[x], sell_price[x]):
+            A_ub.append(row((slot + PHI, -1), (slot + PG, price / ((60 / dt) * 1000))))
+            b_ub.append(0)
+
+    return np.array(c, dtype=float), np.array(A_eq), np.array(b_eq), np.array(A_ub), np.array(b_ub), bounds
+
+
+@pytest.mark.parametrize('battery', [None, mpc_batteries.BATTERY], ids=['boilers', 'battery'])
+@pytest.mark.parametrize('iteration', ITERATIONS)
+def test_sparse_lp_matches_dense_lp(battery, iteration):
+    inputs = measurements(iteration, NO_SLOTS)
+    problem = mpc_lp.MPCProblem(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, NO_SLOTS)
+    problem.update(*inputs)
+    res = lp_solvers.make_solver(problem, 'linprog').solve()
+
+    c, A_eq, b_eq, A_ub, b_ub, bounds = dense_lp(mpc_batteries.BOILERS, battery, *inputs)
+    reference = linprog(c, A_eq=A_eq, b_eq=b_eq, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method='highs')
+
+    assert res.success and reference.success
+    assert res.fun == pytest.approx(reference.fun, abs=TOLERANCE)
+    # the sparse solution is an optimal solution of the dense LP
+    assert c @ res.x == pytest.approx(reference.fun, abs=TOLERANCE)
+    assert np.abs(A_eq @ res.x - b_eq).max() < TOLERANCE
+    assert (A_ub @ res.x - b_ub).max() < TOLERANCE
+
+
+@pytest.mark.parametrize('battery', [None, mpc_batteries.BATTERY], ids=['boilers', 'battery'])
+@pytest.mark.parametrize('schedule', SCHEDULES.values(), ids=SCHEDULES.keys())
+def test_condensed_matches_full(battery, schedule):
+    horizon_steps, slots = schedule
+    problems = [problem_class(mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, horizon_steps, slots)
+                for problem_class in mpc_lp.FORMULATIONS.values()]
+    solvers = [lp_solvers.make_solver(problem, 'linprog') for problem in problems]
+    for iteration in ITERATIONS:
+        results = []
+        for problem, solver in zip(problems, solvers):
+            problem.update(*measurements(iteration, horizon_steps))
+            results.append(solver.solve())
+        full, condensed = results
+        assert full.success and condensed.success
+        assert condensed.fun == pytest.approx(full.fun, abs=TOLERANCE)
+        x = problems[1].full_solution(condensed.x)
+        for var in (TB1, TB1 + 1):
+            assert np.abs(problems[0].step_states(x, var, 0) - problems[0].step_states(full.x, var, 0)).max() < 1e-3
+
+
+@pytest.mark.parametrize('backend', ['linprog', 'highs-ds-warm'])
+def test_lazy_cuts_match_all_cuts(backend):
+    problems = [mpc_lp.MPCProblem(mpc_batteries.BOILERS, None, common.CONTROL_TIMESTEP, NO_SLOTS, lazy_cuts=lazy)
+                for lazy in (False, True)]
+    solvers = [lp_solvers.make_solver(problem, backend) for problem in problems]
+    # consecutive steps, the lazy cuts of a step are carried to the next one
+    for iteration in range(ITERATIONS[1], ITERATIONS[1] + 6):
+        results = []
+        for problem, solver in zip(problems, solvers):
+            problem.update(*measurements(iteration, NO_SLOTS))
+            results.append(solver.solve())
+        eager, lazy = results
+        assert eager.success and lazy.success
+        assert problems[1].violated_cuts(lazy.x) is None
+        # the lazy solution may stay up to CUT_TOLERANCE below the cuts it does not have
+        gap = mpc_lp.EPSILON_WEIGHT * mpc_lp.CUT_TOLERANCE * NO_SLOTS * len(mpc_batteries.BOILERS)
+        assert eager.fun - gap - TOLERANCE <= lazy.fun <= eager.fun + TOLERANCE
+
+
+@pytest.mark.parametrize('formulation', mpc_lp.FORMULATIONS)
+@pytest.mark.parametrize('battery', [None, mpc_batteries.BATTERY], ids=['boilers', 'battery'])
+def test_highs_updates_match_linprog(formulation, battery):
+    # HighsSolver keeps its model between the steps and only pushes the updates
+    problems = [mpc_lp.FORMULATIONS[formulation](mpc_batteries.BOILERS, battery, common.CONTROL_TIMESTEP, NO_SLOTS)
+                for _ in range(2)]
+    solvers = [lp_solvers.make_solver(problems[0], 'linprog'), lp_solvers.make_solver(problems[1], 'highs-ds-warm')]
+    for iteration in range(ITERATIONS[1], ITERATIONS[1] + 6):
+        results = []
+        for problem, solver in zip(problems, solvers):
+            problem.update(*measurements(iteration, NO_SLOTS))
+            results.append(solver.solve())
+        assert results[0].success and results[1].success
+        assert results[1].fun == pytest.approx(results[0].fun, abs=TOLERANCE)
@@ -0,0 +1,11 @@
+import numpy as np
+from EMS_simulation.benchmarks import rule_kernels
+
+CASES = 20000
+
+
+def test_arrays_match_dict_algorithms():
+    # random states with temperatures at and around the thresholds, ties between the boilers and surpluses at and
+    # around their demands (see benchmarks/rule_kernels.py)
+    differences = rule_kernels.compare(CASES, np.random.default_rng(1))
+    assert differences == {0: 0, 1: 0, 2: 0}